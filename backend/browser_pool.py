@@ -0,0 +1,185 @@
+"""
+Headless Browser Pool
+- Chromium ilk PDF isteğinde (veya açılıştan sonra arka planda ön ısıtmada) bir kez başlatılır;
+  Playwright de o zaman import edilir
+- Sabit sayıda hazır sayfa (context + page) havuzda bekler
+- Her sayfa N render sonrası kapatılıp yenisiyle değiştirilir
+- Havuz doluysa istekler kuyrukta bekler; kuyruk da doluysa 503 döner
+"""
+
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+# A failed launch is not retried for this long (every request would pay for it otherwise)
+START_RETRY_SECONDS = 60
+
+
+class _PooledPage:
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.renders = 0
+
+
+class BrowserPool:
+    def __init__(self, size: int = 2, recycle_after: int = 50, max_waiting: int = 20, acquire_timeout: float = 30.0):
+        self.size = size
+        self.recycle_after = recycle_after
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._waiting = 0
+        self._in_use = 0
+        self._missing = 0
+
+        self._renders = 0
+        self._failures = 0
+        self._recycled = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._start_failed_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        self._idle = asyncio.Queue()
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(args=["--no-sandbox"])
+        for _ in range(self.size):
+            self._idle.put_nowait(await self._new_page())
+
+    async def ensure_started(self):
+        """Start the browser on first use; concurrent callers wait for the same launch."""
+        if self.is_running:
+            return
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.is_running:
+                return
+            if self._start_failed_at and time.monotonic() - self._start_failed_at < START_RETRY_SECONDS:
+                raise HTTPException(status_code=503, detail="PDF browser is not running")
+            try:
+                await self.start()
+                self._start_failed_at = None
+            except Exception:
+                self._start_failed_at = time.monotonic()
+                await self.stop()
+                raise HTTPException(status_code=503, detail="PDF browser is not running")
+
+    async def stop(self):
+        if self._idle is not None:
+            while not self._idle.empty():
+                await self._close_page(self._idle.get_nowait())
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _new_page(self) -> _PooledPage:
+        if not self._browser.is_connected():
+            self._browser = await self._playwright.chromium.launch(args=["--no-sandbox"])
+        context = await self._browser.new_context()
+        page = await context.new_page()
+        return _PooledPage(context, page)
+
+    async def _close_page(self, slot: _PooledPage):
+        try:
+            await slot.context.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a warm page; it goes back to the pool (or is recycled) on exit."""
+        if not self.is_running:
+            raise HTTPException(status_code=503, detail="PDF browser is not running")
+        if self._waiting >= self.max_waiting:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="PDF servisi meşgul, lütfen tekrar deneyin")
+
+        if self._missing:
+            self._missing -= 1
+            try:
+                self._idle.put_nowait(await self._new_page())
+            except Exception:
+                self._missing += 1
+                raise HTTPException(status_code=503, detail="PDF browser is not available")
+
+        self._waiting += 1
+        started = time.monotonic()
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="PDF servisi meşgul, lütfen tekrar deneyin")
+        finally:
+            self._waiting -= 1
+
+        waited = time.monotonic() - started
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._in_use += 1
+
+        healthy = True
+        try:
+            yield slot.page
+        except Exception:
+            healthy = False
+            self._failures += 1
+            raise
+        finally:
+            self._in_use -= 1
+            slot.renders += 1
+            if not healthy or slot.renders >= self.recycle_after or slot.page.is_closed():
+                await self._close_page(slot)
+                try:
+                    slot = await self._new_page()
+                    self._recycled += 1
+                except Exception:
+                    # The next borrower retries creating the missing page
+                    slot = None
+                    self._missing += 1
+            if slot is not None:
+                self._idle.put_nowait(slot)
+
+    async def render_pdf(self, html: str) -> bytes:
+        async with self.page() as page:
+            await page.set_content(html, wait_until="load")
+            pdf = await page.pdf(format="A4", print_background=True)
+        self._renders += 1
+        return pdf
+
+    def stats(self) -> dict:
+        borrowed = self._renders + self._failures
+        return {
+            "running": self.is_running,
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "max_waiting": self.max_waiting,
+            "recycle_after": self.recycle_after,
+            "renders": self._renders,
+            "failures": self._failures,
+            "recycled": self._recycled,
+            "rejected": self._rejected,
+            "avg_wait_ms": round(self._wait_total / borrowed * 1000, 2) if borrowed else 0.0,
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+        }
@@ -0,0 +1,156 @@
+"""
+Catalog Cache (ürünler, ürün grupları, yetkililer, maliyet kategorileri, döviz kurları, depo yerleşimi)
+- Koleksiyonlar bellekte sürümlü snapshot olarak tutulur; kararlı durumda Mongo'ya gidilmez
+- Yazma uçları invalidate() çağırır: sürüm artar, sonraki okuma yeniden yükler (ETag sürümü de artar)
+- Yükleme sırasında gelen invalidate kaybolmaz (snapshot eski sürümle etiketlenir, tekrar yüklenir)
+- Çoklu worker: snapshot, yüklenmeden önce okunan paylaşılan sayaç sürümüyle (collection_versions) etiketlenir;
+  ETag'li uçlar get_items(min_version=...) ile ETag'in sürümünden eski snapshot'ı yeniden yükler
+  (başka worker'ın yazdığı değişiklik eski gövdeyle yeni ETag altında sunulmaz).
+  Diğer okumalar için TTL: değişiklik en geç CATALOG_CACHE_TTL saniyede görülür; bilinmeyen bir id'ye rastlayan
+  okuyucu refresh() ile bu worker'ın snapshot'ını hemen yeniletebilir
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+import asyncio
+import os
+import time
+
+from collection_versions import current_version, touch
+from models import CostCategory, Product, Representative
+from serialization import model_projection
+
+_db = None
+
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "30"))
+
+
+class CatalogSnapshot(NamedTuple):
+    name: str
+    version: int
+    items: List[dict]
+    loaded_at: float
+    shared_version: int  # collection_versions counter read before the load
+
+
+# name -> (collection, projection, sort)
+CATALOGS = {
+    "products": ("products", model_projection(Product), None),
+    "product_groups": ("product_groups", {"_id": 0}, "sort_order"),
+    "representatives": ("representatives", model_projection(Representative), None),
+    "cost_categories": ("cost_categories", model_projection(CostCategory), "name"),
+    "exchange_rates": ("exchange_rates", {"_id": 0}, "date"),
+    # Warehouse layout (warehouse_locations); deleted records stay in, old stock still points at them
+    "warehouses": ("warehouses", {"_id": 0}, "name"),
+    "rack_groups": ("rack_groups", {"_id": 0}, "code"),
+    "rack_levels": ("rack_levels", {"_id": 0}, "level_number"),
+    "rack_slots": ("rack_slots", {"_id": 0}, "slot_number"),
+}
+
+_versions: Dict[str, int] = {name: 0 for name in CATALOGS}
+_snapshots: Dict[str, CatalogSnapshot] = {}
+_locks: Dict[str, asyncio.Lock] = {name: asyncio.Lock() for name in CATALOGS}
+_stats = {"hits": 0, "loads": 0, "invalidations": 0}
+
+
+def set_database(db):
+    global _db
+    _db = db
+    _snapshots.clear()
+
+
+async def invalidate(*names: str):
+    """Called by write paths; the next read reloads the collection and client ETags change."""
+    for name in names:
+        _versions[name] += 1
+        _snapshots.pop(name, None)
+        _stats["invalidations"] += 1
+    await touch(*names)
+
+
+def refresh(*names: str, min_age: float = 0.0) -> bool:
+    """
+    Drop this worker's snapshots (no shared version bump) so the next read reloads; for
+    readers that found an id this worker hasn't seen yet (written by another worker).
+    Snapshots younger than min_age are kept. Returns True if anything was dropped.
+    """
+    dropped = False
+    now = time.monotonic()
+    for name in names:
+        snapshot = _snapshots.get(name)
+        if snapshot is not None and now - snapshot.loaded_at >= min_age:
+            _versions[name] += 1
+            del _snapshots[name]
+            dropped = True
+    return dropped
+
+
+def _is_fresh(snapshot: Optional[CatalogSnapshot], min_version: Optional[int] = None) -> bool:
+    return (
+        snapshot is not None
+        and snapshot.version == _versions[snapshot.name]
+        and time.monotonic() - snapshot.loaded_at < CATALOG_CACHE_TTL
+        and (min_version is None or snapshot.shared_version >= min_version)
+    )
+
+
+async def _load(name: str) -> CatalogSnapshot:
+    collection, projection, sort = CATALOGS[name]
+    version = _versions[name]
+    shared_version = await current_version(name)
+    cursor = _db[collection].find({}, projection)
+    if sort:
+        cursor = cursor.sort(sort, 1)
+    items = await cursor.to_list(None)
+    _stats["loads"] += 1
+    return CatalogSnapshot(name, version, items, time.monotonic(), shared_version)
+
+
+async def get_snapshot(name: str, min_version: Optional[int] = None) -> CatalogSnapshot:
+    """
+    min_version: shared counter version the caller's ETag was built from; an older snapshot
+    (another worker wrote since it was loaded) is reloaded.
+    """
+    snapshot = _snapshots.get(name)
+    if _is_fresh(snapshot, min_version):
+        _stats["hits"] += 1
+        return snapshot
+    async with _locks[name]:
+        snapshot = _snapshots.get(name)
+        if _is_fresh(snapshot, min_version):
+            _stats["hits"] += 1
+            return snapshot
+        snapshot = await _load(name)
+        # An invalidate() during the load bumped the version: keep serving, but reload next time
+        if snapshot.version == _versions[name]:
+            _snapshots[name] = snapshot
+        return snapshot
+
+
+async def get_items(name: str, min_version: Optional[int] = None, **filters) -> List[dict]:
+    """Snapshot items matching equality filters (None values are ignored)."""
+    snapshot = await get_snapshot(name, min_version)
+    filters = {k: v for k, v in filters.items() if v is not None}
+    if not filters:
+        return snapshot.items
+    return [
+        item for item in snapshot.items
+        if all(item.get(k) == v for k, v in filters.items())
+    ]
+
+
+def stats() -> dict:
+    now = time.monotonic()
+    return {
+        "ttl_seconds": CATALOG_CACHE_TTL,
+        **_stats,
+        "catalogs": {
+            name: {
+                "version": _versions[name],
+                "cached": name in _snapshots,
+                "items": len(_snapshots[name].items) if name in _snapshots else 0,
+                "age_seconds": round(now - _snapshots[name].loaded_at, 1) if name in _snapshots else None,
+                "shared_version": _snapshots[name].shared_version if name in _snapshots else None,
+            }
+            for name in CATALOGS
+        },
+    }
@@ -0,0 +1,74 @@
+"""
+Collection Versions (conditional GET / ETag)
+- Her koleksiyon için counters'ta bir sürüm sayacı: {"_id": "version:<koleksiyon>", "seq": n}
+- Yazma uçları touch() ile sürümü artırır; okuma uçları sürümü tek bir _id sorgusuyla okur
+- ETag = sürüm(ler) + istek parametreleri; If-None-Match eşleşirse 304 döner,
+  dokümanlar hiç yüklenmez / serileştirilmez
+- Uygulama açılışında tüm sürümler artırılır (dışarıdan yapılan değişiklikler ve yeni sürüm dağıtımları için)
+"""
+
+from typing import Dict, Optional, Tuple
+import hashlib
+
+from fastapi import Request, Response
+
+from counters import current_sequence, next_sequence
+
+VERSIONED_COLLECTIONS = ("customers", "products", "product_groups", "stock_items")
+
+
+def _counter(name: str) -> str:
+    return f"version:{name}"
+
+
+async def touch(*names: str):
+    """Mark collections as changed (one $inc per collection)."""
+    for name in names:
+        await next_sequence(_counter(name))
+
+
+async def current_version(name: str) -> int:
+    return await current_sequence(_counter(name))
+
+
+async def current_versions(*names: str) -> Dict[str, int]:
+    return {name: await current_version(name) for name in names}
+
+
+def build_etag(request: Request, versions: Dict[str, int]) -> str:
+    params = sorted(request.query_params.multi_items())
+    raw = f"{request.url.path}|{[f'{name}:{seq}' for name, seq in versions.items()]}|{params}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+async def collection_etag(request: Request, *names: str) -> str:
+    return build_etag(request, await current_versions(*names))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    # Weak comparison: W/"x" matches "x"
+    return any((c[2:] if c.startswith("W/") else c) == etag for c in candidates)
+
+
+def cache_headers(etag: str) -> dict:
+    # no-cache: the browser keeps the copy but always revalidates with If-None-Match
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+async def conditional_get(request: Request, *names: str,
+                          versions: Optional[Dict[str, int]] = None) -> Tuple[str, Optional[Response]]:
+    """
+    Returns (etag, response). response is a ready 304 when the client's copy is current,
+    otherwise None and the caller builds the full response with cache_headers(etag).
+    versions: counters already read by the caller (current_versions), so the body can be
+    built from data at least that new (see catalog_cache.get_items(min_version=...)).
+    """
+    etag = build_etag(request, versions) if versions is not None else await collection_etag(request, *names)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return etag, Response(status_code=304, headers=cache_headers(etag))
+    return etag, None
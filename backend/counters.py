@@ -0,0 +1,44 @@
+"""
+Atomic Sequences (counters collection)
+- Her sayaç tek bir dokümandır: {"_id": name, "seq": son verilen numara}
+- find_one_and_update + $inc ile atomik artırılır; koleksiyon boyutundan bağımsız O(1)
+- Toplu import için tek seferde blok ayrılabilir
+"""
+
+from pymongo import ReturnDocument
+
+_db = None
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+async def next_sequence(name: str, count: int = 1) -> int:
+    """Atomically advance a sequence by count and return the new (last allocated) value."""
+    if count < 1:
+        raise ValueError("count must be >= 1")
+    doc = await _db.counters.find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["seq"]
+
+
+async def reserve_block(name: str, count: int) -> range:
+    """Pre-allocate count consecutive numbers in one round trip."""
+    last = await next_sequence(name, count)
+    return range(last - count + 1, last + 1)
+
+
+async def ensure_sequence_at_least(name: str, value: int):
+    """Seed a sequence so it never hands out numbers <= value (idempotent)."""
+    await _db.counters.update_one({"_id": name}, {"$max": {"seq": value}}, upsert=True)
+
+
+async def current_sequence(name: str) -> int:
+    doc = await _db.counters.find_one({"_id": name})
+    return doc["seq"] if doc else 0
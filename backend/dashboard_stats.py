@@ -0,0 +1,156 @@
+"""
+Dashboard Statistics (tek doküman)
+- dashboard_stats koleksiyonunda tek doküman: {"_id": "global", ...}
+- Sayılar: offer_status / invoice_status / delivery_status, aylık teklif toplamları (para birimi bazlı),
+  temsilci bazlı onaylanan toplamlar; arşivlenen teklifler sadece "archived" sayısında
+- Her teklifin katkısı hesaplanır; değişiklikte (önce, sonra) farkı tek $inc ile uygulanır
+- Tam yeniden hesaplama:  python dashboard_stats.py rebuild
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import asyncio
+import os
+import sys
+
+_db = None
+
+STATS_ID = "global"
+
+# Quotation fields a contribution depends on
+STATS_FIELDS = (
+    "is_archived", "offer_status", "invoice_status", "delivery_status",
+    "date", "created_at", "totals_by_currency", "representative_id",
+)
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _key(value, default: str) -> str:
+    """Safe field-name segment (no dots, no leading $)."""
+    text = str(value or default).replace(".", "_")
+    return text.lstrip("$") or default
+
+
+def _month(quotation: dict) -> str:
+    value = quotation.get("date") or quotation.get("created_at")
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    return str(value or "")[:7] or "unknown"
+
+
+def _totals(quotation: dict) -> Dict[str, float]:
+    totals = quotation.get("totals_by_currency") or {}
+    # Stored as {"totals": {...}, ...}; very old quotations have the flat {cur: amount} form
+    if isinstance(totals.get("totals"), dict):
+        totals = totals["totals"]
+    return {c: float(v or 0) for c, v in totals.items() if isinstance(v, (int, float))}
+
+
+def contribution(quotation: Optional[dict]) -> Dict[str, float]:
+    """What one quotation adds to the stats document, as dotted-path increments."""
+    if not quotation:
+        return {}
+    if quotation.get("is_archived"):
+        return {"archived": 1}
+
+    offer_status = _key(quotation.get("offer_status"), "pending")
+    month = _key(_month(quotation), "unknown")
+    totals = _totals(quotation)
+
+    c = {
+        "quotations": 1,
+        f"offer_status.{offer_status}": 1,
+        f"invoice_status.{_key(quotation.get('invoice_status'), 'none')}": 1,
+        f"delivery_status.{_key(quotation.get('delivery_status'), 'none')}": 1,
+        f"monthly.{month}.count": 1,
+    }
+    for currency, amount in totals.items():
+        c[f"monthly.{month}.totals.{_key(currency, 'EUR')}"] = amount
+
+    if offer_status == "accepted":
+        rep = _key(quotation.get("representative_id"), "none")
+        c[f"accepted_by_representative.{rep}.count"] = 1
+        for currency, amount in totals.items():
+            c[f"accepted_by_representative.{rep}.totals.{_key(currency, 'EUR')}"] = amount
+    return c
+
+
+def diff(before: Optional[dict], after: Optional[dict]) -> Dict[str, float]:
+    old, new = contribution(before), contribution(after)
+    delta = {}
+    for key in old.keys() | new.keys():
+        value = new.get(key, 0) - old.get(key, 0)
+        if value:
+            delta[key] = value
+    return delta
+
+
+async def apply_change(before: Optional[dict], after: Optional[dict]):
+    """Move the stats from quotation state `before` to `after` (None = did not exist)."""
+    delta = diff(before, after)
+    if not delta:
+        return
+    await _db.dashboard_stats.update_one(
+        {"_id": STATS_ID},
+        {"$inc": delta, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def _nest(flat: Dict[str, float]) -> dict:
+    doc = {}
+    for path, value in flat.items():
+        node = doc
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return doc
+
+
+async def rebuild() -> dict:
+    """Recompute the stats document from every quotation."""
+    projection = {"_id": 0, **{f: 1 for f in STATS_FIELDS}}
+    flat: Dict[str, float] = {}
+    async for quotation in _db.quotations.find({}, projection):
+        for key, value in contribution(quotation).items():
+            flat[key] = flat.get(key, 0) + value
+    doc = _nest(flat)
+    doc["updated_at"] = datetime.now(timezone.utc)
+    doc["rebuilt_at"] = doc["updated_at"]
+    await _db.dashboard_stats.replace_one({"_id": STATS_ID}, doc, upsert=True)
+    return doc
+
+
+async def get_stats() -> dict:
+    return await _db.dashboard_stats.find_one({"_id": STATS_ID}, {"_id": 0}) or {}
+
+
+async def ensure_built():
+    """Startup hook: build the stats document once if it was never built."""
+    if not await _db.dashboard_stats.find_one({"_id": STATS_ID}, {"_id": 1}):
+        await rebuild()
+
+
+async def _rebuild_cli():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    set_database(client[os.environ.get("DB_NAME", "quotation_db")])
+    try:
+        return await rebuild()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Kullanım: python dashboard_stats.py rebuild")
+        sys.exit(1)
+
+    stats = asyncio.run(_rebuild_cli())
+    print(f"Dashboard istatistikleri yeniden hesaplandı: {int(stats.get('quotations', 0))} teklif")
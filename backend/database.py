@@ -0,0 +1,129 @@
+"""
+MongoDB Client
+- İstemci uygulama açılışında (lifespan) oluşturulur, kapanışta kapatılır; açılışta ping atılır
+- Havuz ve zaman aşımı ayarları ortam değişkenlerinden:
+    MONGO_URL, DB_NAME
+    MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_MAX_IDLE_TIME_MS, MONGO_WAIT_QUEUE_TIMEOUT_MS
+    MONGO_SERVER_SELECTION_TIMEOUT_MS, MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS
+    MONGO_COMPRESSORS  (ör. "zstd,snappy"; zstandard / python-snappy paketleri kurulu olmalı)
+- Bağlantı havuzu olayları (CMAP) sayılır: açık / kullanımda / bekleyen bağlantılar -> GET /api/db/pool/stats
+"""
+
+from typing import Dict, Optional
+import os
+import threading
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "quotation_db")
+
+
+def _int_env(name: str, default: Optional[int]) -> Optional[int]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def client_options() -> dict:
+    """Keyword arguments for AsyncIOMotorClient; None leaves the driver default."""
+    options = {
+        "maxPoolSize": _int_env("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _int_env("MONGO_MIN_POOL_SIZE", 0),
+        "maxIdleTimeMS": _int_env("MONGO_MAX_IDLE_TIME_MS", None),
+        "waitQueueTimeoutMS": _int_env("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+        "serverSelectionTimeoutMS": _int_env("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000),
+        "connectTimeoutMS": _int_env("MONGO_CONNECT_TIMEOUT_MS", 10000),
+        "socketTimeoutMS": _int_env("MONGO_SOCKET_TIMEOUT_MS", None),
+    }
+    compressors = [c.strip() for c in os.environ.get("MONGO_COMPRESSORS", "").split(",") if c.strip()]
+    if compressors:
+        options["compressors"] = compressors
+    return {k: v for k, v in options.items() if v is not None}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters per server (events arrive on driver threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, Dict[str, int]] = {}
+
+    def _bump(self, address, **changes):
+        key = f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+        with self._lock:
+            pool = self._pools.setdefault(key, {
+                "open": 0, "in_use": 0, "waiting": 0,
+                "created": 0, "closed": 0, "checkout_failed": 0, "cleared": 0,
+            })
+            for field, delta in changes.items():
+                pool[field] += delta
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                address: {**pool, "idle": max(pool["open"] - pool["in_use"], 0)}
+                for address, pool in self._pools.items()
+            }
+
+    def pool_created(self, event):
+        self._bump(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        self._bump(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(event.address, waiting=-1, checkout_failed=1)
+
+    def connection_checked_out(self, event):
+        self._bump(event.address, waiting=-1, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._bump(event.address, in_use=-1)
+
+
+pool_stats = PoolStats()
+
+
+def create_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(MONGO_URL, event_listeners=[pool_stats], **client_options())
+
+
+async def ping(client: AsyncIOMotorClient):
+    """Fails fast (within serverSelectionTimeoutMS) when MongoDB is unreachable."""
+    await client.admin.command("ping")
+
+
+async def connection_stats(client: AsyncIOMotorClient) -> dict:
+    stats = {
+        "database": DB_NAME,
+        "config": client_options(),
+        "pools": pool_stats.snapshot(),
+    }
+    try:
+        status = await client.admin.command("serverStatus")
+        # Server side view: every client / worker connected to this mongod
+        stats["server_connections"] = status.get("connections")
+    except Exception:
+        stats["server_connections"] = None
+    return stats
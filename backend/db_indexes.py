@@ -0,0 +1,234 @@
+"""
+Index Registry
+- Tüm koleksiyonların indeksleri tek yerde (INDEXES); uygulama açılışında create_indexes ile sağlanır
+- create_indexes idempotenttir: var olan indeks tekrar oluşturulmaz
+- Oluşturulamayan indeks (ör. mevcut veride tekrar eden id) açılışı durdurmaz, loglanır ve raporda görünür
+- Rapor: tanımlı olup veritabanında olmayan (missing), veritabanında olup tanımlı olmayan (unregistered)
+  ve son yeniden başlatmadan beri hiç kullanılmamış (unused, $indexStats) indeksler
+- Elle:  python db_indexes.py ensure  |  python db_indexes.py report
+"""
+
+from typing import Dict, List, Tuple
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+_db = None
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _unique_id():
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+
+def _unique_string(field: str):
+    # Documents that store None for the field stay out of the index
+    return IndexModel([(field, ASCENDING)], unique=True,
+                      partialFilterExpression={field: {"$type": "string"}})
+
+
+# collection -> indexes; each compound index follows a route's filter + sort
+INDEXES: Dict[str, List[IndexModel]] = {
+    "customers": [
+        _unique_id(),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)]),       # /customers/paged
+        IndexModel([("is_active", ASCENDING), ("name", ASCENDING)]),
+    ],
+    "products": [
+        _unique_id(),
+        IndexModel([("item_short_name", ASCENDING), ("id", ASCENDING)]),   # /products/paged
+        IndexModel([("product_type", ASCENDING), ("is_active", ASCENDING)]),
+        IndexModel([("group_id", ASCENDING)]),
+        IndexModel([("models.sku", ASCENDING)]),                           # SOFIS import
+        IndexModel([("is_sofis_import", ASCENDING), ("brand", ASCENDING)]),
+    ],
+    "product_groups": [
+        _unique_id(),
+        IndexModel([("name", ASCENDING)]),
+        IndexModel([("sort_order", ASCENDING)]),
+    ],
+    "representatives": [
+        _unique_id(),
+        IndexModel([("name", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "cost_categories": [
+        _unique_id(),
+        IndexModel([("name", ASCENDING)]),
+    ],
+    "quotations": [
+        _unique_id(),
+        IndexModel([("created_at", DESCENDING)]),                          # GET /quotations
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("quotation_type", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("date", ASCENDING)]),                                 # PDF export by month
+        IndexModel([("revision_group_id", ASCENDING), ("revision_no", DESCENDING)]),
+        IndexModel([("line_items.product_id", ASCENDING)]),                # price history backfill
+    ],
+    "quotation_revisions": [
+        IndexModel([("revision_group_id", ASCENDING), ("revision_no", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)]),
+    ],
+    "product_price_history": [
+        IndexModel([("product_id", ASCENDING), ("date", DESCENDING)]),
+        IndexModel([("quotation_id", ASCENDING)]),
+        IndexModel([("customer_id", ASCENDING)]),
+    ],
+    "deliveries": [
+        _unique_id(),
+        _unique_string("idempotency_key"),
+        _unique_string("revert_idempotency_key"),
+        IndexModel([("quotation_id", ASCENDING)]),
+    ],
+    "exchange_rates": [
+        IndexModel([("date", ASCENDING)], unique=True),
+    ],
+    "warehouses": [
+        _unique_id(),
+        IndexModel([("code", ASCENDING)]),
+        IndexModel([("name", ASCENDING)]),
+    ],
+    "rack_groups": [
+        _unique_id(),
+        # Live rack codes are unique per warehouse (single and bulk create check it first);
+        # groups without is_deleted are backfilled at startup (ensure_rack_group_flags)
+        IndexModel([("warehouse_id", ASCENDING), ("code", ASCENDING)], name="warehouse_id_1_code_1_live",
+                   unique=True, partialFilterExpression={"is_deleted": False}),
+    ],
+    "rack_levels": [
+        _unique_id(),
+        IndexModel([("rack_group_id", ASCENDING), ("level_number", ASCENDING)]),
+    ],
+    "rack_slots": [
+        _unique_id(),
+        IndexModel([("rack_level_id", ASCENDING), ("slot_number", ASCENDING)]),
+    ],
+    "stock_items": [
+        _unique_id(),
+        # One record per (slot, product, variant): stock IN upserts on it (stock_mutations)
+        IndexModel([("rack_slot_id", ASCENDING), ("product_id", ASCENDING), ("variant_key", ASCENDING)],
+                   unique=True),
+        IndexModel([("product_id", ASCENDING), ("created_at", ASCENDING)]),   # reservations / delivery
+        IndexModel([("warehouse_id", ASCENDING), ("full_address", ASCENDING)]),
+        IndexModel([("full_address", ASCENDING)]),
+        IndexModel([("reservations.$**", ASCENDING)]),                       # reservations.<quotation_id>
+    ],
+    "stock_movements": [
+        IndexModel([("created_at", DESCENDING)]),
+        IndexModel([("warehouse_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("movement_type", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "inventory_counts": [
+        _unique_id(),
+        IndexModel([("is_approved", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "inventory_items": [
+        _unique_id(),
+        IndexModel([("category", ASCENDING), ("inventory_no", ASCENDING)]),
+    ],
+    "real_costs_transactions": [
+        IndexModel([("month", ASCENDING), ("bank", ASCENDING), ("currency", ASCENDING), ("parsed_date", DESCENDING)]),
+        IndexModel([("bank", ASCENDING), ("currency", ASCENDING), ("parsed_date", DESCENDING)]),
+        IndexModel([("upload_id", ASCENDING)]),
+    ],
+    "real_costs_uploads": [
+        _unique_id(),
+        IndexModel([("uploaded_at", DESCENDING)]),
+    ],
+    "real_costs_opening": [
+        IndexModel([("bank", ASCENDING), ("currency", ASCENDING)], unique=True),
+    ],
+}
+
+
+def _key(keys) -> Tuple:
+    """Comparable key pattern: (("id", 1), ...)"""
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction)
+                 for field, direction in keys)
+
+
+def _signature(keys, spec: dict) -> Tuple:
+    """Key pattern plus partial filter: what tells two indexes on the same keys apart."""
+    return _key(keys), repr(spec.get("partialFilterExpression"))
+
+
+async def ensure_indexes() -> dict:
+    """Create every registered index (one createIndexes call per collection)."""
+    created, failed = [], []
+    for collection, models in INDEXES.items():
+        try:
+            created += await _db[collection].create_indexes(models)
+        except OperationFailure:
+            # One bad index (duplicates, option conflict) fails the batch: retry one by one
+            for model in models:
+                try:
+                    created += await _db[collection].create_indexes([model])
+                except OperationFailure as e:
+                    name = model.document["name"]
+                    logger.warning(f"Index {collection}.{name} could not be created: {e}")
+                    failed.append({"collection": collection, "index": name, "error": str(e)})
+    return {"ensured": len(created), "failed": failed}
+
+
+async def _usage(collection: str) -> Dict[str, int]:
+    """Index name -> ops since the last server restart (empty when $indexStats is not allowed)."""
+    try:
+        stats = await _db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+    except OperationFailure:
+        return {}
+    return {s["name"]: int(s.get("accesses", {}).get("ops", 0)) for s in stats}
+
+
+async def index_report() -> dict:
+    """Missing / unregistered / unused indexes per collection."""
+    existing_collections = set(await _db.list_collection_names())
+    report = {}
+    for collection in sorted(existing_collections | set(INDEXES)):
+        registered = {_signature(m.document["key"].items(), m.document): m.document["name"]
+                      for m in INDEXES.get(collection, [])}
+        info = await _db[collection].index_information() if collection in existing_collections else {}
+        # Listed per index (not per key): a plain and a partial index may share a key pattern
+        present = [(_signature(spec["key"], spec), name) for name, spec in info.items()]
+        present_signatures = {signature for signature, _ in present}
+        usage = await _usage(collection) if info else {}
+
+        entry = {
+            "missing": [name for signature, name in registered.items() if signature not in present_signatures],
+            "unregistered": [name for signature, name in present
+                             if signature not in registered and name != "_id_"],
+            "unused": [name for name, ops in usage.items() if ops == 0 and name != "_id_"],
+        }
+        if any(entry.values()):
+            report[collection] = entry
+    return report
+
+
+async def _cli(command: str):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    set_database(client[os.environ.get("DB_NAME", "quotation_db")])
+    try:
+        if command == "ensure":
+            return await ensure_indexes()
+        return await index_report()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("ensure", "report"):
+        print("Kullanım: python db_indexes.py ensure|report")
+        sys.exit(1)
+
+    print(json.dumps(asyncio.run(_cli(sys.argv[1])), indent=2, ensure_ascii=False))
@@ -0,0 +1,172 @@
+"""
+Döviz Kuru API
+- CSV / XLSX yükleme (günlük kurlar). İki format desteklenir:
+    geniş:  Tarih | USD | EUR            (her satır bir gün)
+    uzun:   Tarih | Döviz | Kur          (her satır bir gün + döviz)
+- Kurlar TRY cinsindendir (1 EUR = x TRY); aynı gün tekrar yüklenirse üzerine yazılır
+- Sunucu tarafında toplu dönüştürme: POST /exchange-rates/convert
+"""
+
+from fastapi import APIRouter, HTTPException, UploadFile, File, Body
+from typing import Dict, Optional
+from datetime import datetime, timezone
+import io
+
+from pymongo import UpdateOne
+
+from catalog_cache import get_items as get_catalog_items, invalidate as invalidate_catalog
+from exchange_rates import QUOTE_CURRENCY, get_rate_table, normalize_currency, to_date_key
+from lazy_imports import lazy_module
+
+pd = lazy_module("pandas")
+
+router = APIRouter(tags=["Exchange Rates"])
+
+_db = None
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _require_db():
+    if _db is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+
+
+DATE_COLUMNS = ("date", "tarih")
+CURRENCY_COLUMNS = ("currency", "döviz", "doviz", "para birimi", "para_birimi")
+RATE_COLUMNS = ("rate", "kur", "döviz satış", "doviz satis", "satış", "satis")
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, str):
+        value = value.strip().replace(" ", "")
+        # 1.234,56 -> 1234.56 ; 35,12 -> 35.12
+        if "," in value:
+            value = value.replace(".", "").replace(",", ".")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def _read_frame(filename: str, content: bytes) -> "pd.DataFrame":
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return pd.read_csv(io.BytesIO(content), sep=None, engine="python", dtype=str)
+    if name.endswith((".xlsx", ".xls")):
+        return pd.read_excel(io.BytesIO(content))
+    raise HTTPException(status_code=400, detail="Sadece CSV veya Excel dosyası (.csv, .xlsx, .xls)")
+
+
+def parse_rate_file(filename: str, content: bytes) -> Dict[str, Dict[str, float]]:
+    """Returns {"YYYY-MM-DD": {"EUR": 35.1, "USD": 32.4}}"""
+    try:
+        df = _read_frame(filename, content)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Dosya okuma hatası: {str(e)}")
+
+    columns = {str(c).strip().lower(): c for c in df.columns}
+    date_col = next((columns[c] for c in DATE_COLUMNS if c in columns), None)
+    if date_col is None:
+        raise HTTPException(status_code=400, detail="Tarih sütunu bulunamadı (Tarih / Date)")
+
+    dates = pd.to_datetime(df[date_col], dayfirst=True, errors="coerce", format="mixed")
+    currency_col = next((columns[c] for c in CURRENCY_COLUMNS if c in columns), None)
+    rate_col = next((columns[c] for c in RATE_COLUMNS if c in columns), None)
+
+    rates: Dict[str, Dict[str, float]] = {}
+    if currency_col is not None and rate_col is not None:
+        for day, currency, rate in zip(dates, df[currency_col], df[rate_col]):
+            rate = _to_float(rate)
+            if pd.isna(day) or rate is None or not currency:
+                continue
+            rates.setdefault(day.date().isoformat(), {})[normalize_currency(currency)] = rate
+    else:
+        currency_columns = {
+            c: normalize_currency(c) for c in df.columns
+            if c != date_col and len(normalize_currency(c)) == 3 and normalize_currency(c).isalpha()
+        }
+        if not currency_columns:
+            raise HTTPException(status_code=400, detail="Döviz sütunları bulunamadı (ör. USD, EUR)")
+        for i, day in enumerate(dates):
+            if pd.isna(day):
+                continue
+            for col, currency in currency_columns.items():
+                rate = _to_float(df[col].iloc[i])
+                if rate is not None:
+                    rates.setdefault(day.date().isoformat(), {})[currency] = rate
+
+    # The quote currency is always 1 and never stored
+    for day_rates in rates.values():
+        day_rates.pop(QUOTE_CURRENCY, None)
+    return {day: r for day, r in rates.items() if r}
+
+
+@router.post("/upload")
+async def upload_exchange_rates(file: UploadFile = File(...)):
+    """Upload daily rates (TRY per unit); existing days are updated per currency."""
+    _require_db()
+    rates = parse_rate_file(file.filename or "", await file.read())
+    if not rates:
+        raise HTTPException(status_code=400, detail="Kur bulunamadı")
+
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"date": day},
+            {
+                "$set": {**{f"rates.{c}": r for c, r in day_rates.items()},
+                         "source": file.filename, "updated_at": now},
+                "$setOnInsert": {"date": day, "created_at": now},
+            },
+            upsert=True,
+        )
+        for day, day_rates in rates.items()
+    ]
+    await _db.exchange_rates.bulk_write(ops, ordered=False)
+    await invalidate_catalog("exchange_rates")
+
+    days = sorted(rates)
+    currencies = sorted({c for r in rates.values() for c in r})
+    return {"ok": True, "days": len(days), "from": days[0], "to": days[-1], "currencies": currencies,
+            "message": f"{len(days)} günlük kur yüklendi ({', '.join(currencies)})"}
+
+
+@router.get("")
+async def list_exchange_rates(start: Optional[str] = None, end: Optional[str] = None):
+    items = await get_catalog_items("exchange_rates")
+    return [
+        {"date": r["date"], "rates": r.get("rates", {}), "source": r.get("source")}
+        for r in items
+        if (not start or r["date"] >= start) and (not end or r["date"] <= end)
+    ]
+
+
+@router.get("/rate")
+async def get_exchange_rate(currency: str, date: Optional[str] = None, base: str = QUOTE_CURRENCY):
+    """1 unit of currency in base on the date (latest known rate on or before it)."""
+    table = await get_rate_table()
+    on = date or to_date_key(datetime.now(timezone.utc))
+    value = table.convert(1, currency, base, on)
+    if value is None:
+        raise HTTPException(status_code=404, detail=f"{normalize_currency(currency)}/{normalize_currency(base)} için {on} tarihinde kur yok")
+    return {"currency": normalize_currency(currency), "base": normalize_currency(base), "date": on, "rate": value}
+
+
+@router.post("/convert")
+async def convert_amounts(payload: dict = Body(...)):
+    """
+    {"base": "EUR", "date": "2024-05-01", "rows": [{"date": "...", "amounts": {"TRY": 1000, "USD": 50}}]}
+    Rows without a date use the payload date (default today).
+    """
+    base = payload.get("base") or "EUR"
+    default_date = payload.get("date") or to_date_key(datetime.now(timezone.utc))
+    table = await get_rate_table()
+    return table.convert_rows(payload.get("rows") or [], base, default_date)
@@ -0,0 +1,113 @@
+"""
+Exchange Rate Store (döviz kurları)
+- Günlük kurlar exchange_rates koleksiyonunda: {"date": "YYYY-MM-DD", "rates": {"EUR": 35.12, "USD": 32.40}}
+- Kurlar QUOTE_CURRENCY (TRY) cinsindendir: 1 EUR = 35.12 TRY
+- Bellekte tarih sıralı tablo (katalog önbelleğinden); tarih -> kur araması bisect + memo
+- Kur olmayan günlerde (hafta sonu / tatil) o tarihten önceki en son kur kullanılır
+- Dönüştürme: amount * kur(from) / kur(to); rapor satırları tek geçişte çevrilir
+"""
+
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from catalog_cache import get_snapshot
+
+QUOTE_CURRENCY = "TRY"
+
+CURRENCY_ALIASES = {"TL": "TRY", "YTL": "TRY", "EURO": "EUR", "€": "EUR", "$": "USD"}
+
+
+def normalize_currency(code) -> str:
+    code = str(code or "").strip().upper()
+    return CURRENCY_ALIASES.get(code, code)
+
+
+def to_date_key(value) -> str:
+    """date / datetime / ISO string -> 'YYYY-MM-DD'."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)[:10]
+
+
+class RateTable:
+    """Immutable, date-sorted view over the stored rate documents."""
+
+    def __init__(self, docs: List[dict]):
+        self.source = docs
+        docs = sorted((d for d in docs if d.get("date") and d.get("rates")), key=lambda d: d["date"])
+        self.dates = [d["date"] for d in docs]
+        self.rates = [{normalize_currency(c): float(r) for c, r in d["rates"].items() if r} for d in docs]
+        self._memo: Dict[Tuple[str, str], Optional[float]] = {}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def rate(self, currency: str, on) -> Optional[float]:
+        """QUOTE_CURRENCY per 1 unit of currency, using the latest rate on or before the date."""
+        currency = normalize_currency(currency)
+        if currency == QUOTE_CURRENCY:
+            return 1.0
+        key = (currency, to_date_key(on))
+        if key in self._memo:
+            return self._memo[key]
+        value = None
+        i = bisect_right(self.dates, key[1])
+        while i > 0:
+            i -= 1
+            if currency in self.rates[i]:
+                value = self.rates[i][currency]
+                break
+        self._memo[key] = value
+        return value
+
+    def convert(self, amount: float, from_currency: str, to_currency: str, on) -> Optional[float]:
+        if normalize_currency(from_currency) == normalize_currency(to_currency):
+            return float(amount or 0)
+        source = self.rate(from_currency, on)
+        target = self.rate(to_currency, on)
+        if source is None or target is None:
+            return None
+        return float(amount or 0) * source / target
+
+    def convert_amounts(self, amounts: Dict[str, float], to_currency: str, on) -> dict:
+        """{"EUR": 10, "TRY": 500} -> {"total": x, "missing": [currencies without a rate]}"""
+        total = 0.0
+        missing = []
+        for currency, amount in (amounts or {}).items():
+            converted = self.convert(amount, currency, to_currency, on)
+            if converted is None:
+                missing.append(currency)
+            else:
+                total += converted
+        return {"total": round(total, 2), "missing": missing}
+
+    def convert_rows(self, rows: Iterable[dict], to_currency: str, default_date=None) -> dict:
+        """
+        One pass over report rows: [{"date": ..., "amounts": {cur: amount}}, ...]
+        Returns per-row totals in to_currency plus the grand total.
+        """
+        result = []
+        grand = 0.0
+        missing = set()
+        for row in rows:
+            converted = self.convert_amounts(row.get("amounts") or {}, to_currency, row.get("date") or default_date)
+            grand += converted["total"]
+            missing.update(converted["missing"])
+            result.append({**row, "converted": converted["total"], "missing": converted["missing"]})
+        return {"base": normalize_currency(to_currency), "rows": result,
+                "total": round(grand, 2), "missing": sorted(missing)}
+
+
+_table: Optional[RateTable] = None
+
+
+async def get_rate_table() -> RateTable:
+    """Built from the cached exchange_rates snapshot; rebuilt only when the snapshot changes."""
+    global _table
+    snapshot = await get_snapshot("exchange_rates")
+    if _table is None or _table.source is not snapshot.items:
+        _table = RateTable(snapshot.items)
+    return _table
@@ -0,0 +1,68 @@
+"""
+Lazy Imports (ağır kütüphaneler)
+- pandas / ReportLab / Playwright modül yüklenirken değil, ilk kullanımda import edilir
+- LazyModule: `pd = lazy_module("pandas")` -> ilk `pd.xxx` erişiminde gerçek modül yüklenir
+- Ön ısıtma (isteğe bağlı, PREWARM_HEAVY_IMPORTS=1, varsayılan kapalı): sunucu istek kabul etmeye başladıktan
+  sonra API sürecinin kullandıkları (pandas / openpyxl / Playwright) arka planda (thread) yüklenir
+- ReportLab API sürecinde hiç yüklenmez: native PDF'ler render_service süreçlerinde çizilir,
+  orada süreç başlatılırken (initializer) yüklenir
+- Ölçüm:  python tests/benchmark_import_time.py
+"""
+
+from typing import Iterable
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use by the Excel import / PDF modules
+HEAVY_MODULES = ("pandas", "openpyxl", "reportlab.platypus", "playwright.async_api")
+# Used in the API process (Excel import, browser PDF) / in the render_service worker processes
+API_PROCESS_MODULES = ("pandas", "openpyxl", "playwright.async_api")
+RENDER_WORKER_MODULES = ("reportlab.platypus",)
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    module = importlib.import_module(self.__dict__["_name"])
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<lazy module {self.__dict__['_name']!r} ({state})>"
+
+
+def lazy_module(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def prewarm(names: Iterable[str] = API_PROCESS_MODULES) -> dict:
+    """Import modules now (run in a thread); missing optional ones are skipped. Returns seconds per module."""
+    timings = {}
+    for name in names:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Pre-warm import of {name} skipped: {e}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
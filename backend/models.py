@@ -164,6 +164,8 @@ class LineItemCreate(BaseModel):
     unit: str
     currency: str
     unit_price: float
+    discount_type: str = "none"  # none | percent | fixed
+    discount_value: float = 0.0
     cost_price: Optional[float] = None
     is_optional: bool = False
 
@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) Pagination
+- Sıralama sabit bir anahtar + id ile yapılır; sayfa atlamak için skip kullanılmaz
+- Cursor, son kaydın (sıralama değeri, id) çiftinin base64 halidir; değeri boş (null / alan yok) kayıtlar
+  en başta sıralanır ve cursor'da null olarak taşınır
+- fields= parametresi ile sadece istenen alanlar döner
+"""
+
+from typing import Optional, Iterable
+import base64
+import json
+import re
+
+from fastapi import HTTPException
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort_value, doc_id: str) -> str:
+    raw = json.dumps([sort_value, doc_id], ensure_ascii=False, default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        sort_value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        return sort_value, doc_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+
+def prefix_filter(value: str) -> dict:
+    """Anchored, case-insensitive prefix match."""
+    return {"$regex": "^" + re.escape(value), "$options": "i"}
+
+
+def build_projection(fields: Optional[str], allowed: Iterable[str], always: Iterable[str]) -> dict:
+    """fields="name,email" -> {"_id": 0, "name": 1, "email": 1, <always>: 1}"""
+    if not fields:
+        return {"_id": 0}
+    allowed = set(allowed)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Bilinmeyen alan(lar): {', '.join(unknown)}")
+    projection = {"_id": 0}
+    for f in list(always) + requested:
+        projection[f] = 1
+    return projection
+
+
+async def keyset_page(
+    collection,
+    query: dict,
+    sort_field: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    projection: Optional[dict] = None,
+) -> dict:
+    """
+    One page sorted by (sort_field, id) ascending.
+    Returns {"items": [...], "next_cursor": str | None}
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if last_value is None:
+            # Missing / null values sort first; {"$gt": None} would match nothing
+            after = {"$or": [
+                {sort_field: None, "id": {"$gt": last_id}},
+                {sort_field: {"$ne": None}},
+            ]}
+        else:
+            after = {"$or": [
+                {sort_field: {"$gt": last_value}},
+                {sort_field: last_value, "id": {"$gt": last_id}},
+            ]}
+        query = {"$and": [query, after]} if query else after
+
+    docs = await collection.find(query, projection or {"_id": 0}).sort(
+        [(sort_field, 1), ("id", 1)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last["id"])
+    return {"items": docs, "next_cursor": next_cursor}
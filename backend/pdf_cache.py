@@ -0,0 +1,116 @@
+"""
+PDF Render Cache
+- Teklif PDF'leri diskte, içerik hash'i ile saklanır
+- Aynı teklif değişmeden tekrar indirildiğinde render yerine dosya döner
+- Toplam boyut sınırı aşıldığında en eski kullanılan dosyalar silinir (LRU)
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+def compute_cache_key(payload: dict) -> str:
+    """Stable sha256 of a JSON-serializable payload (datetimes are stringified)."""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PdfRenderCache:
+    """
+    Size-bounded LRU cache of rendered PDFs on disk.
+
+    Files are named "<quotation_id>_<key>.pdf" so that storing a new render for a
+    quotation drops its previous (stale) render immediately.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # filename -> size, oldest first
+        self._total_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = sorted(self.directory.glob("*.pdf"), key=lambda f: f.stat().st_mtime)
+        for f in files:
+            size = f.stat().st_size
+            self._entries[f.name] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def _filename(quotation_id: str, key: str) -> str:
+        return f"{quotation_id}_{key}.pdf"
+
+    def _remove(self, filename: str):
+        size = self._entries.pop(filename, 0)
+        self._total_bytes -= size
+        try:
+            (self.directory / filename).unlink()
+        except FileNotFoundError:
+            pass
+
+    def get(self, quotation_id: str, key: str) -> Optional[Path]:
+        filename = self._filename(quotation_id, key)
+        path = self.directory / filename
+        with self._lock:
+            if filename not in self._entries or not path.exists():
+                self._entries.pop(filename, None)
+                self._misses += 1
+                return None
+            self._entries.move_to_end(filename)
+            self._hits += 1
+        try:
+            os.utime(path)  # keep LRU order across restarts
+        except OSError:
+            pass
+        return path
+
+    def put(self, quotation_id: str, key: str, rendered_path: str) -> Path:
+        """Move a freshly rendered PDF into the cache and return its cached path."""
+        filename = self._filename(quotation_id, key)
+        target = self.directory / filename
+        tmp_target = self.directory / f".{filename}.tmp"
+        shutil.move(rendered_path, tmp_target)
+        os.replace(tmp_target, target)
+        size = target.stat().st_size
+
+        with self._lock:
+            prefix = f"{quotation_id}_"
+            for stale in [n for n in self._entries if n.startswith(prefix) and n != filename]:
+                self._remove(stale)
+
+            self._total_bytes -= self._entries.pop(filename, 0)
+            self._entries[filename] = size
+            self._total_bytes += size
+
+            # Evict least recently used, never the entry we just stored
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return target
+
+    def invalidate(self, quotation_id: str):
+        prefix = f"{quotation_id}_"
+        with self._lock:
+            for name in [n for n in self._entries if n.startswith(prefix)]:
+                self._remove(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "total_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
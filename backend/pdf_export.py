@@ -0,0 +1,62 @@
+"""
+Streamed ZIP Export
+- Dosyalar hazır oldukça ZIP'e eklenir ve parça parça istemciye gönderilir
+- Bellek kullanımı dosya sayısından bağımsızdır (sadece küçük bir tampon)
+"""
+
+from datetime import datetime, timezone
+from typing import AsyncIterator, Tuple, BinaryIO
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer:
+    """Write-only, non-seekable sink for ZipFile; drained after every chunk."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+async def stream_zip(entries: AsyncIterator[Tuple[str, BinaryIO]]) -> AsyncIterator[bytes]:
+    """
+    Build a ZIP from (arcname, open binary file) pairs as they arrive.
+    PDFs are already compressed, so entries are stored without deflate.
+    """
+    sink = _ZipStreamBuffer()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        async for arcname, fileobj in entries:
+            info = zipfile.ZipInfo(arcname, date_time=datetime.now(timezone.utc).timetuple()[:6])
+            try:
+                with zf.open(info, mode="w", force_zip64=True) as dest:
+                    while True:
+                        chunk = fileobj.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            finally:
+                fileobj.close()
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
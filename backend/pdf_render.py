@@ -0,0 +1,214 @@
+"""
+Quotation PDF Templates
+- ReportLab ile native PDF (generate-pdf)
+- Tarayıcıda PDF'e çevrilen HTML şablonu (generate-pdf-v2)
+
+Bu modül bilinçli olarak hafif tutulur (FastAPI / Mongo import etmez);
+render işleri ayrı süreçlerde çalışırken sadece bu modül yüklenir.
+ReportLab ilk native render'da import edilir (uygulama açılışını yavaşlatmaz).
+"""
+
+from datetime import datetime
+import html
+
+from quotation_totals import compute_quotation_totals
+
+# Bump when the layout of build_native_quotation_pdf changes so cached PDFs are re-rendered
+NATIVE_PDF_TEMPLATE_VERSION = "2"
+
+# Quotation fields read by build_native_quotation_pdf
+NATIVE_PDF_FIELDS = (
+    "quote_no", "subject", "customer_name", "date", "project_code", "notes", "line_items",
+    "discount_type", "discount_value", "discount_currency",
+)
+
+
+def format_currency(amount: float, currency: str) -> str:
+    try:
+        return f"{float(amount):,.2f} {currency}".replace(",", " ")
+    except Exception:
+        return f"{amount} {currency}"
+
+
+def _totals_lines(totals: dict) -> list:
+    """(label, amount, currency) rows: subtotal and general discount only when a discount applies."""
+    lines = []
+    for currency, total in totals["totals"].items():
+        discount = totals["discounts"].get(currency, 0)
+        if discount:
+            lines.append(("Ara Toplam", totals["subtotals"][currency], currency))
+            lines.append(("İndirim", -discount, currency))
+        lines.append(("Toplam", total, currency))
+    return lines
+
+
+def build_native_quotation_pdf(quotation: dict, pdf_path: str) -> None:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+    doc = SimpleDocTemplate(
+        pdf_path,
+        pagesize=A4,
+        leftMargin=36,
+        rightMargin=36,
+        topMargin=36,
+        bottomMargin=36,
+        title=f"Teklif {quotation.get('quote_no', '')}",
+    )
+    styles = getSampleStyleSheet()
+    elements = []
+
+    title = quotation.get("subject") or "Teklif"
+    elements.append(Paragraph(f"<b>{title}</b>", styles["Title"]))
+    elements.append(Spacer(1, 12))
+
+    customer_name = quotation.get("customer_name") or "-"
+    quote_no = quotation.get("quote_no") or "-"
+    date_value = quotation.get("date")
+    if isinstance(date_value, datetime):
+        date_text = date_value.strftime("%d.%m.%Y")
+    else:
+        date_text = str(date_value) if date_value else "-"
+
+    meta_lines = [
+        f"<b>Teklif No:</b> {quote_no}",
+        f"<b>Müşteri:</b> {customer_name}",
+        f"<b>Tarih:</b> {date_text}",
+        f"<b>Proje Kodu:</b> {quotation.get('project_code') or '-'}",
+    ]
+    for line in meta_lines:
+        elements.append(Paragraph(line, styles["Normal"]))
+    elements.append(Spacer(1, 16))
+
+    computed = compute_quotation_totals(quotation)
+    line_items = computed["line_items"]
+    if line_items:
+        table_data = [["#", "Kalem", "Adet", "Birim", "Birim Fiyat", "Toplam"]]
+
+        idx_counter = 0
+        for item in line_items:
+            if item.get("is_optional"):
+                continue
+            idx_counter += 1
+            currency = item.get("currency") or "EUR"
+            quantity = float(item.get("quantity") or 0)
+            unit = item.get("unit") or ""
+            unit_price = float(item.get("unit_price") or 0)
+            line_total = item["line_total"]
+
+            table_data.append([
+                str(idx_counter),
+                item.get("item_short_name") or "-",
+                f"{quantity:g}",
+                unit,
+                format_currency(unit_price, currency),
+                format_currency(line_total, currency),
+            ])
+
+        table = Table(table_data, repeatRows=1, hAlign="LEFT")
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004aad")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
+        ]))
+        elements.append(table)
+        elements.append(Spacer(1, 16))
+
+        totals_rows = [["Toplamlar", ""]]
+        for label, amount, currency in _totals_lines(computed["totals_by_currency"]):
+            totals_rows.append([f"{label} ({currency})", format_currency(amount, currency)])
+        totals_table = Table(totals_rows, colWidths=[120, 120], hAlign="RIGHT")
+        totals_table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004aad")),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ]))
+        elements.append(totals_table)
+    else:
+        elements.append(Paragraph("Kalem bulunamadı.", styles["Normal"]))
+
+    notes = quotation.get("notes")
+    if notes:
+        elements.append(Spacer(1, 16))
+        elements.append(Paragraph("<b>Notlar</b>", styles["Heading3"]))
+        elements.append(Paragraph(notes, styles["BodyText"]))
+
+    doc.build(elements)
+
+
+def build_quotation_html(quotation: dict) -> str:
+    """HTML version of the quotation for the browser-rendered PDF (generate-pdf-v2)."""
+    esc = lambda v: html.escape(str(v)) if v not in (None, "") else "-"
+
+    date_value = quotation.get("date")
+    if isinstance(date_value, datetime):
+        date_text = date_value.strftime("%d.%m.%Y")
+    else:
+        date_text = str(date_value)[:10] if date_value else "-"
+
+    computed = compute_quotation_totals(quotation)
+    rows = []
+    idx_counter = 0
+    for item in computed["line_items"]:
+        if item.get("is_optional"):
+            continue
+        idx_counter += 1
+        currency = item.get("currency") or "EUR"
+        quantity = float(item.get("quantity") or 0)
+        unit_price = float(item.get("unit_price") or 0)
+        line_total = item["line_total"]
+
+        rows.append(
+            f"<tr><td>{idx_counter}</td><td>{esc(item.get('item_short_name'))}</td>"
+            f"<td class='num'>{quantity:g}</td><td>{html.escape(item.get('unit') or '')}</td>"
+            f"<td class='num'>{format_currency(unit_price, currency)}</td>"
+            f"<td class='num'>{format_currency(line_total, currency)}</td></tr>"
+        )
+
+    if rows:
+        totals_rows = "".join(
+            f"<tr><td>{html.escape(label)} ({currency})</td><td class='num'>{format_currency(amount, currency)}</td></tr>"
+            for label, amount, currency in _totals_lines(computed["totals_by_currency"])
+        )
+        items_html = (
+            "<table><thead><tr><th>#</th><th>Kalem</th><th>Adet</th><th>Birim</th>"
+            "<th>Birim Fiyat</th><th>Toplam</th></tr></thead>"
+            f"<tbody>{''.join(rows)}</tbody></table>"
+            "<table class='totals'><thead><tr><th colspan='2'>Toplamlar</th></tr></thead>"
+            f"<tbody>{totals_rows}</tbody></table>"
+        )
+    else:
+        items_html = "<p>Kalem bulunamadı.</p>"
+
+    notes = quotation.get("notes")
+    notes_html = f"<h3>Notlar</h3><p>{html.escape(notes)}</p>" if notes else ""
+
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Teklif {esc(quotation.get('quote_no'))}</title>
+<style>
+  @page {{ size: A4; margin: 12mm; }}
+  body {{ font-family: Helvetica, Arial, sans-serif; font-size: 11px; color: #222; }}
+  h1 {{ text-align: center; font-size: 20px; }}
+  table {{ border-collapse: collapse; width: 100%; margin-top: 16px; }}
+  th {{ background: #004aad; color: #fff; text-align: left; }}
+  th, td {{ border: 0.5px solid #999; padding: 4px 6px; vertical-align: top; }}
+  tbody tr:nth-child(odd) {{ background: #f5f5f5; }}
+  tbody tr:nth-child(even) {{ background: #d3d3d3; }}
+  td.num {{ text-align: right; white-space: nowrap; }}
+  table.totals {{ width: 240px; margin-left: auto; }}
+</style></head>
+<body>
+  <h1>{esc(quotation.get('subject') or 'Teklif')}</h1>
+  <p><b>Teklif No:</b> {esc(quotation.get('quote_no'))}<br>
+     <b>Müşteri:</b> {esc(quotation.get('customer_name'))}<br>
+     <b>Tarih:</b> {esc(date_text)}<br>
+     <b>Proje Kodu:</b> {esc(quotation.get('project_code'))}</p>
+  {items_html}
+  {notes_html}
+</body></html>"""
@@ -0,0 +1,120 @@
+"""
+Product Price History Index
+- Tekliflerdeki her ürün satırı için küçük bir kayıt: product_price_history
+- (product_id, date desc) indeksi ile fiyat geçmişi tek sorguda döner (indeksler db_indexes kaydında)
+- Müşteri adı kayda kopyalanır (ayrı müşteri sorgusu gerekmez)
+- Teklif oluşturma / güncelleme / silmede senkronize edilir
+- Mevcut veriler için backfill:  python price_history.py backfill
+"""
+
+from pymongo import DESCENDING, DeleteMany, InsertOne
+import asyncio
+import os
+import sys
+
+_db = None
+
+BACKFILL_BATCH = 500
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def history_entries(quotation: dict) -> list:
+    """One history row per line item that references a product."""
+    entries = []
+    for item in quotation.get("line_items", []) or []:
+        product_id = item.get("product_id")
+        if not product_id:
+            continue
+        entries.append({
+            "quotation_id": quotation["id"],
+            "quotation_number": quotation.get("quote_no", ""),
+            "product_id": product_id,
+            "customer_id": quotation.get("customer_id"),
+            "customer_name": quotation.get("customer_name") or "Bilinmiyor",
+            "date": quotation.get("created_at", ""),
+            "unit_price": item.get("unit_price", 0),
+            "currency": item.get("currency", "EUR"),
+            "quantity": item.get("quantity", 1),
+            "variant_name": item.get("variant_name", ""),
+            "item_name": item.get("item_short_name", ""),
+        })
+    return entries
+
+
+def _sync_ops(quotation: dict) -> list:
+    return [DeleteMany({"quotation_id": quotation["id"]})] + [InsertOne(e) for e in history_entries(quotation)]
+
+
+async def sync_quotation(quotation: dict):
+    """Replace the history rows of one quotation in one bulk_write."""
+    await _db.product_price_history.bulk_write(_sync_ops(quotation), ordered=True)
+
+
+async def remove_quotation(quotation_id: str):
+    await _db.product_price_history.delete_many({"quotation_id": quotation_id})
+
+
+async def rename_customer(customer_id: str, customer_name: str):
+    await _db.product_price_history.update_many(
+        {"customer_id": customer_id}, {"$set": {"customer_name": customer_name}}
+    )
+
+
+async def get_history(product_id: str, limit: int = 5) -> list:
+    cursor = _db.product_price_history.find(
+        {"product_id": product_id}, {"_id": 0, "product_id": 0, "customer_id": 0}
+    ).sort("date", DESCENDING).limit(limit)
+    return await cursor.to_list(limit)
+
+
+async def backfill() -> int:
+    """Rebuild the whole index from the quotations collection."""
+    await _db.product_price_history.delete_many({})
+    projection = {
+        "_id": 0, "id": 1, "quote_no": 1, "customer_id": 1, "customer_name": 1,
+        "created_at": 1, "line_items": 1,
+    }
+    ops = []
+    written = 0
+    async for quotation in _db.quotations.find({"line_items.product_id": {"$exists": True}}, projection):
+        entries = history_entries(quotation)
+        ops.extend(InsertOne(e) for e in entries)
+        if len(ops) >= BACKFILL_BATCH:
+            await _db.product_price_history.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        await _db.product_price_history.bulk_write(ops, ordered=False)
+        written += len(ops)
+    return written
+
+
+async def ensure_backfilled():
+    """Startup hook: backfill once if the collection was never built (indexes: db_indexes)."""
+    if await _db.product_price_history.estimated_document_count() == 0:
+        if await _db.quotations.find_one({"line_items.product_id": {"$exists": True}}, {"_id": 1}):
+            await backfill()
+
+
+async def _backfill_cli():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    set_database(client[os.environ.get("DB_NAME", "quotation_db")])
+    try:
+        return await backfill()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Kullanım: python price_history.py backfill")
+        sys.exit(1)
+
+    count = asyncio.run(_backfill_cli())
+    print(f"{count} fiyat geçmişi kaydı oluşturuldu")
@@ -0,0 +1,152 @@
+"""
+Product Search Index (teklif satırı ürün seçici)
+- Bellekte ters indeks: item_short_name, brand, category, models.sku, models.model_name
+- Türkçe duyarlı katlama: İ/I/ı/i, ş, ğ, ü, ö, ç aynı harfe indirgenir ("İSTANBUL" = "istanbul" = "ıstanbul")
+- Her sorgu kelimesi bir ürün kelimesinin başıyla eşleşmeli (prefix, AND)
+- Sıralama: tam ad eşleşmesi > ad başlangıcı > ad kelimesi > SKU/model > marka > kategori
+- Katalog önbelleğindeki ürün snapshot'ından kurulur; snapshot yenilenince yeniden kurulur
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set
+import asyncio
+import re
+
+from catalog_cache import get_snapshot
+
+MAX_RESULTS = 100
+
+# Weight of a query token matching a token of each field
+FIELD_WEIGHTS = {"name": 10, "sku": 8, "model": 8, "brand": 5, "category": 3}
+EXACT_TOKEN_BONUS = 2
+NAME_PREFIX_BONUS = 20
+NAME_EXACT_BONUS = 50
+
+_TR_FOLD = str.maketrans({
+    "ı": "i", "ş": "s", "ğ": "g", "ü": "u", "ö": "o", "ç": "c",
+    "â": "a", "î": "i", "û": "u",
+})
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Turkish-aware case folding: upper-case I/İ are lowered the Turkish way, then diacritics dropped."""
+    if not text:
+        return ""
+    text = str(text).replace("İ", "i").replace("I", "ı").lower()
+    return text.translate(_TR_FOLD)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _product_fields(product: dict) -> Dict[str, Set[str]]:
+    fields = {
+        "name": set(tokenize(product.get("item_short_name"))),
+        "brand": set(tokenize(product.get("brand"))),
+        "category": set(tokenize(product.get("category"))),
+        "sku": set(),
+        "model": set(tokenize(product.get("model"))),
+    }
+    for m in product.get("models") or []:
+        sku_tokens = tokenize(m.get("sku"))
+        fields["sku"].update(sku_tokens)
+        if len(sku_tokens) > 1:
+            # "SFC-123/A" is also findable as "sfc123a"
+            fields["sku"].add("".join(sku_tokens))
+        fields["model"].update(tokenize(m.get("model_name")))
+    return fields
+
+
+class ProductSearchIndex:
+    def __init__(self, products: List[dict]):
+        self.products = products
+        self.names = [fold(p.get("item_short_name")) for p in products]
+        # Same normalisation as the query ("Vana, DN50" -> "vana dn50") for the exact/prefix name bonus
+        self.name_keys = [" ".join(tokenize(p.get("item_short_name"))) for p in products]
+        self.fields = [_product_fields(p) for p in products]
+        postings: Dict[str, Set[int]] = {}
+        for i, fields in enumerate(self.fields):
+            for tokens in fields.values():
+                for token in tokens:
+                    postings.setdefault(token, set()).add(i)
+        self.postings = postings
+        self.tokens = sorted(postings)
+
+    def _prefix_matches(self, prefix: str) -> Set[int]:
+        matches = set()
+        start = bisect_left(self.tokens, prefix)
+        for token in self.tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches |= self.postings[token]
+        return matches
+
+    def _score(self, i: int, query_tokens: List[str], folded_query: str) -> int:
+        score = 0
+        fields = self.fields[i]
+        for q in query_tokens:
+            best = 0
+            for field, tokens in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                if weight <= best:
+                    continue
+                if q in tokens:
+                    best = weight + EXACT_TOKEN_BONUS
+                elif any(t.startswith(q) for t in tokens):
+                    best = weight
+            score += best
+        name = self.name_keys[i]
+        if name == folded_query:
+            score += NAME_EXACT_BONUS
+        elif name.startswith(folded_query):
+            score += NAME_PREFIX_BONUS
+        return score
+
+    def search(self, query: str, limit: int = 20, product_type: Optional[str] = None,
+               is_active: Optional[bool] = True) -> List[dict]:
+        query_tokens = tokenize(query)
+        if not query_tokens:
+            return []
+        candidates: Optional[Set[int]] = None
+        # Longest token first: usually the most selective posting list
+        for q in sorted(set(query_tokens), key=len, reverse=True):
+            matches = self._prefix_matches(q)
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        folded_query = " ".join(query_tokens)
+        ranked = []
+        for i in candidates:
+            product = self.products[i]
+            if product_type and product.get("product_type") != product_type:
+                continue
+            if is_active is not None and bool(product.get("is_active", True)) != is_active:
+                continue
+            ranked.append((-self._score(i, query_tokens, folded_query), self.names[i], i))
+        ranked.sort()
+        return [self.products[i] for _, _, i in ranked[:limit]]
+
+
+_index: Optional[ProductSearchIndex] = None
+_lock = asyncio.Lock()
+
+
+async def get_index() -> ProductSearchIndex:
+    """Index over the current catalog snapshot; rebuilt only when the snapshot changes."""
+    global _index
+    snapshot = await get_snapshot("products")
+    if _index is not None and _index.products is snapshot.items:
+        return _index
+    async with _lock:
+        if _index is None or _index.products is not snapshot.items:
+            _index = ProductSearchIndex(snapshot.items)
+        return _index
+
+
+async def search_products(query: str, limit: int = 20, product_type: Optional[str] = None,
+                          is_active: Optional[bool] = True) -> List[dict]:
+    index = await get_index()
+    return index.search(query, min(limit, MAX_RESULTS), product_type, is_active)
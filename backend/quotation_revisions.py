@@ -0,0 +1,316 @@
+"""
+Quotation Revision Store (delta)
+- REVISION_STORAGE=full (varsayılan): her revizyon quotations'ta tam doküman olarak kalır (liste, düzenleme,
+  PDF export ve dashboard eskisi gibi tüm revizyonları görür); bu modül sadece revizyon listesini verir
+- REVISION_STORAGE=delta: quotations koleksiyonunda her revizyon grubunun sadece güncel revizyonu tam doküman
+  olarak durur (onaylanmış / teslim edilmiş revizyonlar stok sahibi olduğu için yerinde kalır).
+  Eski revizyonlar listede, teklif listesinde, export ve istatistiklerde görünmez; salt okunurdur (PUT -> 409)
+- Önceki revizyonlar quotation_revisions koleksiyonunda, bir önceki revizyona göre fark (delta) olarak saklanır:
+    üst alanlar: değişen alanlar ($set) + silinen alanlar ($unset)
+    line_items: satır id'sine göre; yeni satır tam, değişen satırda sadece değişen alanlar, sıra listesi
+- Her REVISION_CHECKPOINT_EVERY revizyonda bir tam kopya (checkpoint) yazılır; bir revizyon en yakın
+  checkpoint'ten ileriye doğru farklar uygulanarak yeniden oluşturulur
+- Revizyon listesi hafif alanlarla döner (id, numara, tarih, durum, toplamlar)
+- Güncel revizyon silinirse en yeni saklı revizyon tekrar quotations'a alınır (geçmiş silinmez)
+- Eski tam kopya revizyonları sıkıştırmak için (delta modunda):  python quotation_revisions.py compact
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import asyncio
+import copy
+import os
+import sys
+
+_db = None
+
+REVISION_CHECKPOINT_EVERY = max(1, int(os.environ.get("REVISION_CHECKPOINT_EVERY", "10")))
+DELTA_REVISIONS = os.environ.get("REVISION_STORAGE", "full") == "delta"
+
+# Fields kept on every stored revision for the list (no reconstruction needed)
+SUMMARY_FIELDS = (
+    "id", "quote_no", "base_quote_no", "revision_no", "revision_group_id",
+    "date", "offer_status", "created_at", "updated_at",
+)
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+# ----------------------------------------------------------------------------
+# Diff / patch (pure)
+# ----------------------------------------------------------------------------
+def _item_ids(items) -> Optional[List[str]]:
+    """Line item ids, or None when the list can't be diffed by id."""
+    if not isinstance(items, list):
+        return None
+    ids = [item.get("id") if isinstance(item, dict) else None for item in items]
+    if not all(ids) or len(set(ids)) != len(ids):
+        return None
+    return ids
+
+
+def _diff_fields(before: dict, after: dict) -> dict:
+    delta = {}
+    changed = {k: v for k, v in after.items() if k not in before or before[k] != v}
+    removed = [k for k in before if k not in after]
+    if changed:
+        delta["set"] = changed
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+def _diff_items(before: list, after: list) -> Optional[dict]:
+    before_ids, after_ids = _item_ids(before), _item_ids(after)
+    if before_ids is None or after_ids is None:
+        return None
+    old = dict(zip(before_ids, before))
+    items = {}
+    for item_id, item in zip(after_ids, after):
+        if item_id not in old:
+            items[item_id] = {"new": item}
+        else:
+            fields = _diff_fields(old[item_id], item)
+            if fields:
+                items[item_id] = fields
+    return {"order": after_ids, "items": items}
+
+
+def diff(before: dict, after: dict) -> dict:
+    """Compact delta that turns revision `before` into revision `after`."""
+    before_items = before.get("line_items")
+    after_items = after.get("line_items")
+    items_delta = None
+    if before_items != after_items:
+        items_delta = _diff_items(before_items, after_items)
+
+    skip = {"_id"}
+    if items_delta is not None:
+        skip.add("line_items")
+    delta = _diff_fields(
+        {k: v for k, v in before.items() if k not in skip},
+        {k: v for k, v in after.items() if k not in skip},
+    )
+    if items_delta is not None:
+        delta["line_items"] = items_delta
+    return delta
+
+
+def patch(base: dict, delta: dict) -> dict:
+    """Apply a delta from diff(); returns a new dict."""
+    doc = copy.deepcopy(base)
+    for key in delta.get("unset", []):
+        doc.pop(key, None)
+    doc.update(copy.deepcopy(delta.get("set", {})))
+
+    items_delta = delta.get("line_items")
+    if items_delta is not None:
+        old = {item["id"]: item for item in doc.get("line_items") or []}
+        items = []
+        for item_id in items_delta["order"]:
+            change = items_delta["items"].get(item_id)
+            if change is None:
+                items.append(old[item_id])
+            elif "new" in change:
+                items.append(copy.deepcopy(change["new"]))
+            else:
+                item = dict(old[item_id])
+                for key in change.get("unset", []):
+                    item.pop(key, None)
+                item.update(copy.deepcopy(change.get("set", {})))
+                items.append(item)
+        doc["line_items"] = items
+    return doc
+
+
+def summary(quotation: dict) -> dict:
+    """Lightweight list entry for a revision."""
+    entry = {f: quotation.get(f) for f in SUMMARY_FIELDS}
+    totals = quotation.get("totals_by_currency") or {}
+    entry["totals"] = totals.get("totals", totals) if isinstance(totals, dict) else {}
+    return entry
+
+
+def owns_stock(quotation: dict) -> bool:
+    """Accepted / delivered revisions hold reservations or deliveries and stay in quotations."""
+    return quotation.get("offer_status") == "accepted" or quotation.get("delivery_status") == "delivered"
+
+
+# ----------------------------------------------------------------------------
+# Store
+# ----------------------------------------------------------------------------
+async def reconstruct(group_id: str, revision_no: int, session=None) -> Optional[dict]:
+    """Rebuild a stored revision from the nearest checkpoint at or before it."""
+    checkpoint = await _db.quotation_revisions.find_one(
+        {"revision_group_id": group_id, "revision_no": {"$lte": revision_no}, "kind": "full"},
+        {"_id": 0, "revision_no": 1, "doc": 1},
+        sort=[("revision_no", -1)],
+        session=session,
+    )
+    if not checkpoint:
+        return None
+    doc = checkpoint["doc"]
+    if checkpoint["revision_no"] == revision_no:
+        return doc
+
+    cursor = _db.quotation_revisions.find(
+        {"revision_group_id": group_id,
+         "revision_no": {"$gt": checkpoint["revision_no"], "$lte": revision_no}},
+        {"_id": 0, "revision_no": 1, "delta": 1},
+        session=session,
+    ).sort("revision_no", 1)
+    last = checkpoint["revision_no"]
+    async for entry in cursor:
+        doc = patch(doc, entry["delta"])
+        last = entry["revision_no"]
+    return doc if last == revision_no else None
+
+
+async def find_stored(quotation_id: str, session=None) -> Optional[dict]:
+    """A superseded revision by its quotation id (reconstructed)."""
+    entry = await _db.quotation_revisions.find_one(
+        {"id": quotation_id}, {"_id": 0, "revision_group_id": 1, "revision_no": 1}, session=session
+    )
+    if not entry:
+        return None
+    return await reconstruct(entry["revision_group_id"], entry["revision_no"], session=session)
+
+
+async def store(quotation: dict, session=None):
+    """
+    Archive a revision that is leaving the quotations collection:
+    a full checkpoint every REVISION_CHECKPOINT_EVERY revisions, otherwise a delta
+    against the previous stored revision.
+    """
+    doc = {k: v for k, v in quotation.items() if k != "_id"}
+    group_id = doc.get("revision_group_id") or doc["id"]
+    revision_no = int(doc.get("revision_no") or 0)
+
+    record = {**summary(doc), "revision_group_id": group_id, "revision_no": revision_no,
+              "archived_at": datetime.now(timezone.utc)}
+
+    previous = None
+    if revision_no % REVISION_CHECKPOINT_EVERY:
+        previous_entry = await _db.quotation_revisions.find_one(
+            {"revision_group_id": group_id, "revision_no": {"$lt": revision_no}},
+            {"_id": 0, "revision_no": 1},
+            sort=[("revision_no", -1)],
+            session=session,
+        )
+        if previous_entry:
+            previous = await reconstruct(group_id, previous_entry["revision_no"], session=session)
+
+    if previous is None:
+        record.update(kind="full", doc=doc)
+    else:
+        record.update(kind="delta", base_revision_no=previous.get("revision_no"), delta=diff(previous, doc))
+
+    await _db.quotation_revisions.replace_one(
+        {"revision_group_id": group_id, "revision_no": revision_no}, record, upsert=True, session=session
+    )
+
+
+async def discard(quotation: dict, session=None):
+    """Undo store() for a revision that stayed live (the revise did not go through)."""
+    group_id = quotation.get("revision_group_id") or quotation["id"]
+    await _db.quotation_revisions.delete_one(
+        {"revision_group_id": group_id, "revision_no": int(quotation.get("revision_no") or 0)}, session=session
+    )
+
+
+async def promote_latest(group_id: str) -> Optional[dict]:
+    """
+    The group's live quotation was deleted: rebuild the newest stored revision and make it
+    the live quotation again. Nothing later depends on it, so its store entry is removed.
+    """
+    latest = await _db.quotation_revisions.find_one(
+        {"revision_group_id": group_id}, {"_id": 0, "revision_no": 1}, sort=[("revision_no", -1)]
+    )
+    if not latest:
+        return None
+    doc = await reconstruct(group_id, latest["revision_no"])
+    if doc is None:
+        return None
+    await _db.quotations.insert_one(doc)
+    doc.pop("_id", None)
+    await _db.quotation_revisions.delete_one({"revision_group_id": group_id, "revision_no": latest["revision_no"]})
+    return doc
+
+
+async def list_revisions(group_id: str) -> List[dict]:
+    """Stored + live revisions of a group, oldest first, lightweight fields only."""
+    projection = {"_id": 0, **{f: 1 for f in SUMMARY_FIELDS}, "totals": 1}
+    stored = await _db.quotation_revisions.find({"revision_group_id": group_id}, projection).to_list(None)
+    for entry in stored:
+        entry["is_current"] = False
+
+    live_projection = {"_id": 0, **{f: 1 for f in SUMMARY_FIELDS}, "totals_by_currency": 1}
+    live = await _db.quotations.find({"revision_group_id": group_id}, live_projection).to_list(None)
+    if not live:
+        # Quotations created before revision_group_id existed
+        live = await _db.quotations.find({"id": group_id}, live_projection).to_list(None)
+    live_entries = [{**summary(q), "is_current": True} for q in live]
+
+    by_no: Dict[int, dict] = {e.get("revision_no") or 0: e for e in stored}
+    for entry in live_entries:
+        by_no[entry.get("revision_no") or 0] = entry
+    return [by_no[n] for n in sorted(by_no)]
+
+
+async def compact() -> dict:
+    """
+    Move superseded revisions that were stored as full quotation copies into the delta store.
+    Only the highest revision of each group stays in quotations; accepted or delivered
+    revisions are left where they are (they own stock reservations / deliveries).
+    """
+    groups = _db.quotations.aggregate([
+        {"$match": {"revision_group_id": {"$exists": True}}},
+        {"$group": {"_id": "$revision_group_id", "count": {"$sum": 1}, "latest": {"$max": "$revision_no"}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ])
+    moved = skipped = 0
+    async for group in groups:
+        cursor = _db.quotations.find(
+            {"revision_group_id": group["_id"], "revision_no": {"$lt": group["latest"]}}, {"_id": 0}
+        ).sort("revision_no", 1)
+        async for quotation in cursor:
+            if owns_stock(quotation):
+                skipped += 1
+                continue
+            await store(quotation)
+            await _db.quotations.delete_one({"id": quotation["id"]})
+            await _db.product_price_history.delete_many({"quotation_id": quotation["id"]})
+            moved += 1
+    return {"moved": moved, "skipped": skipped}
+
+
+async def _compact_cli():
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import dashboard_stats
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[os.environ.get("DB_NAME", "quotation_db")]
+    set_database(db)
+    dashboard_stats.set_database(db)
+    try:
+        result = await compact()
+        if result["moved"]:
+            await dashboard_stats.rebuild()
+        return result
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Kullanım: python quotation_revisions.py compact")
+        sys.exit(1)
+    if not DELTA_REVISIONS:
+        print("compact sadece REVISION_STORAGE=delta ile çalışır (uygulama da bu ayarla çalışmalı)")
+        sys.exit(1)
+
+    result = asyncio.run(_compact_cli())
+    print(f"{result['moved']} revizyon fark olarak saklandı, {result['skipped']} revizyon atlandı")
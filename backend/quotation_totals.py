@@ -0,0 +1,199 @@
+"""
+Quotation Totals Engine
+- Satır indirimi (percent | fixed), genel indirim, para birimi bazlı toplamlar ve marj
+- Tüm hesaplar Decimal ile yapılır; para tutarları 2 haneye (ROUND_HALF_UP) yuvarlanır
+- Tüm satırlar tek geçişte hesaplanır (liste girer, liste çıkar); server, PDF ve toplu iş aynı motoru kullanır
+- Kural değişikliğinden sonra kayıtlı tüm teklifler için:  python quotation_totals.py recompute
+
+Bu modül FastAPI / Motor import etmez (PDF render süreçlerinde de yüklenir).
+"""
+
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from typing import Dict, List, Optional
+import asyncio
+import os
+import sys
+
+_db = None
+
+RECOMPUTE_BATCH = 500
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal("100")
+ZERO = Decimal("0")
+
+# Fields the engine reads from a quotation
+TOTALS_INPUT_FIELDS = ("line_items", "discount_type", "discount_value", "discount_currency")
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def to_decimal(value) -> Decimal:
+    """float/str/None -> Decimal; floats go through str so 0.1 stays 0.1."""
+    if value is None or value == "":
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return ZERO
+
+
+def money(value: Decimal) -> Decimal:
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _discount(base: Decimal, discount_type: Optional[str], discount_value) -> Decimal:
+    """Discount amount for a base, never more than the base and never negative."""
+    value = to_decimal(discount_value)
+    if value <= 0 or base <= 0:
+        return ZERO
+    if discount_type == "percent":
+        amount = base * min(value, HUNDRED) / HUNDRED
+    elif discount_type == "fixed":
+        amount = value
+    else:
+        return ZERO
+    return min(money(amount), base)
+
+
+def _margin_percent(margin: Decimal, revenue: Decimal) -> Optional[float]:
+    if revenue == 0:
+        return None
+    return float(money(margin / revenue * HUNDRED))
+
+
+def compute_line_totals(line_items: List[dict]) -> List[dict]:
+    """
+    Compute subtotal_before_discount, discount_amount, line_total and the margin
+    fields for every line item. Returns new dicts; the input is not modified.
+    """
+    result = []
+    for item in line_items or []:
+        item = dict(item)
+        quantity = to_decimal(item.get("quantity"))
+        subtotal = money(quantity * to_decimal(item.get("unit_price")))
+        discount = _discount(subtotal, item.get("discount_type"), item.get("discount_value"))
+        line_total = subtotal - discount
+
+        item["subtotal_before_discount"] = float(subtotal)
+        item["discount_amount"] = float(discount)
+        item["line_total"] = float(line_total)
+
+        if item.get("cost_price") is not None:
+            margin = line_total - money(quantity * to_decimal(item["cost_price"]))
+            item["margin_amount"] = float(margin)
+            item["margin_percent"] = _margin_percent(margin, line_total)
+        else:
+            item["margin_amount"] = None
+            item["margin_percent"] = None
+        result.append(item)
+    return result
+
+
+def compute_currency_totals(line_items: List[dict], discount_type: Optional[str] = None,
+                            discount_value=None, discount_currency: Optional[str] = None) -> dict:
+    """
+    Per-currency totals over already computed line items (optional lines excluded).
+    The general discount applies to the discount_currency total only, as the UI shows it.
+
+    {"totals": {cur: grand}, "subtotals": {...}, "discounts": {...},
+     "costs": {...}, "margins": {cur: {"amount": x, "percent": y}}}
+    """
+    subtotals: Dict[str, Decimal] = {}
+    costs: Dict[str, Decimal] = {}
+    costed_revenue: Dict[str, Decimal] = {}
+    for item in line_items or []:
+        if item.get("is_optional"):
+            continue
+        currency = item.get("currency") or "EUR"
+        line_total = to_decimal(item.get("line_total"))
+        subtotals[currency] = subtotals.get(currency, ZERO) + line_total
+        if item.get("cost_price") is not None:
+            cost = money(to_decimal(item.get("quantity")) * to_decimal(item["cost_price"]))
+            costs[currency] = costs.get(currency, ZERO) + cost
+            costed_revenue[currency] = costed_revenue.get(currency, ZERO) + line_total
+
+    totals, discounts, margins = {}, {}, {}
+    for currency, subtotal in subtotals.items():
+        discount = ZERO
+        if currency == (discount_currency or "EUR"):
+            discount = _discount(subtotal, discount_type, discount_value)
+        grand = subtotal - discount
+        totals[currency] = float(grand)
+        discounts[currency] = float(discount)
+        if currency in costs:
+            # General discount reduces revenue in proportion to the costed lines' share
+            revenue = costed_revenue[currency]
+            if subtotal > 0 and discount > 0:
+                revenue -= money(discount * revenue / subtotal)
+            margin = revenue - costs[currency]
+            margins[currency] = {"amount": float(margin), "percent": _margin_percent(margin, revenue)}
+
+    return {
+        "totals": totals,
+        "subtotals": {c: float(v) for c, v in subtotals.items()},
+        "discounts": discounts,
+        "costs": {c: float(v) for c, v in costs.items()},
+        "margins": margins,
+    }
+
+
+def compute_quotation_totals(quotation: dict) -> dict:
+    """Returns {"line_items": [...], "totals_by_currency": {...}} for a quotation dict."""
+    line_items = compute_line_totals(quotation.get("line_items") or [])
+    totals = compute_currency_totals(
+        line_items,
+        quotation.get("discount_type"),
+        quotation.get("discount_value"),
+        quotation.get("discount_currency"),
+    )
+    return {"line_items": line_items, "totals_by_currency": totals}
+
+
+async def recompute_all(query: Optional[dict] = None) -> dict:
+    """Refresh line totals and totals_by_currency of every stored quotation (batched bulk_write)."""
+    from pymongo import UpdateOne
+
+    projection = {"_id": 1, **{f: 1 for f in TOTALS_INPUT_FIELDS}, "totals_by_currency": 1}
+    ops = []
+    scanned = changed = 0
+    async for quotation in _db.quotations.find(query or {}, projection):
+        scanned += 1
+        computed = compute_quotation_totals(quotation)
+        if (computed["line_items"] == (quotation.get("line_items") or [])
+                and computed["totals_by_currency"] == quotation.get("totals_by_currency")):
+            continue
+        ops.append(UpdateOne({"_id": quotation["_id"]}, {"$set": computed}))
+        if len(ops) >= RECOMPUTE_BATCH:
+            await _db.quotations.bulk_write(ops, ordered=False)
+            changed += len(ops)
+            ops = []
+    if ops:
+        await _db.quotations.bulk_write(ops, ordered=False)
+        changed += len(ops)
+    return {"scanned": scanned, "updated": changed}
+
+
+async def _recompute_cli():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    set_database(client[os.environ.get("DB_NAME", "quotation_db")])
+    try:
+        return await recompute_all()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "recompute":
+        print("Kullanım: python quotation_totals.py recompute")
+        sys.exit(1)
+
+    result = asyncio.run(_recompute_cli())
+    print(f"{result['scanned']} teklif tarandı, {result['updated']} teklif güncellendi")
@@ -0,0 +1,96 @@
+"""
+Rack Layout Generator (toplu raf yerleşimi)
+- Kısa bir tanımdan (raf grupları, kat sayısı, bölme sayısı, isim kalıpları) tüm dokümanlar bellekte üretilir
+- Kod tekrarı (tanım içinde ve depodaki mevcut raflarla) yazmadan önce kontrol edilir
+- Yazma: rack_groups / rack_levels / rack_slots için birer insert_many (işlem içinde);
+  işlem desteklenmiyorsa hata anında bu istekte eklenen tüm dokümanlar silinir
+
+Bu modül FastAPI / Motor import etmez; sadece plan üretir.
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List
+import uuid
+
+MAX_LAYOUT_SLOTS = 20000
+
+
+class LayoutError(ValueError):
+    pass
+
+
+def letter_code(index: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA (spreadsheet column style)."""
+    code = ""
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        code = chr(ord("A") + rem) + code
+    return code
+
+
+def _format(pattern: str, **values) -> str:
+    try:
+        return pattern.format(**values)
+    except (KeyError, IndexError, ValueError) as e:
+        raise LayoutError(f"Geçersiz isim kalıbı '{pattern}': {e}")
+
+
+def plan_layout(spec, existing_codes) -> Dict[str, List[dict]]:
+    """
+    spec: RackLayoutCreate. Returns {"rack_groups": [...], "rack_levels": [...], "rack_slots": [...]}
+    ready for insert_many. Raises LayoutError on duplicate codes or an oversized layout.
+    """
+    groups = [g.model_dump() for g in spec.groups]
+    for i in range(spec.group_count):
+        code = _format(spec.group_code_pattern, letter=letter_code(i), n=i + 1)
+        groups.append({"code": code, "name": None, "description": None, "levels": None, "slots": None})
+    if not groups:
+        raise LayoutError("En az bir raf grubu gerekli (groups veya group_count)")
+
+    codes = [str(g["code"]).strip() for g in groups]
+    if any(not c for c in codes):
+        raise LayoutError("Raf grubu kodu boş olamaz")
+    duplicates = sorted({c for c in codes if codes.count(c) > 1})
+    if duplicates:
+        raise LayoutError(f"Tanımda tekrar eden raf kodları: {', '.join(duplicates)}")
+    taken = sorted(set(codes) & set(existing_codes))
+    if taken:
+        raise LayoutError(f"Bu depoda zaten var olan raf kodları: {', '.join(taken)}")
+
+    total_slots = sum((g["levels"] or spec.levels) * (g["slots"] or spec.slots) for g in groups)
+    if total_slots > MAX_LAYOUT_SLOTS:
+        raise LayoutError(f"Çok büyük yerleşim: {total_slots} bölme (en fazla {MAX_LAYOUT_SLOTS})")
+
+    now = datetime.now(timezone.utc).isoformat()
+    common = {"is_active": True, "is_deleted": False, "created_at": now, "updated_at": now}
+    plan = {"rack_groups": [], "rack_levels": [], "rack_slots": []}
+
+    for group, code in zip(groups, codes):
+        group_id = str(uuid.uuid4())
+        plan["rack_groups"].append({
+            "id": group_id,
+            "warehouse_id": spec.warehouse_id,
+            "name": group["name"] or _format(spec.group_name_pattern, code=code),
+            "code": code,
+            "description": group["description"],
+            **common,
+        })
+        for level_number in range(1, (group["levels"] or spec.levels) + 1):
+            level_id = str(uuid.uuid4())
+            plan["rack_levels"].append({
+                "id": level_id,
+                "rack_group_id": group_id,
+                "level_number": level_number,
+                "name": _format(spec.level_name_pattern, n=level_number, code=code),
+                **common,
+            })
+            for slot_number in range(1, (group["slots"] or spec.slots) + 1):
+                plan["rack_slots"].append({
+                    "id": str(uuid.uuid4()),
+                    "rack_level_id": level_id,
+                    "slot_number": slot_number,
+                    "name": _format(spec.slot_name_pattern, n=slot_number, level=level_number, code=code),
+                    **common,
+                })
+    return plan
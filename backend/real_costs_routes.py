@@ -12,11 +12,14 @@ from fastapi.responses import FileResponse
 from typing import Optional, List
 from datetime import datetime, timezone
 from uuid import uuid4
-import pandas as pd
 import io
 import os
 from pathlib import Path
 
+from lazy_imports import lazy_module
+
+pd = lazy_module("pandas")
+
 router = APIRouter()
 
 # Database reference
@@ -0,0 +1,139 @@
+"""
+PDF Render Service
+- CPU yoğun ReportLab render işleri event loop dışında, ayrı süreçlerde çalışır
+- Aynı anda çalışan render sayısı sınırlıdır (semaphore); zaman aşımına uğrayan / iptal edilen iş
+  süreçte bitene kadar yerini tutar, sınır gerçekten uygulanır
+- Her iş için zaman aşımı uygulanır
+- Kuyrukta bekleme süresi ve render süresi ölçülür
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import asyncio
+import multiprocessing
+import time
+
+from fastapi import HTTPException
+
+from lazy_imports import RENDER_WORKER_MODULES, prewarm
+
+
+def _noop():
+    return None
+
+
+def _timed_call(fn, *args):
+    """Runs inside the worker process; reports when the job actually started."""
+    started_at = time.time()
+    result = fn(*args)
+    return started_at, time.time(), result
+
+
+class RenderService:
+    def __init__(self, workers: int = 2, max_concurrent: int = 4, timeout: float = 60.0):
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._render_total = 0.0
+
+    def start(self):
+        if self._executor is None:
+            # spawn: workers import only the PDF template module, not the whole app
+            # Each worker imports ReportLab when it starts, not on its first render
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=prewarm,
+                initargs=(RENDER_WORKER_MODULES,),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+    def warm_up(self):
+        """Start the worker processes now (they are otherwise spawned on the first renders)."""
+        if self._executor is None:
+            self.start()
+        for _ in range(self.workers):
+            self._executor.submit(_noop)
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _release(self):
+        self._running -= 1
+        self._semaphore.release()
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the process pool; fn must be a picklable module-level function."""
+        if self._executor is None:
+            self.start()
+
+        submitted_at = time.time()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        # The slot is held by the job itself, not by this coroutine: a timed-out or
+        # abandoned (client disconnect) render keeps running in its worker process,
+        # so the slot is released only when the executor future is actually done.
+        loop = asyncio.get_running_loop()
+        self._running += 1
+        try:
+            job = self._executor.submit(_timed_call, fn, *args)
+        except Exception:
+            self._release()
+            raise
+
+        def job_done(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                pass  # loop already closed (shutdown)
+
+        job.add_done_callback(job_done)
+
+        try:
+            started_at, finished_at, result = await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise HTTPException(status_code=504, detail="PDF oluşturma zaman aşımına uğradı")
+        except Exception:
+            self._failed += 1
+            raise
+
+        waited = max(0.0, started_at - submitted_at)
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._render_total += finished_at - started_at
+        self._completed += 1
+        return result
+
+    def stats(self) -> dict:
+        completed = self._completed
+        return {
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "timeout_seconds": self.timeout,
+            "running": self._running,
+            "waiting": self._waiting,
+            "completed": completed,
+            "failed": self._failed,
+            "timed_out": self._timed_out,
+            "avg_queue_wait_ms": round(self._wait_total / completed * 1000, 2) if completed else 0.0,
+            "max_queue_wait_ms": round(self._wait_max * 1000, 2),
+            "avg_render_ms": round(self._render_total / completed * 1000, 2) if completed else 0.0,
+        }
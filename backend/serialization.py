@@ -0,0 +1,133 @@
+"""
+Fast JSON Response Path
+- Liste uçları Mongo dokümanlarını orjson ile doğrudan serileştirir (response_model doğrulaması yok)
+- Doğrulama okuma yerine yazma anında, bir kez yapılır: validated_document()
+- Tarihler gerçek datetime olarak saklanır (ISO string değil); orjson bunları doğal serileştirir
+- Eski kayıtlar (ISO string tarihli) için normalize:  python serialization.py normalize
+"""
+
+from datetime import datetime
+from typing import Iterable
+import asyncio
+import logging
+import os
+import sys
+
+import orjson
+from fastapi.responses import JSONResponse
+from pymongo import ReplaceOne
+
+from models import Customer, Product, Representative
+
+logger = logging.getLogger(__name__)
+
+_db = None
+
+NORMALIZE_BATCH = 500
+
+# Collections served by the fast list path and the model that guards their writes
+CATALOG_MODELS = {
+    "customers": Customer,
+    "products": Product,
+    "representatives": Representative,
+}
+
+_ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _default(value):
+    # Decimal128 / ObjectId and similar BSON leftovers
+    return str(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-rendered response. Motor returns naive UTC datetimes; OPT_NAIVE_UTC
+    keeps the +00:00 offset the Pydantic path used to emit.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+def model_projection(model) -> dict:
+    """Projection limited to the model's fields (what response_model used to filter to)."""
+    projection = {"_id": 0}
+    for name in model.model_fields:
+        projection[name] = 1
+    return projection
+
+
+def validated_document(model, data: dict) -> dict:
+    """
+    Validate once, at write time, and return the document to store.
+    Missing fields get the model defaults and datetime fields are stored as real
+    datetimes; fields the model does not know about (e.g. is_sofis_import) are kept.
+    """
+    dumped = model.model_validate(data).model_dump()
+    document = dict(data)
+    for key, value in dumped.items():
+        if key not in document or isinstance(value, datetime):
+            document[key] = value
+    return document
+
+
+async def normalize_collection(name: str, model) -> int:
+    """Rewrite documents still carrying ISO-string timestamps through validated_document()."""
+    collection = _db[name]
+    legacy = {"$or": [{"created_at": {"$type": "string"}}, {"updated_at": {"$type": "string"}}]}
+    ops = []
+    written = 0
+    async for doc in collection.find(legacy):
+        _id = doc.pop("_id")
+        try:
+            ops.append(ReplaceOne({"_id": _id}, validated_document(model, doc)))
+        except Exception as e:
+            logger.warning(f"{name} {doc.get('id')} normalize edilemedi: {e}")
+            continue
+        if len(ops) >= NORMALIZE_BATCH:
+            await collection.bulk_write(ops, ordered=False)
+            written += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        written += len(ops)
+    return written
+
+
+async def normalize_catalog(names: Iterable[str] = None) -> dict:
+    names = list(names or CATALOG_MODELS)
+    return {name: await normalize_collection(name, CATALOG_MODELS[name]) for name in names}
+
+
+async def ensure_normalized():
+    """Startup hook: normalize only when legacy documents are still present."""
+    for name, model in CATALOG_MODELS.items():
+        if await _db[name].find_one({"created_at": {"$type": "string"}}, {"_id": 1}):
+            count = await normalize_collection(name, model)
+            logger.info(f"{name}: {count} doküman normalize edildi")
+
+
+async def _normalize_cli():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    set_database(client[os.environ.get("DB_NAME", "quotation_db")])
+    try:
+        return await normalize_catalog()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "normalize":
+        print("Kullanım: python serialization.py normalize")
+        sys.exit(1)
+
+    for name, count in asyncio.run(_normalize_cli()).items():
+        print(f"{name}: {count} doküman normalize edildi")
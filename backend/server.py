@@ -1,28 +1,95 @@
 # server.py
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query, APIRouter
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, APIRouter, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from typing import List, Optional
+from collections import OrderedDict
+import calendar
+import io
 import os
 import uuid
 from pathlib import Path
 import shutil
+import tempfile
 import asyncio
-
-from playwright.async_api import async_playwright
-
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-
-from warehouse_routes import router as warehouse_router, init_warehouse_db
+import logging
+
+from browser_pool import BrowserPool
+from lazy_imports import prewarm as prewarm_imports
+from database import DB_NAME, create_client, ping as ping_mongo, connection_stats as mongo_connection_stats
+from dashboard_stats import (
+    set_database as set_dashboard_stats_db,
+    apply_change as apply_stats_change, rebuild as rebuild_dashboard_stats,
+    get_stats as get_dashboard_stats, ensure_built as ensure_dashboard_stats
+)
+from exchange_rates import get_rate_table
+from counters import (
+    set_database as set_counters_db,
+    next_sequence, reserve_block, ensure_sequence_at_least
+)
+from pdf_cache import PdfRenderCache, compute_cache_key
+from price_history import (
+    set_database as set_price_history_db,
+    sync_quotation as sync_price_history, remove_quotation as remove_price_history,
+    rename_customer as rename_price_history_customer,
+    get_history as get_price_history, backfill as backfill_price_history,
+    ensure_backfilled as ensure_price_history
+)
+from stock_delivery import (
+    set_database as set_delivery_db,
+    deliver as deliver_stock, revert as revert_stock_delivery
+)
+from stock_reservations import (
+    set_database as set_reservations_db,
+    run_in_transaction, reserve_for_quotation, release_for_quotation
+)
+from stock_mutations import (
+    set_database as set_stock_mutations_db,
+    ensure_stock_keys
+)
+from stock_batch import set_database as set_stock_batch_db
+from pdf_export import stream_zip
+from quotation_totals import (
+    set_database as set_totals_db,
+    TOTALS_INPUT_FIELDS, compute_quotation_totals, recompute_all as recompute_all_totals
+)
+from quotation_revisions import (
+    set_database as set_revisions_db,
+    DELTA_REVISIONS, owns_stock, store as store_revision, discard as discard_stored_revision,
+    find_stored as find_stored_revision, reconstruct as reconstruct_revision, list_revisions,
+    promote_latest as promote_latest_revision
+)
+from db_indexes import (
+    set_database as set_indexes_db,
+    ensure_indexes as ensure_db_indexes, index_report as db_index_report
+)
+from pagination import MAX_PAGE_SIZE, build_projection, keyset_page, prefix_filter
+from collection_versions import (
+    VERSIONED_COLLECTIONS, cache_headers, conditional_get, current_versions as current_collection_versions,
+    touch as touch_collections
+)
+from catalog_cache import (
+    set_database as set_catalog_db,
+    get_items as get_catalog_items, invalidate as invalidate_catalog, stats as catalog_cache_stats
+)
+from product_search import search_products
+from serialization import (
+    set_database as set_serialization_db,
+    FastJSONResponse, model_projection, validated_document, ensure_normalized as ensure_catalog_normalized
+)
+from render_service import RenderService
+from pdf_render import (
+    NATIVE_PDF_TEMPLATE_VERSION, NATIVE_PDF_FIELDS,
+    build_native_quotation_pdf, build_quotation_html
+)
+from warehouse_routes import router as warehouse_router, init_warehouse_db, ensure_rack_group_flags
 from inventory_routes import router as inventory_router, set_database as set_inventory_db
 from real_costs_routes import router as real_costs_router, set_db as set_real_costs_db
 from sofis_import_routes import router as sofis_router, set_database as set_sofis_db
+from exchange_rate_routes import router as exchange_rate_router, set_database as set_exchange_rate_db
 
 from models import (
     Customer, CustomerCreate, CustomerUpdate,
@@ -34,10 +101,81 @@ from models import (
     Representative, RepresentativeCreate, RepresentativeUpdate
 )
 
+logger = logging.getLogger(__name__)
+
+# ============================
+# Browser pool (HTML -> PDF)
+# ============================
+browser_pool = BrowserPool(
+    size=int(os.environ.get("PDF_BROWSER_POOL_SIZE", "2")),
+    recycle_after=int(os.environ.get("PDF_BROWSER_RECYCLE_AFTER", "50")),
+    max_waiting=int(os.environ.get("PDF_BROWSER_MAX_WAITING", "20")),
+)
+
+# ============================
+# Render service (ReportLab, process pool)
+# ============================
+render_service = RenderService(
+    workers=int(os.environ.get("PDF_RENDER_WORKERS", str(os.cpu_count() or 2))),
+    max_concurrent=int(os.environ.get("PDF_RENDER_MAX_CONCURRENT", "4")),
+    timeout=float(os.environ.get("PDF_RENDER_TIMEOUT", "60")),
+)
+
+# With 1: import pandas / Playwright, start the PDF browser and the render worker processes
+# (which import ReportLab themselves) in the background once the app is up. Off by default:
+# they load on the first request that needs them and idle workers don't pay for them.
+PREWARM_HEAVY_IMPORTS = os.environ.get("PREWARM_HEAVY_IMPORTS", "0") == "1"
+
+
+async def _prewarm():
+    render_service.warm_up()
+    timings = await asyncio.to_thread(prewarm_imports)
+    logger.info(f"Pre-warmed imports: {timings}")
+    try:
+        await browser_pool.ensure_started()
+    except HTTPException:
+        # generate-pdf-v2 answers 503 and the frontend falls back to generate-pdf
+        logger.warning("PDF browser pool could not start")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    client = create_client()
+    try:
+        await ping_mongo(client)
+    except Exception as e:
+        logger.error(f"MongoDB is not reachable: {e}")
+        client.close()
+        raise
+    set_database(client[DB_NAME])
+
+    # Old records need the fields the unique indexes are built on
+    await ensure_stock_keys()
+    await ensure_rack_group_flags()
+    indexes = await ensure_db_indexes()
+    if indexes["failed"]:
+        logger.warning(f"{len(indexes['failed'])} index(es) could not be created, see GET /api/db/indexes")
+    await seed_quote_no_sequence()
+    await ensure_price_history()
+    await ensure_catalog_normalized()
+    await ensure_dashboard_stats()
+    # Data may have changed while we were down: don't let clients revalidate old copies
+    await touch_collections(*VERSIONED_COLLECTIONS)
+    render_service.start()
+    prewarm_task = asyncio.create_task(_prewarm()) if PREWARM_HEAVY_IMPORTS else None
+    yield
+    if prewarm_task is not None and not prewarm_task.done():
+        prewarm_task.cancel()
+    await browser_pool.stop()
+    render_service.stop()
+    client.close()
+
+
 # ============================
 # FastAPI
 # ============================
-app = FastAPI(title="Quotation Management API")
+app = FastAPI(title="Quotation Management API", lifespan=lifespan)
 api_router = APIRouter()
 
 app.add_middleware(
@@ -48,35 +186,79 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+ROOT_DIR = Path(__file__).parent
+
 # ============================
 # MongoDB
 # ============================
-MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.quotation_db
-
-# ✅ Warehouse / Inventory / RealCosts / Sofis aynı DB’yi kullanacak
-init_warehouse_db(db)
-set_inventory_db(db)
-set_real_costs_db(db)
-set_sofis_db(db)
+# Created in lifespan (DB_NAME from the environment)
+client = None
+db = None
+
+
+def set_database(database):
+    global db
+    db = database
+
+    # ✅ Warehouse / Inventory / RealCosts / Sofis aynı DB’yi kullanacak
+    init_warehouse_db(db)
+    set_inventory_db(db)
+    set_real_costs_db(db)
+    set_sofis_db(db)
+    set_exchange_rate_db(db)
+    set_counters_db(db)
+    set_reservations_db(db)
+    set_stock_mutations_db(db)
+    set_stock_batch_db(db)
+    set_delivery_db(db)
+    set_price_history_db(db)
+    set_serialization_db(db)
+    set_catalog_db(db)
+    set_totals_db(db)
+    set_revisions_db(db)
+    set_indexes_db(db)
+    set_dashboard_stats_db(db)
+
+# "global": Q-YYMMDD-<running number>, "daily": number restarts every day
+QUOTE_NO_SEQUENCE = os.environ.get("QUOTE_NO_SEQUENCE", "global")
 
 # Routers
 api_router.include_router(warehouse_router, prefix="/warehouse", tags=["warehouse"])
 api_router.include_router(inventory_router, prefix="/inventory", tags=["inventory"])
 api_router.include_router(real_costs_router, prefix="/real-costs", tags=["real-costs"])
 api_router.include_router(sofis_router, prefix="/sofis", tags=["sofis"])
+api_router.include_router(exchange_rate_router, prefix="/exchange-rates", tags=["exchange-rates"])
+
+# ============================
+# PDF Cache
+# ============================
+PDF_CACHE_DIR = Path(os.environ.get("PDF_CACHE_DIR", str(ROOT_DIR / "uploads" / "pdf_cache")))
+PDF_CACHE_MAX_MB = int(os.environ.get("PDF_CACHE_MAX_MB", "200"))
+pdf_cache = PdfRenderCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024)
 
 # ============================
 # Helpers
 # ============================
-async def generate_quote_no(quotation_type: str, revision_no: int = 0) -> tuple:
-    """Generate quotation number based on total count: Q-YYMMDD-XXX"""
-    now = datetime.now()
-    date_part = now.strftime("%y%m%d")
+def _quote_no_sequence_name(date_part: str) -> str:
+    if QUOTE_NO_SEQUENCE == "daily":
+        return f"quote_no:{date_part}"
+    return "quote_no:global"
+
 
-    total_count = await db.quotations.count_documents({})
-    counter = total_count + 1
+async def seed_quote_no_sequence():
+    """
+    The global sequence used to be derived from count_documents on every create.
+    Seed it once so existing numbering continues without a gap or a repeat.
+    """
+    if QUOTE_NO_SEQUENCE == "global":
+        total_count = await db.quotations.count_documents({})
+        await ensure_sequence_at_least("quote_no:global", total_count)
+
+
+async def generate_quote_no(quotation_type: str, revision_no: int = 0) -> tuple:
+    """Generate quotation number from an atomic counter: Q-YYMMDD-XXX"""
+    date_part = datetime.now().strftime("%y%m%d")
+    counter = await next_sequence(_quote_no_sequence_name(date_part))
 
     base_quote_no = f"Q-{date_part}-{counter:03d}"
 
@@ -88,132 +270,19 @@ async def generate_quote_no(quotation_type: str, revision_no: int = 0) -> tuple:
     return quote_no, base_quote_no
 
 
-def calculate_line_totals(line_item: dict) -> dict:
-    quantity = float(line_item.get("quantity", 0) or 0)
-    unit_price = float(line_item.get("unit_price", 0) or 0)
+async def reserve_quote_nos(count: int) -> List[str]:
+    """Pre-allocate count base quote numbers in one round trip (bulk imports)."""
+    date_part = datetime.now().strftime("%y%m%d")
+    block = await reserve_block(_quote_no_sequence_name(date_part), count)
+    return [f"Q-{date_part}-{counter:03d}" for counter in block]
 
-    line_item["subtotal_before_discount"] = quantity * unit_price
-    line_item["discount_amount"] = 0
-    line_item["line_total"] = quantity * unit_price
-    return line_item
 
-
-def calculate_totals_by_currency(line_items: List[dict]) -> dict:
-    totals = {}
-    for item in line_items:
-        if item.get("is_optional", False):
-            continue
-        currency = item.get("currency", "EUR")
-        line_total = float(item.get("line_total", 0) or 0)
-        totals[currency] = totals.get(currency, 0) + line_total
-    return {"totals": totals}
-
-
-def format_currency(amount: float, currency: str) -> str:
-    try:
-        return f"{float(amount):,.2f} {currency}".replace(",", " ")
-    except Exception:
-        return f"{amount} {currency}"
-
-
-def build_native_quotation_pdf(quotation: dict, pdf_path: str) -> None:
-    doc = SimpleDocTemplate(
-        pdf_path,
-        pagesize=A4,
-        leftMargin=36,
-        rightMargin=36,
-        topMargin=36,
-        bottomMargin=36,
-        title=f"Teklif {quotation.get('quote_no', '')}",
-    )
-    styles = getSampleStyleSheet()
-    elements = []
-
-    title = quotation.get("subject") or "Teklif"
-    elements.append(Paragraph(f"<b>{title}</b>", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    customer_name = quotation.get("customer_name") or "-"
-    quote_no = quotation.get("quote_no") or "-"
-    date_value = quotation.get("date")
-    if isinstance(date_value, datetime):
-        date_text = date_value.strftime("%d.%m.%Y")
-    else:
-        date_text = str(date_value) if date_value else "-"
-
-    meta_lines = [
-        f"<b>Teklif No:</b> {quote_no}",
-        f"<b>Müşteri:</b> {customer_name}",
-        f"<b>Tarih:</b> {date_text}",
-        f"<b>Proje Kodu:</b> {quotation.get('project_code') or '-'}",
-    ]
-    for line in meta_lines:
-        elements.append(Paragraph(line, styles["Normal"]))
-    elements.append(Spacer(1, 16))
-
-    line_items = quotation.get("line_items", []) or []
-    if line_items:
-        table_data = [["#", "Kalem", "Adet", "Birim", "Birim Fiyat", "Toplam"]]
-        totals_by_currency = {}
-
-        idx_counter = 0
-        for item in line_items:
-            if item.get("is_optional"):
-                continue
-            idx_counter += 1
-            currency = item.get("currency") or "EUR"
-            quantity = float(item.get("quantity") or 0)
-            unit = item.get("unit") or ""
-            unit_price = float(item.get("unit_price") or 0)
-            line_total = item.get("line_total")
-            if line_total is None:
-                line_total = quantity * unit_price
-            line_total = float(line_total or 0)
-
-            totals_by_currency[currency] = totals_by_currency.get(currency, 0) + line_total
-
-            table_data.append([
-                str(idx_counter),
-                item.get("item_short_name") or "-",
-                f"{quantity:g}",
-                unit,
-                format_currency(unit_price, currency),
-                format_currency(line_total, currency),
-            ])
-
-        table = Table(table_data, repeatRows=1, hAlign="LEFT")
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004aad")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ("ROWBACKGROUNDS", (0, 1), (-1, -1), [colors.whitesmoke, colors.lightgrey]),
-        ]))
-        elements.append(table)
-        elements.append(Spacer(1, 16))
-
-        totals_rows = [["Toplamlar", ""]]
-        for currency, total in totals_by_currency.items():
-            totals_rows.append([currency, format_currency(total, currency)])
-        totals_table = Table(totals_rows, colWidths=[120, 120], hAlign="RIGHT")
-        totals_table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#004aad")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ]))
-        elements.append(totals_table)
-    else:
-        elements.append(Paragraph("Kalem bulunamadı.", styles["Normal"]))
-
-    notes = quotation.get("notes")
-    if notes:
-        elements.append(Spacer(1, 16))
-        elements.append(Paragraph("<b>Notlar</b>", styles["Heading3"]))
-        elements.append(Paragraph(notes, styles["BodyText"]))
-
-    doc.build(elements)
+def native_pdf_cache_key(quotation: dict) -> str:
+    payload = {field: quotation.get(field) for field in NATIVE_PDF_FIELDS}
+    payload["language"] = quotation.get("language") or "turkish"
+    payload["updated_at"] = quotation.get("updated_at")
+    payload["template_version"] = NATIVE_PDF_TEMPLATE_VERSION
+    return compute_cache_key(payload)
 
 
 def _dt_from_iso(value):
@@ -239,13 +308,10 @@ def _sanitize_filename(s: str) -> str:
 # ============================================================================
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer: CustomerCreate):
-    customer_dict = customer.model_dump()
-    customer_dict["id"] = str(uuid.uuid4())
-    customer_dict["is_active"] = True
-    customer_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-    customer_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    customer_dict = validated_document(Customer, customer.model_dump())
 
     await db.customers.insert_one(customer_dict)
+    await touch_collections("customers")
     created = await db.customers.find_one({"id": customer_dict["id"]}, {"_id": 0})
 
     created["created_at"] = _dt_from_iso(created.get("created_at"))
@@ -254,16 +320,41 @@ async def create_customer(customer: CustomerCreate):
 
 
 @api_router.get("/customers", response_model=List[Customer])
-async def get_customers(is_active: bool = None):
+async def get_customers(request: Request, is_active: bool = None):
+    etag, not_modified = await conditional_get(request, "customers")
+    if not_modified:
+        return not_modified
+
+    query = {}
+    if is_active is not None:
+        query["is_active"] = is_active
+
+    # Documents are validated when written; serialize them as stored
+    customers = await db.customers.find(query, model_projection(Customer)).to_list(1000)
+    return FastJSONResponse(customers, headers=cache_headers(etag))
+
+
+@api_router.get("/customers/paged")
+async def get_customers_paged(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    city: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    fields: Optional[str] = None,
+):
+    """Keyset-paginated customers sorted by (name, id); pass next_cursor back as cursor."""
     query = {}
+    if name:
+        query["name"] = prefix_filter(name)
+    if city:
+        query["city"] = city
     if is_active is not None:
         query["is_active"] = is_active
 
-    customers = await db.customers.find(query, {"_id": 0}).to_list(1000)
-    for c in customers:
-        c["created_at"] = _dt_from_iso(c.get("created_at"))
-        c["updated_at"] = _dt_from_iso(c.get("updated_at"))
-    return customers
+    projection = build_projection(fields, Customer.model_fields, always=("id", "name"))
+    page = await keyset_page(db.customers, query, "name", limit, cursor, projection)
+    return FastJSONResponse(page)
 
 
 @api_router.get("/customers/{customer_id}", response_model=Customer)
@@ -284,10 +375,13 @@ async def update_customer(customer_id: str, customer: CustomerUpdate):
         raise HTTPException(status_code=404, detail="Customer not found")
 
     update_dict = {k: v for k, v in customer.model_dump().items() if v is not None}
-    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict["updated_at"] = datetime.now(timezone.utc)
 
     await db.customers.update_one({"id": customer_id}, {"$set": update_dict})
+    await touch_collections("customers")
     updated = await db.customers.find_one({"id": customer_id}, {"_id": 0})
+    if "name" in update_dict and update_dict["name"] != existing.get("name"):
+        await rename_price_history_customer(customer_id, update_dict["name"])
 
     updated["created_at"] = _dt_from_iso(updated.get("created_at"))
     updated["updated_at"] = _dt_from_iso(updated.get("updated_at"))
@@ -298,10 +392,11 @@ async def update_customer(customer_id: str, customer: CustomerUpdate):
 async def delete_customer(customer_id: str):
     result = await db.customers.update_one(
         {"id": customer_id},
-        {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
+    await touch_collections("customers")
     return {"message": "Customer deactivated", "id": customer_id}
 
 
@@ -310,13 +405,10 @@ async def delete_customer(customer_id: str):
 # ============================================================================
 @api_router.post("/products", response_model=Product)
 async def create_product(product: ProductCreate):
-    product_dict = product.model_dump()
-    product_dict["id"] = str(uuid.uuid4())
-    product_dict["is_active"] = True
-    product_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-    product_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    product_dict = validated_document(Product, product.model_dump())
 
     await db.products.insert_one(product_dict)
+    await invalidate_catalog("products")
     created = await db.products.find_one({"id": product_dict["id"]}, {"_id": 0})
 
     created["created_at"] = _dt_from_iso(created.get("created_at"))
@@ -325,18 +417,64 @@ async def create_product(product: ProductCreate):
 
 
 @api_router.get("/products", response_model=List[Product])
-async def get_products(product_type: str = None, is_active: bool = None):
+async def get_products(request: Request, product_type: str = None, is_active: bool = None):
+    versions = await current_collection_versions("products")
+    etag, not_modified = await conditional_get(request, "products", versions=versions)
+    if not_modified:
+        return not_modified
+
+    query = {}
+    if product_type:
+        query["product_type"] = product_type
+    if is_active is not None:
+        query["is_active"] = is_active
+
+    products = await get_catalog_items("products", min_version=versions["products"], **query)
+    return FastJSONResponse(products, headers=cache_headers(etag))
+
+
+@api_router.get("/products/paged")
+async def get_products_paged(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    brand: Optional[str] = None,
+    group_id: Optional[str] = None,
+    product_type: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    fields: Optional[str] = None,
+):
+    """Keyset-paginated products sorted by (item_short_name, id)."""
     query = {}
+    if name:
+        query["item_short_name"] = prefix_filter(name)
+    if brand:
+        query["brand"] = brand
+    if group_id:
+        query["group_id"] = None if group_id == "none" else group_id
     if product_type:
         query["product_type"] = product_type
     if is_active is not None:
         query["is_active"] = is_active
 
-    products = await db.products.find(query, {"_id": 0}).to_list(1000)
-    for p in products:
-        p["created_at"] = _dt_from_iso(p.get("created_at"))
-        p["updated_at"] = _dt_from_iso(p.get("updated_at"))
-    return products
+    projection = build_projection(fields, Product.model_fields, always=("id", "item_short_name"))
+    page = await keyset_page(db.products, query, "item_short_name", limit, cursor, projection)
+    return FastJSONResponse(page)
+
+
+@api_router.get("/products/search")
+async def search_products_endpoint(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    product_type: Optional[str] = None,
+    is_active: Optional[bool] = True,
+):
+    """
+    Ranked product search for the line-item picker.
+    Turkish-aware, prefix match on name / brand / category / model / SKU.
+    """
+    results = await search_products(q, limit, product_type, is_active)
+    return FastJSONResponse({"results": results, "total": len(results)})
 
 
 @api_router.get("/products/{product_id}", response_model=Product)
@@ -357,9 +495,10 @@ async def update_product(product_id: str, product: ProductUpdate):
         raise HTTPException(status_code=404, detail="Product not found")
 
     update_dict = {k: v for k, v in product.model_dump().items() if v is not None}
-    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict["updated_at"] = datetime.now(timezone.utc)
 
     await db.products.update_one({"id": product_id}, {"$set": update_dict})
+    await invalidate_catalog("products")
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
 
     updated["created_at"] = _dt_from_iso(updated.get("created_at"))
@@ -381,6 +520,7 @@ async def delete_all_products(product_type: str = None, confirm: str = None):
         query["product_type"] = product_type
 
     result = await db.products.delete_many(query)
+    await invalidate_catalog("products", "product_groups")
 
     if not product_type:
         await db.product_groups.delete_many({})
@@ -393,6 +533,7 @@ async def delete_all_products(product_type: str = None, confirm: str = None):
 async def delete_product(product_id: str):
     """Delete a product permanently"""
     result = await db.products.delete_one({"id": product_id})
+    await invalidate_catalog("products")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"message": "Product deleted"}
@@ -403,62 +544,30 @@ async def get_product_price_history(product_id: str, limit: int = 5):
     """
     Get price history for a product from previous quotations.
     Returns last N quotations where this product was used, with customer name and price.
+    Served from the product_price_history index (one indexed query).
     """
-    pipeline = [
-        {"$match": {"line_items.product_id": product_id}},
-        {"$sort": {"created_at": -1}},
-        {"$limit": limit * 2},
-        {"$project": {
-            "_id": 0,
-            "id": 1,
-            "quotation_number": 1,
-            "customer_id": 1,
-            "created_at": 1,
-            "line_items": {
-                "$filter": {
-                    "input": "$line_items",
-                    "as": "item",
-                    "cond": {"$eq": ["$$item.product_id", product_id]}
-                }
-            }
-        }}
-    ]
-
-    quotations = await db.quotations.aggregate(pipeline).to_list(limit * 2)
-
-    customer_ids = list(set(q.get("customer_id") for q in quotations if q.get("customer_id")))
-    customers = await db.customers.find(
-        {"id": {"$in": customer_ids}},
-        {"_id": 0, "id": 1, "name": 1}
-    ).to_list(100)
-    customer_map = {c["id"]: c["name"] for c in customers}
-
-    history = []
-    for q in quotations:
-        for item in q.get("line_items", []):
-            history.append({
-                "quotation_id": q.get("id"),
-                "quotation_number": q.get("quotation_number", ""),
-                "customer_name": customer_map.get(q.get("customer_id"), "Bilinmiyor"),
-                "date": q.get("created_at", ""),
-                "unit_price": item.get("unit_price", 0),
-                "currency": item.get("currency", "EUR"),
-                "quantity": item.get("quantity", 1),
-                "variant_name": item.get("variant_name", ""),
-                "item_name": item.get("item_short_name", "")
-            })
-
-    history = sorted(history, key=lambda x: x.get("date", ""), reverse=True)[:limit]
+    history = await get_price_history(product_id, limit)
     return {"history": history, "total": len(history)}
 
 
+@api_router.post("/products/price-history/rebuild")
+async def rebuild_product_price_history():
+    written = await backfill_price_history()
+    return {"ok": True, "entries": written}
+
+
 # ============================================================================
 # PRODUCT GROUPS ENDPOINTS
 # ============================================================================
 @api_router.get("/product-groups")
-async def get_product_groups():
-    groups = await db.product_groups.find({}, {"_id": 0}).sort("sort_order", 1).to_list(100)
-    return groups
+async def get_product_groups(request: Request):
+    versions = await current_collection_versions("product_groups")
+    etag, not_modified = await conditional_get(request, "product_groups", versions=versions)
+    if not_modified:
+        return not_modified
+
+    groups = await get_catalog_items("product_groups", min_version=versions["product_groups"])
+    return FastJSONResponse(groups, headers=cache_headers(etag))
 
 
 @api_router.post("/product-groups")
@@ -473,6 +582,7 @@ async def create_product_group(data: dict):
     }
 
     await db.product_groups.insert_one(group_dict)
+    await invalidate_catalog("product_groups")
     return {"ok": True, "group": {k: v for k, v in group_dict.items() if k != "_id"}}
 
 
@@ -494,6 +604,7 @@ async def update_product_group(group_id: str, data: dict):
 
     if update_data:
         await db.product_groups.update_one({"id": group_id}, {"$set": update_data})
+        await invalidate_catalog("product_groups")
 
     updated = await db.product_groups.find_one({"id": group_id}, {"_id": 0})
     return {"ok": True, "group": updated}
@@ -502,6 +613,7 @@ async def update_product_group(group_id: str, data: dict):
 @api_router.delete("/product-groups/{group_id}")
 async def delete_product_group(group_id: str):
     await db.products.update_many({"group_id": group_id}, {"$set": {"group_id": None}})
+    await invalidate_catalog("products", "product_groups")
     result = await db.product_groups.delete_one({"id": group_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Group not found")
@@ -517,6 +629,7 @@ async def assign_product_to_group(product_id: str, data: dict):
         raise HTTPException(status_code=404, detail="Product not found")
 
     await db.products.update_one({"id": product_id}, {"$set": {"group_id": group_id}})
+    await invalidate_catalog("products")
     return {"ok": True, "message": "Ürün grubu güncellendi"}
 
 
@@ -532,6 +645,7 @@ async def bulk_assign_products_to_group(data: dict):
         {"id": {"$in": product_ids}},
         {"$set": {"group_id": group_id}}
     )
+    await invalidate_catalog("products")
     return {"ok": True, "modified_count": result.modified_count}
 
 
@@ -540,13 +654,10 @@ async def bulk_assign_products_to_group(data: dict):
 # ============================================================================
 @api_router.post("/representatives", response_model=Representative)
 async def create_representative(representative: RepresentativeCreate):
-    rep_dict = representative.model_dump()
-    rep_dict["id"] = str(uuid.uuid4())
-    rep_dict["is_active"] = True
-    rep_dict["created_at"] = datetime.now(timezone.utc).isoformat()
-    rep_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    rep_dict = validated_document(Representative, representative.model_dump())
 
     await db.representatives.insert_one(rep_dict)
+    await invalidate_catalog("representatives")
     created = await db.representatives.find_one({"id": rep_dict["id"]}, {"_id": 0})
 
     created["created_at"] = _dt_from_iso(created.get("created_at"))
@@ -560,11 +671,28 @@ async def get_representatives(is_active: bool = None):
     if is_active is not None:
         query["is_active"] = is_active
 
-    reps = await db.representatives.find(query, {"_id": 0}).to_list(1000)
-    for r in reps:
-        r["created_at"] = _dt_from_iso(r.get("created_at"))
-        r["updated_at"] = _dt_from_iso(r.get("updated_at"))
-    return reps
+    reps = await get_catalog_items("representatives", **query)
+    return FastJSONResponse(reps)
+
+
+@api_router.get("/representatives/paged")
+async def get_representatives_paged(
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    fields: Optional[str] = None,
+):
+    """Keyset-paginated representatives sorted by (name, id)."""
+    query = {}
+    if name:
+        query["name"] = prefix_filter(name)
+    if is_active is not None:
+        query["is_active"] = is_active
+
+    projection = build_projection(fields, Representative.model_fields, always=("id", "name"))
+    page = await keyset_page(db.representatives, query, "name", limit, cursor, projection)
+    return FastJSONResponse(page)
 
 
 @api_router.put("/representatives/{rep_id}", response_model=Representative)
@@ -574,9 +702,10 @@ async def update_representative(rep_id: str, representative: RepresentativeUpdat
         raise HTTPException(status_code=404, detail="Representative not found")
 
     update_dict = {k: v for k, v in representative.model_dump().items() if v is not None}
-    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
+    update_dict["updated_at"] = datetime.now(timezone.utc)
 
     await db.representatives.update_one({"id": rep_id}, {"$set": update_dict})
+    await invalidate_catalog("representatives")
     updated = await db.representatives.find_one({"id": rep_id}, {"_id": 0})
 
     updated["created_at"] = _dt_from_iso(updated.get("created_at"))
@@ -584,6 +713,27 @@ async def update_representative(rep_id: str, representative: RepresentativeUpdat
     return updated
 
 
+# ============================================================================
+# COST CATEGORY ENDPOINTS
+# ============================================================================
+@api_router.get("/cost-categories", response_model=List[CostCategory])
+async def get_cost_categories(scope: Optional[str] = None, is_active: Optional[bool] = None):
+    categories = await get_catalog_items("cost_categories", is_active=is_active)
+    if scope:
+        categories = [c for c in categories if c.get("scope", "both") in (scope, "both")]
+    return FastJSONResponse(categories)
+
+
+@api_router.post("/cost-categories", response_model=CostCategory)
+async def create_cost_category(category: CostCategoryCreate):
+    category_dict = validated_document(CostCategory, category.model_dump())
+
+    await db.cost_categories.insert_one(category_dict)
+    await invalidate_catalog("cost_categories")
+    category_dict.pop("_id", None)
+    return category_dict
+
+
 # ============================================================================
 # QUOTATION ENDPOINTS
 # ============================================================================
@@ -611,181 +761,625 @@ async def update_quotation_status(quotation_id: str, payload: dict):
 
     previous_status = existing.get("offer_status", "pending")
 
-    await db.quotations.update_one({"id": quotation_id}, {"$set": update})
+    reserve = offer_status == "accepted" and previous_status != "accepted"
+    release = previous_status == "accepted" and offer_status != "accepted"
+    if reserve:
+        update["stock_reservation_tracked"] = True
+    elif release:
+        update["stock_reservation_tracked"] = False
+
+    async def apply(session):
+        # Conditional on the status we read, so two concurrent accepts can't both reserve
+        result = await db.quotations.update_one(
+            {"id": quotation_id, "offer_status": existing.get("offer_status")},
+            {"$set": update},
+            session=session,
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="Teklif durumu başka bir işlemle değişti, tekrar deneyin")
+
+        # Reservations
+        if reserve:
+            await reserve_for_quotation(existing, session=session)
+        elif release:
+            await release_for_quotation(existing, session=session)
+
+    await run_in_transaction(apply)
+    if reserve or release:
+        # After the commit, so a concurrent GET can't cache pre-commit stock under the new ETag
+        await touch_collections("stock_items")
     updated = await db.quotations.find_one({"id": quotation_id}, {"_id": 0})
-
-    # Reservations
-    if offer_status == "accepted" and previous_status != "accepted":
-        line_items = existing.get("line_items", [])
-        for item in line_items:
-            if item.get("is_optional"):
-                continue
-            product_id = item.get("product_id")
-            variant_id = item.get("variant_id") or item.get("model_name") or ""
-            quantity = float(item.get("quantity", 0) or 0)
-
-            if product_id and quantity > 0:
-                stock_items = await db.stock_items.find({"product_id": product_id}).to_list(100)
-                remaining_qty = quantity
-
-                for stock_item in stock_items:
-                    if remaining_qty <= 0:
-                        break
-                    current_reserved = float(stock_item.get("reserved_quantity", 0) or 0)
-                    available = float(stock_item.get("quantity", 0) or 0) - current_reserved
-                    reserve_qty = min(remaining_qty, max(0, available))
-
-                    if reserve_qty > 0:
-                        await db.stock_items.update_one(
-                            {"id": stock_item["id"]},
-                            {"$set": {"reserved_quantity": current_reserved + reserve_qty}}
-                        )
-                        remaining_qty -= reserve_qty
-
-    elif previous_status == "accepted" and offer_status != "accepted":
-        line_items = existing.get("line_items", [])
-        for item in line_items:
-            if item.get("is_optional"):
-                continue
-            product_id = item.get("product_id")
-            quantity = float(item.get("quantity", 0) or 0)
-
-            if product_id and quantity > 0:
-                stock_items = await db.stock_items.find({"product_id": product_id}).to_list(100)
-                remaining_qty = quantity
-
-                for stock_item in stock_items:
-                    if remaining_qty <= 0:
-                        break
-                    current_reserved = float(stock_item.get("reserved_quantity", 0) or 0)
-                    release_qty = min(remaining_qty, current_reserved)
-
-                    if release_qty > 0:
-                        await db.stock_items.update_one(
-                            {"id": stock_item["id"]},
-                            {"$set": {"reserved_quantity": max(0, current_reserved - release_qty)}}
-                        )
-                        remaining_qty -= release_qty
-
+    await apply_stats_change(existing, updated)
     return updated
 
 
 @api_router.post("/quotations/{quotation_id}/deliver")
-async def deliver_quotation(quotation_id: str):
-    existing = await db.quotations.find_one({"id": quotation_id})
+async def deliver_quotation(
+    quotation_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    existing = await db.quotations.find_one({"id": quotation_id}, {"_id": 0})
     if not existing:
         raise HTTPException(status_code=404, detail="Teklif bulunamadı")
 
     if existing.get("offer_status") != "accepted":
         raise HTTPException(status_code=400, detail="Sadece onaylanmış teklifler teslim edilebilir")
 
-    if existing.get("delivery_status") == "delivered":
-        raise HTTPException(status_code=400, detail="Bu teklif zaten teslim edilmiş")
+    result = await deliver_stock(existing, idempotency_key)
+    await touch_collections("stock_items")
+    await apply_stats_change(existing, await db.quotations.find_one({"id": quotation_id}, {"_id": 0}))
+    return result
 
-    line_items = existing.get("line_items", [])
-    stock_decreased = []
 
-    for item in line_items:
-        if item.get("is_optional"):
-            continue
+@api_router.post("/quotations/{quotation_id}/revert-delivery")
+async def revert_delivery(
+    quotation_id: str,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    existing = await db.quotations.find_one({"id": quotation_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Teklif bulunamadı")
+
+    result = await revert_stock_delivery(existing, idempotency_key)
+    await touch_collections("stock_items")
+    await apply_stats_change(existing, await db.quotations.find_one({"id": quotation_id}, {"_id": 0}))
+    return result
+
+
+async def _build_quotation_fields(quotation_dict: dict, existing: Optional[dict] = None) -> dict:
+    """
+    Denormalize customer / representative details into a quotation dict and
+    recompute totals when line items or the general discount change.
+    """
+    if quotation_dict.get("customer_id"):
+        customer = await db.customers.find_one({"id": quotation_dict["customer_id"]}, {"_id": 0})
+        if not customer:
+            raise HTTPException(status_code=404, detail="Customer not found")
+        quotation_dict["customer_name"] = customer.get("name")
+        quotation_dict["customer_details"] = customer
+
+    if quotation_dict.get("representative_id"):
+        rep = await db.representatives.find_one({"id": quotation_dict["representative_id"]}, {"_id": 0})
+        if rep:
+            quotation_dict["representative_name"] = rep.get("name")
+            quotation_dict["representative_phone"] = rep.get("phone")
+            quotation_dict["representative_email"] = rep.get("email")
+
+    if any(field in quotation_dict for field in TOTALS_INPUT_FIELDS):
+        # Partial updates: unchanged inputs come from the stored quotation
+        totals_input = {f: quotation_dict.get(f, (existing or {}).get(f)) for f in TOTALS_INPUT_FIELDS}
+        for item in totals_input["line_items"] or []:
+            item.setdefault("id", str(uuid.uuid4()))
+        quotation_dict.update(compute_quotation_totals(totals_input))
+
+    return quotation_dict
+
+
+def _quotation_out(quotation: dict) -> dict:
+    quotation["date"] = _dt_from_iso(quotation.get("date"))
+    quotation["created_at"] = _dt_from_iso(quotation.get("created_at"))
+    quotation["updated_at"] = _dt_from_iso(quotation.get("updated_at"))
+    return quotation
+
+
+async def _find_quotation(quotation_id: str) -> Optional[dict]:
+    """Live quotation, or a superseded revision rebuilt from the revision store."""
+    quotation = await db.quotations.find_one({"id": quotation_id}, {"_id": 0})
+    if quotation is None:
+        quotation = await find_stored_revision(quotation_id)
+    return quotation
+
+
+@api_router.post("/quotations", response_model=Quotation)
+async def create_quotation(quotation: QuotationCreate):
+    quotation_dict = await _build_quotation_fields(quotation.model_dump())
+
+    quote_no, base_quote_no = await generate_quote_no(quotation.quotation_type)
+    now = datetime.now(timezone.utc).isoformat()
+
+    quotation_dict["id"] = str(uuid.uuid4())
+    quotation_dict["quote_no"] = quote_no
+    quotation_dict["base_quote_no"] = base_quote_no
+    quotation_dict["revision_no"] = 0
+    quotation_dict["revision_group_id"] = quotation_dict["id"]
+    quotation_dict["date"] = now
+    quotation_dict["offer_status"] = "pending"
+    quotation_dict["invoice_status"] = "none"
+    quotation_dict["is_archived"] = False
+    quotation_dict["created_at"] = now
+    quotation_dict["updated_at"] = now
+
+    await db.quotations.insert_one(quotation_dict)
+    created = await db.quotations.find_one({"id": quotation_dict["id"]}, {"_id": 0})
+    await sync_price_history(created)
+    await apply_stats_change(None, created)
+    return _quotation_out(created)
+
+
+@api_router.post("/quotations/recompute-totals")
+async def recompute_quotation_totals():
+    """Refresh stored line totals / totals_by_currency after a totals rule change."""
+    result = await recompute_all_totals()
+    if result["updated"]:
+        await rebuild_dashboard_stats()
+    return {"ok": True, **result}
+
+
+@api_router.post("/quote-numbers/reserve")
+async def reserve_quote_numbers(count: int = Query(..., ge=1, le=10000)):
+    """Reserve a block of quote numbers for bulk imports."""
+    return {"quote_nos": await reserve_quote_nos(count)}
+
+
+@api_router.get("/quotations", response_model=List[Quotation])
+async def get_quotations(
+    quotation_type: str = None,
+    customer_id: str = None,
+    is_archived: bool = None,
+):
+    query = {}
+    if quotation_type:
+        query["quotation_type"] = quotation_type
+    if customer_id:
+        query["customer_id"] = customer_id
+    if is_archived is not None:
+        query["is_archived"] = is_archived
 
-        product_id = item.get("product_id")
-        variant_id = item.get("variant_id") or item.get("model_name") or ""
-        quantity = float(item.get("quantity", 0) or 0)
+    quotations = await db.quotations.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    return [_quotation_out(q) for q in quotations]
 
-        if not product_id or quantity <= 0:
-            continue
 
-        stock_items = await db.stock_items.find({"product_id": product_id}).to_list(100)
+@api_router.get("/quotations/{quotation_id}", response_model=Quotation)
+async def get_quotation(quotation_id: str):
+    quotation = await _find_quotation(quotation_id)
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    return _quotation_out(quotation)
 
-        remaining_qty = quantity
-        for stock_item in stock_items:
-            if remaining_qty <= 0:
-                break
 
-            current_qty = float(stock_item.get("quantity", 0) or 0)
-            current_reserved = float(stock_item.get("reserved_quantity", 0) or 0)
-            decrease_qty = min(remaining_qty, current_qty)
+@api_router.put("/quotations/{quotation_id}", response_model=Quotation)
+async def update_quotation(quotation_id: str, quotation: QuotationUpdate):
+    existing = await db.quotations.find_one({"id": quotation_id})
+    if not existing:
+        if await find_stored_revision(quotation_id):
+            raise HTTPException(status_code=409, detail="Eski revizyon düzenlenemez, güncel revizyonu kullanın")
+        raise HTTPException(status_code=404, detail="Quotation not found")
 
-            if decrease_qty > 0:
-                new_qty = max(0, current_qty - decrease_qty)
-                new_reserved = max(0, current_reserved - decrease_qty)
+    update_dict = {k: v for k, v in quotation.model_dump().items() if v is not None}
+    update_dict = await _build_quotation_fields(update_dict, existing)
+    update_dict["updated_at"] = datetime.now(timezone.utc).isoformat()
 
-                await db.stock_items.update_one(
-                    {"id": stock_item["id"]},
-                    {"$set": {"quantity": new_qty, "reserved_quantity": new_reserved}}
-                )
+    await db.quotations.update_one({"id": quotation_id}, {"$set": update_dict})
+    updated = await db.quotations.find_one({"id": quotation_id}, {"_id": 0})
+    if "line_items" in update_dict or "customer_id" in update_dict:
+        await sync_price_history(updated)
+    # Covers archive / unarchive, invoice status and totals changes
+    await apply_stats_change(existing, updated)
+    return _quotation_out(updated)
 
-                stock_decreased.append({
-                    "product_id": product_id,
-                    "variant_id": variant_id,
-                    "decreased": decrease_qty
-                })
 
-                remaining_qty -= decrease_qty
+@api_router.post("/quotations/{quotation_id}/revise", response_model=Quotation)
+async def revise_quotation(quotation_id: str):
+    """
+    New revision of a quotation group; revising an older revision starts the new one from
+    that revision's content. With REVISION_STORAGE=full (default) every revision stays a
+    quotation. With REVISION_STORAGE=delta the current revision moves to the revision store
+    and the new one is the group's live quotation; an accepted or delivered current revision
+    stays live (it owns stock reservations / deliveries).
+    """
+    source = await _find_quotation(quotation_id)
+    if not source:
+        raise HTTPException(status_code=404, detail="Quotation not found")
 
-    await db.quotations.update_one(
-        {"id": quotation_id},
-        {"$set": {
-            "delivery_status": "delivered",
-            "delivered_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
+    group_id = source.get("revision_group_id") or source["id"]
+    current = await db.quotations.find_one(
+        {"$or": [{"revision_group_id": group_id}, {"id": group_id}]}, {"_id": 0},
+        sort=[("revision_no", -1)],
+    )
+    if not current:
+        raise HTTPException(status_code=404, detail="Güncel revizyon bulunamadı")
+    archive_current = DELTA_REVISIONS and not owns_stock(current)
+
+    revision_no = int(current.get("revision_no") or 0) + 1
+    base_quote_no = current.get("base_quote_no") or current.get("quote_no")
+    now = datetime.now(timezone.utc).isoformat()
+
+    revision = {k: v for k, v in source.items() if k not in (
+        "rejection_reason", "invoice_number", "invoice_status", "delivery_status",
+        "stock_reservation_tracked",
+    )}
+    revision.update(
+        id=str(uuid.uuid4()),
+        quote_no=f"{base_quote_no}-R{revision_no}",
+        base_quote_no=base_quote_no,
+        revision_no=revision_no,
+        revision_group_id=group_id,
+        date=now,
+        offer_status="pending",
+        invoice_status="none",
+        is_archived=False,
+        created_at=now,
+        updated_at=now,
     )
+    current.setdefault("revision_group_id", group_id)
+
+    if not archive_current:
+        await db.quotations.insert_one(revision)
+        revision.pop("_id", None)
+        await sync_price_history(revision)
+        await apply_stats_change(None, revision)
+        return _quotation_out(revision)
+
+    async def apply(session):
+        # Without a transaction (standalone Mongo) the group must never be left without a
+        # live quotation: archive, insert the new revision, and only then drop the current one.
+        await store_revision(current, session=session)
+        try:
+            await db.quotations.insert_one(revision, session=session)
+            # Conditional on the revision we read, so two concurrent revises can't both win
+            result = await db.quotations.delete_one(
+                {"id": current["id"], "revision_no": current.get("revision_no")}, session=session
+            )
+            if result.deleted_count == 0:
+                raise HTTPException(status_code=409, detail="Teklif başka bir işlemle değişti, tekrar deneyin")
+        except Exception:
+            if session is None:
+                await db.quotations.delete_one({"id": revision["id"]})
+                # A concurrent revise that won archived the same revision: keep its entry
+                if await db.quotations.count_documents({"id": current["id"]}, limit=1):
+                    await discard_stored_revision(current)
+            raise
+
+    await run_in_transaction(apply)
+    revision.pop("_id", None)
+
+    pdf_cache.invalidate(current["id"])
+    await remove_price_history(current["id"])
+    await sync_price_history(revision)
+    await apply_stats_change(current, revision)
+    return _quotation_out(revision)
+
+
+@api_router.get("/quotations/{quotation_id}/revisions")
+async def get_quotation_revisions(quotation_id: str):
+    """All revisions of the quotation's group (lightweight fields), oldest first."""
+    quotation = await db.quotations.find_one({"id": quotation_id}, {"_id": 0, "id": 1, "revision_group_id": 1})
+    if quotation is None:
+        quotation = await db.quotation_revisions.find_one(
+            {"id": quotation_id}, {"_id": 0, "id": 1, "revision_group_id": 1}
+        )
+    if quotation is None:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    return FastJSONResponse(await list_revisions(quotation.get("revision_group_id") or quotation["id"]))
 
-    return {"ok": True, "message": "Teslimat tamamlandı", "stock_decreased": stock_decreased}
 
+@api_router.get("/quotations/{quotation_id}/revisions/{revision_no}", response_model=Quotation)
+async def get_quotation_revision(quotation_id: str, revision_no: int):
+    """One revision of the quotation's group, rebuilt from the revision store when superseded."""
+    quotation = await _find_quotation(quotation_id)
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    group_id = quotation.get("revision_group_id") or quotation["id"]
 
-@api_router.post("/quotations/{quotation_id}/revert-delivery")
-async def revert_delivery(quotation_id: str):
-    existing = await db.quotations.find_one({"id": quotation_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Teklif bulunamadı")
+    revision = await db.quotations.find_one(
+        {"revision_group_id": group_id, "revision_no": revision_no}, {"_id": 0}
+    ) or await reconstruct_revision(group_id, revision_no)
+    if not revision:
+        raise HTTPException(status_code=404, detail="Revizyon bulunamadı")
+    return _quotation_out(revision)
+
+
+@api_router.delete("/quotations/{quotation_id}")
+async def delete_quotation(quotation_id: str):
+    deleted = await db.quotations.find_one_and_delete({"id": quotation_id}, {"_id": 0})
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    pdf_cache.invalidate(quotation_id)
+    await remove_price_history(quotation_id)
+    await apply_stats_change(deleted, None)
+    # Only this revision is deleted: when it was the group's last live one, the newest
+    # stored revision becomes the live quotation again (earlier history is kept)
+    group_id = deleted.get("revision_group_id") or quotation_id
+    if not await db.quotations.find_one({"revision_group_id": group_id}, {"_id": 1}):
+        promoted = await promote_latest_revision(group_id)
+        if promoted:
+            await sync_price_history(promoted)
+            await apply_stats_change(None, promoted)
+    return {"message": "Quotation deleted"}
 
-    if existing.get("delivery_status") != "delivered":
-        raise HTTPException(status_code=400, detail="Bu teklif teslim edilmemiş")
 
-    line_items = existing.get("line_items", [])
-    stock_restored = []
+# ============================================================================
+# DASHBOARD ENDPOINTS
+# ============================================================================
+def _round_totals(totals: dict) -> dict:
+    return {currency: round(amount, 2) for currency, amount in (totals or {}).items()}
 
-    for item in line_items:
-        if item.get("is_optional"):
-            continue
 
-        product_id = item.get("product_id")
-        variant_id = item.get("variant_id") or item.get("model_name") or ""
-        quantity = float(item.get("quantity", 0) or 0)
+def _month_end(month: str) -> str:
+    try:
+        year, mon = int(month[:4]), int(month[5:7])
+    except ValueError:
+        return month
+    return f"{month}-{calendar.monthrange(year, mon)[1]:02d}"
 
-        if not product_id or quantity <= 0:
-            continue
 
-        stock_items = await db.stock_items.find({"product_id": product_id}).to_list(100)
-        if stock_items:
-            stock_item = stock_items[0]
-            current_qty = float(stock_item.get("quantity", 0) or 0)
-            current_reserved = float(stock_item.get("reserved_quantity", 0) or 0)
+@api_router.get("/dashboard/stats")
+async def get_dashboard_statistics(base: Optional[str] = None):
+    """
+    Incrementally maintained dashboard numbers (one document read).
+    With ?base=EUR every currency breakdown also gets a converted total.
+    """
+    stats = await get_dashboard_stats()
+    table = await get_rate_table() if base else None
+    today = datetime.now(timezone.utc).date().isoformat()
 
-            await db.stock_items.update_one(
-                {"id": stock_item["id"]},
-                {"$set": {
-                    "quantity": current_qty + quantity,
-                    "reserved_quantity": current_reserved + quantity
-                }}
-            )
+    for month, entry in (stats.get("monthly") or {}).items():
+        entry["totals"] = _round_totals(entry.get("totals"))
+        if table:
+            entry["converted"] = table.convert_amounts(entry["totals"], base, min(_month_end(month), today))
+
+    rep_names = {r["id"]: r.get("name") for r in await get_catalog_items("representatives")}
+    for rep_id, entry in (stats.get("accepted_by_representative") or {}).items():
+        entry["name"] = rep_names.get(rep_id)
+        entry["totals"] = _round_totals(entry.get("totals"))
+        if table:
+            entry["converted"] = table.convert_amounts(entry["totals"], base, today)
+
+    if base:
+        stats["base"] = base.upper()
+    return FastJSONResponse(stats)
+
+
+@api_router.post("/dashboard/stats/rebuild")
+async def rebuild_dashboard_statistics():
+    stats = await rebuild_dashboard_stats()
+    return {"ok": True, "quotations": int(stats.get("quotations", 0)), "archived": int(stats.get("archived", 0))}
 
-            stock_restored.append({
-                "product_id": product_id,
-                "variant_id": variant_id,
-                "restored": quantity
-            })
-
-    await db.quotations.update_one(
-        {"id": quotation_id},
-        {"$set": {
-            "delivery_status": "pending",
-            "delivered_at": None,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
+
+# ============================================================================
+# PDF ENDPOINTS
+# ============================================================================
+async def _get_native_pdf(quotation: dict) -> Path:
+    """Cached native PDF path for a quotation; renders in the process pool on a miss."""
+    quotation_id = quotation["id"]
+    cache_key = native_pdf_cache_key(quotation)
+    pdf_path = pdf_cache.get(quotation_id, cache_key)
+
+    if pdf_path is None:
+        fd, tmp_path = tempfile.mkstemp(suffix=".render", dir=PDF_CACHE_DIR)
+        os.close(fd)
+        try:
+            await render_service.run(build_native_quotation_pdf, quotation, tmp_path)
+            pdf_path = pdf_cache.put(quotation_id, cache_key, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return pdf_path
+
+
+@api_router.get("/quotations/{quotation_id}/generate-pdf")
+async def generate_quotation_pdf(quotation_id: str):
+    quotation = await _find_quotation(quotation_id)
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+
+    pdf_path = await _get_native_pdf(quotation)
+    filename = _sanitize_filename(quotation.get("quote_no") or quotation_id)
+    return FileResponse(str(pdf_path), media_type="application/pdf", filename=f"{filename}.pdf")
+
+
+# Progress of running / recently finished bulk exports: export_id -> counters
+_pdf_exports = OrderedDict()
+PDF_EXPORT_HISTORY = 50
+PDF_EXPORT_CONCURRENCY = int(os.environ.get("PDF_EXPORT_CONCURRENCY", "4"))
+
+
+def _month_range(month: str) -> tuple:
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month YYYY-MM formatında olmalı")
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start.strftime("%Y-%m"), end.strftime("%Y-%m")
+
+
+@api_router.get("/quotations/export/pdf")
+async def export_quotation_pdfs(
+    customer_id: str = None,
+    month: str = None,
+    project_code: str = None,
+    quotation_type: str = None,
+    offer_status: str = None,
+    include_archived: bool = False,
+):
+    """
+    Export the native PDFs of all matching quotations as one streamed ZIP.
+    PDFs are rendered concurrently and written to the ZIP as each one finishes.
+    Progress: GET /quotations/export/progress/{X-Export-Id}
+    """
+    query = {}
+    if customer_id:
+        query["customer_id"] = customer_id
+    if month:
+        start, end = _month_range(month)
+        query["date"] = {"$gte": start, "$lt": end}
+    if project_code:
+        query["project_code"] = project_code
+    if quotation_type:
+        query["quotation_type"] = quotation_type
+    if offer_status:
+        query["offer_status"] = offer_status
+    if not include_archived:
+        query["is_archived"] = {"$ne": True}
+
+    total = await db.quotations.count_documents(query)
+    if total == 0:
+        raise HTTPException(status_code=404, detail="Filtreye uyan teklif bulunamadı")
+
+    export_id = str(uuid.uuid4())
+    progress = {
+        "export_id": export_id,
+        "status": "running",
+        "total": total,
+        "done": 0,
+        "failed": 0,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "finished_at": None,
+    }
+    _pdf_exports[export_id] = progress
+    while len(_pdf_exports) > PDF_EXPORT_HISTORY:
+        _pdf_exports.popitem(last=False)
+
+    def _close_rendered(task: asyncio.Future):
+        if not task.cancelled():
+            fileobj = task.result()[1]
+            if fileobj is not None:
+                fileobj.close()
+
+    async def render_one(quotation: dict):
+        try:
+            pdf_path = await _get_native_pdf(quotation)
+            # Opened right away so a later cache eviction can't pull the file away
+            return quotation, open(pdf_path, "rb"), None
+        except Exception as e:
+            return quotation, None, str(getattr(e, "detail", e))
+
+    async def rendered_entries():
+        used_names = set()
+        errors = []
+        pending = set()
+        unconsumed = set()  # started renders whose result (open file) wasn't handed to the ZIP yet
+        cursor = db.quotations.find(query, {"_id": 0}).sort("date", 1)
+
+        async def drain(wait_for_all: bool):
+            nonlocal pending
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    unconsumed.discard(task)
+                    yield task.result()
+                if not wait_for_all:
+                    break
+
+        async def entries_from(results):
+            async for quotation, fileobj, error in results:
+                name = _sanitize_filename(quotation.get("quote_no") or quotation["id"])
+                if error:
+                    progress["failed"] += 1
+                    errors.append(f"{name}: {error}")
+                    continue
+                arcname = f"{name}.pdf"
+                if arcname in used_names:
+                    arcname = f"{name}_{quotation['id'][:8]}.pdf"
+                used_names.add(arcname)
+                progress["done"] += 1
+                yield arcname, fileobj
+
+        try:
+            async for quotation in cursor:
+                task = asyncio.ensure_future(render_one(quotation))
+                pending.add(task)
+                unconsumed.add(task)
+                if len(pending) >= PDF_EXPORT_CONCURRENCY:
+                    async for entry in entries_from(drain(wait_for_all=False)):
+                        yield entry
+            async for entry in entries_from(drain(wait_for_all=True)):
+                yield entry
+
+            if errors:
+                yield "HATALAR.txt", io.BytesIO("\n".join(errors).encode("utf-8"))
+            progress["status"] = "completed"
+        except BaseException:
+            progress["status"] = "cancelled"
+            raise
+        finally:
+            # Client disconnect / error mid-stream: stop renders still running and close the
+            # files of finished ones that never reached the ZIP
+            for task in unconsumed:
+                if task.done():
+                    _close_rendered(task)
+                else:
+                    task.cancel()
+                    task.add_done_callback(_close_rendered)
+            progress["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+    filename = f"teklifler_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_zip(rendered_entries()),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Id": export_id,
+            "X-Export-Total": str(total),
+        },
     )
 
-    return {"ok": True, "message": "Teslimat geri alındı, stoklar yeniden eklendi", "stock_restored": stoc_
+
+@api_router.get("/quotations/export/progress/{export_id}")
+async def get_export_progress(export_id: str):
+    progress = _pdf_exports.get(export_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return progress
+
+
+@api_router.api_route("/quotations/{quotation_id}/generate-pdf-v2", methods=["GET", "HEAD"])
+async def generate_quotation_pdf_v2(quotation_id: str, request: Request):
+    quotation = await _find_quotation(quotation_id)
+    if not quotation:
+        raise HTTPException(status_code=404, detail="Quotation not found")
+    # Launches the browser on the first request when it wasn't pre-warmed
+    await browser_pool.ensure_started()
+
+    filename = _sanitize_filename(quotation.get("quote_no") or quotation_id)
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.pdf"'}
+
+    # The frontend probes with HEAD before navigating; don't render twice
+    if request.method == "HEAD":
+        return Response(media_type="application/pdf", headers=headers)
+
+    pdf_bytes = await browser_pool.render_pdf(build_quotation_html(quotation))
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@api_router.get("/pdf-browser/stats")
+async def get_pdf_browser_stats():
+    return browser_pool.stats()
+
+
+@api_router.get("/pdf-render/stats")
+async def get_pdf_render_stats():
+    return render_service.stats()
+
+
+@api_router.get("/pdf-cache/stats")
+async def get_pdf_cache_stats():
+    return pdf_cache.stats()
+
+
+@api_router.get("/catalog-cache/stats")
+async def get_catalog_cache_stats():
+    return catalog_cache_stats()
+
+
+@api_router.get("/db/pool/stats")
+async def get_db_pool_stats():
+    """Connection pool usage of this worker (for sizing workers / MONGO_MAX_POOL_SIZE)."""
+    return await mongo_connection_stats(client)
+
+
+@api_router.get("/db/indexes")
+async def get_db_index_report():
+    """Registered indexes missing from the database, unregistered ones and unused ones."""
+    return await db_index_report()
+
+
+@api_router.post("/db/indexes/ensure")
+async def ensure_db_index_registry():
+    return await ensure_db_indexes()
+
+
+app.include_router(api_router, prefix="/api")
@@ -10,9 +10,15 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Body
 from typing import Optional, List
 from datetime import datetime, timezone
 from uuid import uuid4
-import pandas as pd
 import io
 
+from models import Product
+from catalog_cache import invalidate as invalidate_catalog
+from serialization import validated_document
+from lazy_imports import lazy_module
+
+pd = lazy_module("pandas")
+
 router = APIRouter(tags=["SOFIS Import"])
 
 _db = None
@@ -290,11 +296,9 @@ async def apply_sofis_changes(data: dict = Body(...)):
                     "price": p.get('cost_price', 0),
                     "cost_price": p.get('cost_price', 0)
                 }],
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
             }
             
-            await _db.products.insert_one(new_product)
+            await _db.products.insert_one(validated_document(Product, new_product))
             added += 1
             
         except Exception as e:
@@ -327,7 +331,7 @@ async def apply_sofis_changes(data: dict = Body(...)):
                 "models": models,
                 "cost_price": new_price,
                 "default_unit_price": new_price,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }
             
             # Update group if provided
@@ -363,6 +367,7 @@ async def apply_sofis_changes(data: dict = Body(...)):
         except:
             pass
     
+    await invalidate_catalog("products", "product_groups")
     return {
         'ok': True,
         'added': added,
@@ -0,0 +1,297 @@
+"""
+Batch Stock Movements (toplu mal kabul / sevk / transfer)
+- Tek istekte çok sayıda IN / OUT / TRANSFER satırı; tüm satırlar yazmadan önce doğrulanır
+  (hareket tipi, miktar, bölme adresleri, mevcut stok)
+- Adresler tek geçişte konum indeksinden çözülür; mevcut stok tek sorguyla okunur
+- Uygulama: düşümler (OUT + transfer kaynağı) bir bulk_write, artışlar (IN + transfer hedefi) bir bulk_write,
+  hareket kayıtları tek insert_many; mümkünse hepsi tek transaction içinde
+- Düşümler koşulludur (quantity - reserved_quantity >= miktar); her düşüm ve artış satır numarasıyla işaretlenir,
+  böylece eşzamanlı bir değişiklikte hangi satırın uygulanamadığı kesin bilinir; işaretler yalnızca
+  partideki stok anahtarları üzerinden (benzersiz indeks) okunur / temizlenir
+- Transaction yoksa artış veya hareket kaydı adımında hata olursa uygulanan düşüm / artışlar geri alınır
+- OUT / TRANSFER satırları partiden önceki stoktan düşer (aynı partideki IN satırlarına dayanamaz)
+- all_or_nothing=True: tek bir hatalı satır bütün partiyi reddeder; False: geçerli satırlar uygulanır,
+  her satır için sonuç döner
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import uuid
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from stock_mutations import (
+    MAX_ATTEMPTS, available_at_least, decrement_update, increment_update, run_with_retry, stock_key
+)
+from warehouse_locations import Location, resolve_slots
+from warehouse_models import StockMovementType
+
+_db = None
+
+MAX_BATCH_LINES = 2000
+BATCH_TYPES = (StockMovementType.IN, StockMovementType.OUT, StockMovementType.TRANSFER)
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _location_fields(location: Location, prefix: str = "") -> dict:
+    return {
+        f"{prefix}warehouse_id": location.warehouse_id,
+        f"{prefix}rack_group_id": location.rack_group_id,
+        f"{prefix}rack_level_id": location.rack_level_id,
+        f"{prefix}rack_slot_id": location.rack_slot_id,
+    }
+
+
+def validate_lines(lines: list, locations: Dict[str, Optional[Location]],
+                   stock_rows: List[dict]) -> Tuple[list, Dict[int, str]]:
+    """
+    Check every line against the resolved slots and the stock before the batch.
+    Returns (valid lines as (index, line, source, target), {index: error}).
+    """
+    available = {}
+    for row in stock_rows:
+        key = (row.get("rack_slot_id"), row.get("product_id"), row.get("variant_key", row.get("variant_id") or ""))
+        available[key] = (row.get("quantity", 0) or 0) - (row.get("reserved_quantity", 0) or 0)
+
+    valid, errors = [], {}
+    for i, line in enumerate(lines):
+        movement_type = (line.movement_type or "").upper()
+        source = locations.get(line.rack_slot_id)
+        target = locations.get(line.target_rack_slot_id) if line.target_rack_slot_id else None
+        if movement_type not in BATCH_TYPES:
+            errors[i] = f"Geçersiz hareket tipi: {line.movement_type}"
+        elif not line.quantity or line.quantity <= 0:
+            errors[i] = "Miktar sıfırdan büyük olmalı"
+        elif source is None:
+            errors[i] = f"Bölme bulunamadı: {line.rack_slot_id}"
+        elif movement_type == StockMovementType.TRANSFER and not line.target_rack_slot_id:
+            errors[i] = "Transfer için hedef bölme gerekli"
+        elif movement_type == StockMovementType.TRANSFER and target is None:
+            errors[i] = f"Hedef bölme bulunamadı: {line.target_rack_slot_id}"
+        elif movement_type == StockMovementType.TRANSFER and line.target_rack_slot_id == line.rack_slot_id:
+            errors[i] = "Kaynak ve hedef bölme aynı"
+        if i in errors:
+            continue
+
+        if movement_type != StockMovementType.IN:
+            key = (line.rack_slot_id, line.product_id, line.variant_id or "")
+            if key not in available:
+                errors[i] = "Bu bölmede stok bulunamadı"
+                continue
+            if available[key] < line.quantity:
+                errors[i] = f"Yetersiz stok. Kullanılabilir: {available[key]}, İstenen: {line.quantity}"
+                continue
+            available[key] -= line.quantity
+        valid.append((i, line, source, target))
+    return valid, errors
+
+
+def _line_results(lines: list, errors: Dict[int, str], movements: Dict[int, dict]) -> list:
+    results = []
+    for i, line in enumerate(lines):
+        if i in movements:
+            movement = movements[i]
+            result = {"line": i + 1, "ok": True, "movement_type": movement["movement_type"],
+                      "movement_id": movement["id"], "address": movement["source_address"]}
+            if movement.get("target_address"):
+                result["target_address"] = movement["target_address"]
+        else:
+            result = {"line": i + 1, "ok": False, "error": errors.get(i, "Uygulanmadı")}
+        results.append(result)
+    return results
+
+
+def _rejected(message: str, lines: list, errors: Dict[int, str], status_code: int):
+    return HTTPException(status_code=status_code, detail={
+        "message": message, "results": _line_results(lines, errors, {}),
+    })
+
+
+async def _increment(ops: list, session):
+    """Unordered upserts; a first-time key created concurrently by another request is retried."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            await _db.stock_items.bulk_write(ops, ordered=False, session=session)
+            return
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if attempt == MAX_ATTEMPTS - 1 or any(err.get("code") != 11000 for err in write_errors):
+                raise
+            if session is not None:
+                # The write error aborted the transaction; run_with_retry starts it over
+                raise DuplicateKeyError(write_errors[0].get("errmsg", "duplicate key"), 11000)
+            ops = [ops[err["index"]] for err in write_errors]
+
+
+def _target(line, source: Location, target: Optional[Location]) -> Location:
+    """Where the line adds stock: the slot itself for IN, the target slot for TRANSFER."""
+    return source if line.movement_type.upper() == StockMovementType.IN else target
+
+
+async def _marked_lines(keys: List[dict], field: str, session) -> set:
+    """Line indexes pushed to field on the records of the given stock keys (unique index, not a scan)."""
+    rows = await _db.stock_items.find(
+        {"$or": keys, field: {"$exists": True}}, {"_id": 0, field: 1}, session=session
+    ).to_list(None)
+    lines = set()
+    for row in rows:
+        value = row
+        for part in field.split("."):
+            value = value.get(part, {})
+        lines.update(value or [])
+    return lines
+
+
+async def _clear_marks(keys: List[dict], field: str, session):
+    await _db.stock_items.update_many({"$or": keys, field: {"$exists": True}}, {"$unset": {field: ""}},
+                                      session=session)
+
+
+async def _undo(decrements: dict, applied_out: set, increments: dict, applied_in: set):
+    """Without a transaction: put back exactly the decrements and increments that went through."""
+    undo = [UpdateOne(stock_key(decrements[i].rack_slot_id, decrements[i].product_id, decrements[i].variant_id),
+                      {"$inc": {"quantity": decrements[i].quantity}, "$set": {"updated_at": _now()}})
+            for i in applied_out]
+    for i in applied_in:
+        line, location = increments[i]
+        undo.append(UpdateOne(stock_key(location.rack_slot_id, line.product_id, line.variant_id),
+                              {"$inc": {"quantity": -line.quantity}, "$set": {"updated_at": _now()}}))
+    if undo:
+        await _db.stock_items.bulk_write(undo, ordered=False)
+
+
+async def apply_batch(body) -> dict:
+    """body: StockBatchCreate. Returns per-line results; raises 400/409 for a rejected all-or-nothing batch."""
+    lines = body.lines
+    if len(lines) > MAX_BATCH_LINES:
+        raise HTTPException(status_code=400, detail=f"Bir partide en fazla {MAX_BATCH_LINES} satır olabilir")
+
+    slot_ids = {line.rack_slot_id for line in lines}
+    slot_ids.update(line.target_rack_slot_id for line in lines if line.target_rack_slot_id)
+    locations = await resolve_slots(slot_ids)
+
+    outgoing = [line for line in lines if (line.movement_type or "").upper() != StockMovementType.IN]
+    stock_rows = []
+    if outgoing:
+        stock_rows = await _db.stock_items.find(
+            {"rack_slot_id": {"$in": list({line.rack_slot_id for line in outgoing})},
+             "product_id": {"$in": list({line.product_id for line in outgoing})}},
+            {"_id": 0, "rack_slot_id": 1, "product_id": 1, "variant_id": 1, "variant_key": 1,
+             "quantity": 1, "reserved_quantity": 1},
+        ).to_list(None)
+
+    valid, errors = validate_lines(lines, locations, stock_rows)
+    if errors and body.all_or_nothing:
+        raise _rejected(f"{len(errors)} satır geçersiz, parti uygulanmadı", lines, errors, 400)
+
+    batch_id = str(uuid.uuid4())
+    mark = f"batch_marks.{batch_id}"
+    out_mark, in_mark = f"{mark}.out", f"{mark}.in"
+
+    async def apply(session):
+        line_errors = dict(errors)
+
+        # 1) Guarded decrements, each tagged with its line index
+        decrements = {i: line for i, line, _, _ in valid if line.movement_type.upper() != StockMovementType.IN}
+        out_keys = [stock_key(line.rack_slot_id, line.product_id, line.variant_id) for line in decrements.values()]
+        applied_out = set()
+        if decrements:
+            ops = []
+            for i, line in decrements.items():
+                update = decrement_update(line.quantity)
+                update["$push"] = {out_mark: i}
+                ops.append(UpdateOne(
+                    {**stock_key(line.rack_slot_id, line.product_id, line.variant_id),
+                     **available_at_least(line.quantity)},
+                    update,
+                ))
+            await _db.stock_items.bulk_write(ops, ordered=False, session=session)
+            applied_out = await _marked_lines(out_keys, out_mark, session)
+
+            missed = set(decrements) - applied_out
+            for i in missed:
+                line_errors[i] = "Stok eşzamanlı olarak değişti (yetersiz stok)"
+            if missed and body.all_or_nothing:
+                if session is None:
+                    await _undo(decrements, applied_out, {}, set())
+                    await _clear_marks(out_keys, mark, None)
+                raise _rejected("Stok eşzamanlı olarak değişti, partiyi tekrar deneyin", lines, line_errors, 409)
+
+        # 2) Upserted increments: IN lines and the targets of applied transfers, also tagged
+        increments = {
+            i: (line, _target(line, source, target)) for i, line, source, target in valid
+            if line.movement_type.upper() == StockMovementType.IN
+            or (line.movement_type.upper() == StockMovementType.TRANSFER and i in applied_out)
+        }
+        in_keys = [stock_key(location.rack_slot_id, line.product_id, line.variant_id)
+                   for line, location in increments.values()]
+        now = _now()
+        movements = {}
+        for i, line, source, target in valid:
+            movement_type = line.movement_type.upper()
+            if movement_type != StockMovementType.IN and i not in applied_out:
+                continue
+            movement = {
+                "id": str(uuid.uuid4()),
+                "movement_type": movement_type,
+                **_location_fields(source),
+                "product_id": line.product_id,
+                "variant_id": line.variant_id,
+                "variant_name": line.variant_name,
+                "quantity": -line.quantity if movement_type == StockMovementType.OUT else line.quantity,
+                "source_address": source.full_address,
+                "reference": line.reference or body.reference,
+                "note": line.note or body.note,
+                "batch_id": batch_id,
+                "created_at": now,
+            }
+            if movement_type == StockMovementType.TRANSFER:
+                movement.update(_location_fields(target, "target_"))
+                movement["target_address"] = target.full_address
+            movements[i] = movement
+
+        try:
+            if increments:
+                ops = []
+                for i, (line, location) in increments.items():
+                    update = increment_update(location._asdict(), line.variant_id, line.variant_name,
+                                              line.quantity, location.full_address)
+                    update["$push"] = {in_mark: i}
+                    ops.append(UpdateOne(stock_key(location.rack_slot_id, line.product_id, line.variant_id),
+                                         update, upsert=True))
+                await _increment(ops, session)
+
+            # 3) Movement log
+            if movements:
+                await _db.stock_movements.insert_many([dict(m) for m in movements.values()], session=session)
+        except Exception:
+            if session is None:
+                # No transaction to roll back: don't leave sources decremented without targets / log
+                applied_in = await _marked_lines(in_keys, in_mark, None) if increments else set()
+                await _undo(decrements, applied_out, increments, applied_in)
+                await _db.stock_movements.delete_many({"batch_id": batch_id})
+                await _clear_marks(out_keys + in_keys, mark, None)
+            raise
+
+        if out_keys or in_keys:
+            await _clear_marks(out_keys + in_keys, mark, session)
+        return movements, line_errors
+
+    movements, line_errors = await run_with_retry(apply)
+    return {
+        "ok": not line_errors,
+        "batch_id": batch_id,
+        "applied": len(movements),
+        "failed": len(lines) - len(movements),
+        "results": _line_results(lines, line_errors, movements),
+    }
@@ -0,0 +1,319 @@
+"""
+Delivery Pipeline (teslimat / teslimat geri alma)
+- Tüm stok düşümleri önceden hesaplanır ve tek bir ordered bulk_write ile uygulanır
+- Her güncelleme koşulludur (quantity >= n); eşzamanlı değişiklikte teslimat iptal edilir
+- Teslimat bir "deliveries" dokümanı olarak kaydedilir; geri alma bu kaydı birebir tersine çevirir
+- Idempotency key ile tekrarlanan istekler (çift tıklama, retry) stoğa tekrar dokunmaz
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+import uuid
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from stock_mutations import stock_key, variant_key
+from stock_reservations import run_in_transaction, required_quantities, EPSILON
+
+_db = None
+
+# Identity fields copied into the delivery record so a revert can recreate a deleted stock row
+_ROW_IDENTITY_FIELDS = (
+    "warehouse_id", "rack_group_id", "rack_level_id", "rack_slot_id",
+    "product_id", "variant_id", "variant_name", "variant_sku", "full_address",
+)
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def plan_delivery(quotation: dict, stock_items: list) -> list:
+    """
+    Decide how much to take from each stock row.
+    Rows holding this quotation's reservation are used first; the whole reservation
+    is consumed (or released) since the quotation no longer needs it after delivery.
+    """
+    quotation_id = quotation["id"]
+    tracked = bool(quotation.get("stock_reservation_tracked"))
+    remaining = required_quantities(quotation.get("line_items", []))
+
+    def reserved_here(row):
+        return float((row.get("reservations") or {}).get(quotation_id, 0) or 0)
+
+    rows = sorted(stock_items, key=lambda r: (reserved_here(r) <= 0, r.get("created_at") or ""))
+    plan = []
+    for row in rows:
+        want = remaining.get(row["product_id"], 0)
+        quantity = float(row.get("quantity", 0) or 0)
+        decrease = min(want, quantity) if want > EPSILON else 0
+        if tracked:
+            reserved_release = reserved_here(row)
+        else:
+            reserved_release = min(decrease, float(row.get("reserved_quantity", 0) or 0))
+
+        if decrease <= EPSILON and reserved_release <= EPSILON:
+            continue
+        remaining[row["product_id"]] = want - decrease
+        plan.append({
+            "stock_item_id": row["id"],
+            "quantity": decrease,
+            "reserved_released": reserved_release,
+            "reservation_marker": reserved_here(row) if tracked else 0,
+            "row": {f: row.get(f) for f in _ROW_IDENTITY_FIELDS},
+        })
+    return plan
+
+
+def _delivery_ops(plan: list, quotation_id: str, delivery_id: str, mark: bool) -> list:
+    """
+    Guarded decrements. Without a transaction each touched row is also marked with the
+    delivery id, so a partially applied batch can be identified and undone exactly.
+    """
+    ops = []
+    for p in plan:
+        guard = {"id": p["stock_item_id"], "quantity": {"$gte": p["quantity"]}}
+        update = {
+            "$inc": {"quantity": -p["quantity"], "reserved_quantity": -p["reserved_released"]},
+            "$set": {"updated_at": _now()},
+        }
+        if mark:
+            update["$set"][f"delivery_marks.{delivery_id}"] = True
+        if p["reservation_marker"]:
+            guard[f"reservations.{quotation_id}"] = p["reservation_marker"]
+            update["$unset"] = {f"reservations.{quotation_id}": ""}
+        else:
+            guard["reserved_quantity"] = {"$gte": p["reserved_released"]}
+        ops.append(UpdateOne(guard, update))
+    return ops
+
+
+def _revert_ops(items: list, quotation_id: str, restore_reservation: bool, unset_field: Optional[str] = None) -> list:
+    """
+    Inverse of the delivery; recreates a stock row that was deleted in the meantime.
+    Rows are matched on their (slot, product, variant) key, so a row recreated by a
+    concurrent stock IN is incremented instead of duplicated.
+    """
+    ops = []
+    for p in items:
+        row = p["row"]
+        if row.get("rack_slot_id"):
+            query = stock_key(row["rack_slot_id"], row["product_id"], row.get("variant_id"))
+        else:
+            query = {"id": p["stock_item_id"]}
+        recreated = {**row, "id": p["stock_item_id"], "variant_key": variant_key(row.get("variant_id")),
+                     "min_stock": 0, "created_at": _now()}
+        update = {
+            "$inc": {"quantity": p["quantity"], "reserved_quantity": p["reserved_released"]},
+            "$set": {"updated_at": _now()},
+            "$setOnInsert": {f: v for f, v in recreated.items() if f not in query},
+        }
+        if restore_reservation and p["reservation_marker"]:
+            update["$inc"][f"reservations.{quotation_id}"] = p["reservation_marker"]
+        if unset_field:
+            update["$unset"] = {unset_field: ""}
+        ops.append(UpdateOne(query, update, upsert=True))
+    return ops
+
+
+def _summary(plan: list, variants: dict, key: str) -> list:
+    return [
+        {"product_id": p["row"]["product_id"], "variant_id": variants.get(p["row"]["product_id"], ""), key: p["quantity"]}
+        for p in plan if p["quantity"] > EPSILON
+    ]
+
+
+def _variants_by_product(quotation: dict) -> dict:
+    variants = {}
+    for item in quotation.get("line_items", []) or []:
+        if item.get("product_id") and item["product_id"] not in variants:
+            variants[item["product_id"]] = item.get("variant_id") or item.get("model_name") or ""
+    return variants
+
+
+async def deliver(quotation: dict, idempotency_key: Optional[str] = None) -> dict:
+    quotation_id = quotation["id"]
+    variants = _variants_by_product(quotation)
+
+    async def replay():
+        previous = await _db.deliveries.find_one({"idempotency_key": idempotency_key}, {"_id": 0})
+        if not previous:
+            return None
+        if previous["quotation_id"] != quotation_id:
+            raise HTTPException(status_code=409, detail="Idempotency key başka bir teklif için kullanılmış")
+        return {"ok": True, "message": "Teslimat tamamlandı", "delivery_id": previous["id"],
+                "stock_decreased": _summary(previous["items"], variants, "decreased"), "replayed": True}
+
+    if idempotency_key:
+        replayed = await replay()
+        if replayed:
+            return replayed
+
+    if quotation.get("delivery_status") == "delivered":
+        raise HTTPException(status_code=400, detail="Bu teklif zaten teslim edilmiş")
+
+    needed = required_quantities(quotation.get("line_items", []))
+    delivery_id = str(uuid.uuid4())
+
+    async def apply(session):
+        # Claim the quotation first: a concurrent second request stops here
+        claimed = await _db.quotations.update_one(
+            {"id": quotation_id, "delivery_status": {"$ne": "delivered"}},
+            {"$set": {"delivery_status": "delivered", "delivery_id": delivery_id,
+                      "delivered_at": _now(), "updated_at": _now()}},
+            session=session,
+        )
+        if claimed.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Bu teklif zaten teslim edilmiş")
+
+        stock_query = {"$or": [{f"reservations.{quotation_id}": {"$gt": 0}}]}
+        if needed:
+            stock_query["$or"].append({"product_id": {"$in": list(needed)}})
+        stock_items = await _db.stock_items.find(stock_query, {"_id": 0}, session=session).to_list(None)
+
+        plan = plan_delivery(quotation, stock_items)
+        if plan:
+            ops = _delivery_ops(plan, quotation_id, delivery_id, mark=session is None)
+            result = await _db.stock_items.bulk_write(ops, ordered=True, session=session)
+            if result.modified_count != len(ops):
+                if session is None:
+                    await _undo_partial_delivery(plan, quotation, delivery_id)
+                raise HTTPException(status_code=409, detail="Stok eşzamanlı olarak değişti, teslimatı tekrar deneyin")
+            if session is None:
+                await _db.stock_items.update_many(
+                    {f"delivery_marks.{delivery_id}": True},
+                    {"$unset": {f"delivery_marks.{delivery_id}": ""}},
+                )
+
+        await _db.deliveries.insert_one({
+            "id": delivery_id,
+            "quotation_id": quotation_id,
+            "idempotency_key": idempotency_key,
+            "status": "delivered",
+            "reservation_tracked": bool(quotation.get("stock_reservation_tracked")),
+            "items": plan,
+            "created_at": _now(),
+            "reverted_at": None,
+        }, session=session)
+        return plan
+
+    try:
+        plan = await run_in_transaction(apply)
+    except HTTPException as e:
+        # Same key arriving concurrently: the first request won the claim
+        if e.status_code == 400 and idempotency_key:
+            replayed = await replay()
+            if replayed:
+                return replayed
+        raise
+    return {"ok": True, "message": "Teslimat tamamlandı", "delivery_id": delivery_id,
+            "stock_decreased": _summary(plan, variants, "decreased")}
+
+
+async def _undo_partial_delivery(plan: list, quotation: dict, delivery_id: str):
+    """Without a transaction: put back exactly the rows that were changed, then un-claim."""
+    quotation_id = quotation["id"]
+    field = f"delivery_marks.{delivery_id}"
+    applied = await _db.stock_items.find({field: True}, {"_id": 0, "id": 1}).to_list(None)
+    applied_ids = {row["id"] for row in applied}
+    undo = [p for p in plan if p["stock_item_id"] in applied_ids]
+    if undo:
+        ops = _revert_ops(undo, quotation_id, restore_reservation=True, unset_field=field)
+        await _db.stock_items.bulk_write(ops, ordered=False)
+    await _db.quotations.update_one(
+        {"id": quotation_id, "delivery_id": delivery_id},
+        {"$set": {"delivery_status": quotation.get("delivery_status"), "delivery_id": None,
+                  "delivered_at": quotation.get("delivered_at")}},
+    )
+
+
+async def revert(quotation: dict, idempotency_key: Optional[str] = None) -> dict:
+    quotation_id = quotation["id"]
+    variants = _variants_by_product(quotation)
+
+    if idempotency_key:
+        previous = await _db.deliveries.find_one({"revert_idempotency_key": idempotency_key}, {"_id": 0})
+        if previous:
+            return {"ok": True, "message": "Teslimat geri alındı, stoklar yeniden eklendi",
+                    "stock_restored": _summary(previous["items"], variants, "restored"), "replayed": True}
+
+    if quotation.get("delivery_status") != "delivered":
+        raise HTTPException(status_code=400, detail="Bu teklif teslim edilmemiş")
+
+    delivery_id = quotation.get("delivery_id")
+    delivery = None
+    if delivery_id:
+        delivery = await _db.deliveries.find_one({"id": delivery_id, "status": "delivered"}, {"_id": 0})
+
+    async def apply(session):
+        claim_filter = {"id": quotation_id, "delivery_status": "delivered"}
+        if delivery_id:
+            claim_filter["delivery_id"] = delivery_id
+        claimed = await _db.quotations.update_one(
+            claim_filter,
+            {"$set": {"delivery_status": "pending", "delivered_at": None,
+                      "delivery_id": None, "updated_at": _now()}},
+            session=session,
+        )
+        if claimed.modified_count == 0:
+            raise HTTPException(status_code=400, detail="Bu teklif teslim edilmemiş")
+
+        if delivery:
+            items = delivery["items"]
+            restore_reservation = delivery.get("reservation_tracked", False)
+        elif delivery_id:
+            # Claimed but never recorded (interrupted delivery): nothing known to restore
+            items = []
+            restore_reservation = False
+        else:
+            items = await _legacy_revert_plan(quotation, session)
+            restore_reservation = False
+
+        if items:
+            await _db.stock_items.bulk_write(
+                _revert_ops(items, quotation_id, restore_reservation), ordered=True, session=session
+            )
+        if delivery:
+            await _db.deliveries.update_one(
+                {"id": delivery["id"]},
+                {"$set": {"status": "reverted", "reverted_at": _now(),
+                          "revert_idempotency_key": idempotency_key}},
+                session=session,
+            )
+        return items
+
+    items = await run_in_transaction(apply)
+    return {"ok": True, "message": "Teslimat geri alındı, stoklar yeniden eklendi",
+            "stock_restored": _summary(items, variants, "restored")}
+
+
+async def _legacy_revert_plan(quotation: dict, session=None) -> list:
+    """
+    Deliveries made before delivery records existed: put each line's quantity back
+    on the product's first stock row (quantity and reservation), as before.
+    """
+    needed = required_quantities(quotation.get("line_items", []))
+    if not needed:
+        return []
+    rows = await _db.stock_items.find(
+        {"product_id": {"$in": list(needed)}}, {"_id": 0}, session=session
+    ).to_list(None)
+    first_row = {}
+    for row in rows:
+        first_row.setdefault(row["product_id"], row)
+    return [
+        {
+            "stock_item_id": first_row[pid]["id"],
+            "quantity": qty,
+            "reserved_released": qty,
+            "reservation_marker": 0,
+            "row": {f: first_row[pid].get(f) for f in _ROW_IDENTITY_FIELDS},
+        }
+        for pid, qty in needed.items() if pid in first_row
+    ]
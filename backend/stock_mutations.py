@@ -0,0 +1,142 @@
+"""
+Atomic Stock Mutations (depo giriş / çıkış / transfer / düzeltme)
+- Stok kaydının anahtarı (rack_slot_id, product_id, variant_key) -> benzersiz indeks
+  variant_key = variant_id veya "" (varyantsız ürünlerde None / "" farkı ortadan kalkar)
+- Giriş: anahtara göre upsert + $inc (kayıt yoksa oluşturulur, varsa artırılır); okuma-hesaplama-yazma yok
+- Çıkış: koşullu $inc; filtre "quantity - reserved_quantity >= miktar" olmadan eşleşmez, eksiye düşmez
+- Transfer: kaynak düşümü, hedef artışı ve hareket kaydı tek transaction içinde;
+  transaction yoksa hedef yazılamazsa kaynak geri artırılır
+- Düzeltme / sayım: tek atomik $set; quantity rezerve miktarın altına indirilemez
+- Eşzamanlı ilk girişte oluşan DuplicateKey / TransientTransactionError hataları tekrar denenir
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+import uuid
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from stock_reservations import run_in_transaction
+
+_db = None
+
+MAX_ATTEMPTS = 3
+
+
+def set_database(db):
+    global _db
+    _db = db
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def variant_key(variant_id: Optional[str]) -> str:
+    return variant_id or ""
+
+
+def stock_key(rack_slot_id: str, product_id: str, variant_id: Optional[str]) -> dict:
+    """Filter matching the one stock record of a product variant in a slot."""
+    return {"rack_slot_id": rack_slot_id, "product_id": product_id, "variant_key": variant_key(variant_id)}
+
+
+def available_at_least(quantity: float) -> dict:
+    """Filter clause: quantity - reserved_quantity >= quantity."""
+    return {"$expr": {"$gte": [
+        {"$subtract": [{"$ifNull": ["$quantity", 0]}, {"$ifNull": ["$reserved_quantity", 0]}]},
+        quantity,
+    ]}}
+
+
+def increment_update(location: dict, variant_id: Optional[str], variant_name: Optional[str],
+                     quantity: float, full_address: str) -> dict:
+    """
+    Upsert update for stock IN at location {warehouse_id, rack_group_id, rack_level_id, rack_slot_id}.
+    Use with stock_key(...) as the filter and upsert=True.
+    """
+    now = _now()
+    return {
+        "$inc": {"quantity": quantity},
+        "$set": {"updated_at": now},
+        "$setOnInsert": {
+            "id": str(uuid.uuid4()),
+            "warehouse_id": location["warehouse_id"],
+            "rack_group_id": location["rack_group_id"],
+            "rack_level_id": location["rack_level_id"],
+            "variant_id": variant_id,
+            "variant_name": variant_name,
+            "reserved_quantity": 0,
+            "min_stock": 0,
+            "full_address": full_address,
+            "created_at": now,
+        },
+    }
+
+
+def decrement_update(quantity: float) -> dict:
+    return {"$inc": {"quantity": -quantity}, "$set": {"updated_at": _now()}}
+
+
+def _retryable(error: PyMongoError) -> bool:
+    # Two first-time INs at the same key race on the unique index; concurrent writers in
+    # transactions get write conflicts. Both succeed when simply run again.
+    return isinstance(error, DuplicateKeyError) or error.has_error_label("TransientTransactionError")
+
+
+async def run_with_retry(fn):
+    """run_in_transaction(fn), retried on duplicate-key races and transient transaction errors."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await run_in_transaction(fn)
+        except PyMongoError as e:
+            if attempt == MAX_ATTEMPTS - 1 or not _retryable(e):
+                raise
+
+
+async def increment(location: dict, product_id: str, variant_id: Optional[str], variant_name: Optional[str],
+                    quantity: float, full_address: str, session=None) -> dict:
+    """Atomic stock IN; returns the stock record after the change."""
+    return await _db.stock_items.find_one_and_update(
+        stock_key(location["rack_slot_id"], product_id, variant_id),
+        increment_update(location, variant_id, variant_name, quantity, full_address),
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+async def decrement(rack_slot_id: str, product_id: str, variant_id: Optional[str], quantity: float,
+                    session=None) -> Optional[dict]:
+    """Atomic guarded stock OUT; None when the record is missing or not enough is available."""
+    return await _db.stock_items.find_one_and_update(
+        {**stock_key(rack_slot_id, product_id, variant_id), **available_at_least(quantity)},
+        decrement_update(quantity),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+        session=session,
+    )
+
+
+async def set_quantity(query: dict, quantity: float, session=None) -> Optional[dict]:
+    """
+    Atomic absolute set (manual correction / count); returns the record *before* the change.
+    Never sets quantity below reserved_quantity: None when the record is missing or reserved more.
+    """
+    return await _db.stock_items.find_one_and_update(
+        {**query, "$expr": {"$lte": [{"$ifNull": ["$reserved_quantity", 0]}, quantity]}},
+        {"$set": {"quantity": quantity, "updated_at": _now()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.BEFORE,
+        session=session,
+    )
+
+
+async def ensure_stock_keys():
+    """Startup hook: give records written before variant_key existed their key (before the unique index)."""
+    await _db.stock_items.update_many(
+        {"variant_key": {"$exists": False}},
+        [{"$set": {"variant_key": {"$ifNull": ["$variant_id", ""]}}}],
+    )
@@ -0,0 +1,217 @@
+"""
+Stock Reservation Engine
+- Teklif onaylandığında / onay geri alındığında stok rezervasyonu tek bir plan olarak uygulanır
+- Etkilenen tüm stok kayıtları tek sorguda okunur, dağıtım bellekte hesaplanır
+- Tek bulk_write ile koşullu $inc uygulanır (eşzamanlı onaylarda eksiye düşmez)
+- Her stok kaydında teklif bazlı rezervasyon tutulur: reservations.<quotation_id>
+  Böylece onay geri alınınca tam olarak ayrılan miktar geri bırakılır
+- Replica set varsa tüm işlem bir Mongo transaction içinde yapılır
+"""
+
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+
+_db = None
+_transactions_supported: Optional[bool] = None
+
+# Re-plan rounds when concurrent writers make a guarded $inc miss
+MAX_PLAN_ATTEMPTS = 3
+EPSILON = 1e-9
+
+
+def set_database(db):
+    global _db, _transactions_supported
+    _db = db
+    _transactions_supported = None
+
+
+async def transactions_supported() -> bool:
+    """Transactions need a replica set or mongos; a standalone server rejects them."""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await _db.command("hello")
+            _transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+
+async def run_in_transaction(fn):
+    """Run fn(session) inside a transaction when available, else fn(None)."""
+    if not await transactions_supported():
+        return await fn(None)
+    async with await _db.client.start_session() as session:
+        async with session.start_transaction():
+            return await fn(session)
+
+
+def required_quantities(line_items: List[dict]) -> Dict[str, float]:
+    """Total non-optional quantity per product_id."""
+    needed = {}
+    for item in line_items or []:
+        if item.get("is_optional"):
+            continue
+        product_id = item.get("product_id")
+        quantity = float(item.get("quantity", 0) or 0)
+        if product_id and quantity > 0:
+            needed[product_id] = needed.get(product_id, 0) + quantity
+    return needed
+
+
+def _reservation_field(quotation_id: str) -> str:
+    return f"reservations.{quotation_id}"
+
+
+def plan_reservations(needed: Dict[str, float], stock_items: List[dict]) -> List[dict]:
+    """Greedy allocation of needed quantities over available (quantity - reserved) stock."""
+    remaining = dict(needed)
+    allocations = []
+    for stock in stock_items:
+        product_id = stock.get("product_id")
+        want = remaining.get(product_id, 0)
+        if want <= EPSILON:
+            continue
+        available = float(stock.get("quantity", 0) or 0) - float(stock.get("reserved_quantity", 0) or 0)
+        take = min(want, max(0, available))
+        if take > EPSILON:
+            allocations.append({"stock_item_id": stock["id"], "product_id": product_id, "quantity": take})
+            remaining[product_id] = want - take
+    return allocations
+
+
+async def _reserved_by_quotation(quotation_id: str, product_ids: List[str], session=None) -> Dict[str, float]:
+    field = _reservation_field(quotation_id)
+    docs = await _db.stock_items.find(
+        {"product_id": {"$in": product_ids}, field: {"$gt": 0}},
+        {"_id": 0, "product_id": 1, "reservations": 1},
+        session=session,
+    ).to_list(None)
+    reserved = {}
+    for doc in docs:
+        qty = float((doc.get("reservations") or {}).get(quotation_id, 0) or 0)
+        reserved[doc["product_id"]] = reserved.get(doc["product_id"], 0) + qty
+    return reserved
+
+
+async def reserve_for_quotation(quotation: dict, session=None) -> dict:
+    """
+    Reserve stock for every non-optional line item of an accepted quotation.
+    Shortages are reserved as far as stock allows (same as before), never below zero.
+    """
+    quotation_id = quotation["id"]
+    field = _reservation_field(quotation_id)
+    needed = required_quantities(quotation.get("line_items", []))
+    if not needed:
+        return {"reserved": {}, "shortage": {}}
+
+    # Already reserved for this quotation (e.g. a repeated accept) counts toward the need
+    already = await _reserved_by_quotation(quotation_id, list(needed), session=session)
+    remaining = {pid: qty - already.get(pid, 0) for pid, qty in needed.items()}
+
+    for _ in range(MAX_PLAN_ATTEMPTS):
+        remaining = {pid: qty for pid, qty in remaining.items() if qty > EPSILON}
+        if not remaining:
+            break
+
+        stock_items = await _db.stock_items.find(
+            {"product_id": {"$in": list(remaining)}},
+            {"_id": 0, "id": 1, "product_id": 1, "quantity": 1, "reserved_quantity": 1},
+            session=session,
+        ).sort("created_at", 1).to_list(None)
+
+        allocations = plan_reservations(remaining, stock_items)
+        if not allocations:
+            break
+
+        ops = [
+            UpdateOne(
+                {
+                    "id": a["stock_item_id"],
+                    "$expr": {"$gte": [
+                        {"$subtract": ["$quantity", {"$ifNull": ["$reserved_quantity", 0]}]},
+                        a["quantity"],
+                    ]},
+                },
+                {"$inc": {"reserved_quantity": a["quantity"], field: a["quantity"]}},
+            )
+            for a in allocations
+        ]
+        result = await _db.stock_items.bulk_write(ops, ordered=False, session=session)
+
+        if result.modified_count == len(ops):
+            for a in allocations:
+                remaining[a["product_id"]] -= a["quantity"]
+        else:
+            # A concurrent writer took some stock; read back what actually landed and re-plan
+            reserved_now = await _reserved_by_quotation(quotation_id, list(needed), session=session)
+            remaining = {pid: qty - reserved_now.get(pid, 0) for pid, qty in needed.items()}
+
+    shortage = {pid: qty for pid, qty in remaining.items() if qty > EPSILON}
+    reserved = {pid: qty - shortage.get(pid, 0) for pid, qty in needed.items()}
+    return {"reserved": reserved, "shortage": shortage}
+
+
+async def release_for_quotation(quotation: dict, session=None) -> dict:
+    """Release exactly what was reserved for this quotation."""
+    if not quotation.get("stock_reservation_tracked"):
+        return await _release_legacy(quotation, session=session)
+
+    quotation_id = quotation["id"]
+    field = _reservation_field(quotation_id)
+
+    reserved_docs = await _db.stock_items.find(
+        {field: {"$gt": 0}},
+        {"_id": 0, "id": 1, "product_id": 1, "reservations": 1},
+        session=session,
+    ).to_list(None)
+
+    ops = []
+    released = {}
+    for doc in reserved_docs:
+        qty = float(doc["reservations"][quotation_id])
+        ops.append(UpdateOne(
+            {"id": doc["id"], field: qty},
+            {"$inc": {"reserved_quantity": -qty}, "$unset": {field: ""}},
+        ))
+        released[doc["product_id"]] = released.get(doc["product_id"], 0) + qty
+    if ops:
+        await _db.stock_items.bulk_write(ops, ordered=False, session=session)
+    return {"released": released}
+
+
+async def _release_legacy(quotation: dict, session=None) -> dict:
+    """
+    Quotations accepted before per-quotation tracking (no stock_reservation_tracked flag)
+    have no reservations.<id> markers; release greedily like the old loop did.
+    """
+    needed = required_quantities(quotation.get("line_items", []))
+    if not needed:
+        return {"released": {}}
+
+    stock_items = await _db.stock_items.find(
+        {"product_id": {"$in": list(needed)}, "reserved_quantity": {"$gt": 0}},
+        {"_id": 0, "id": 1, "product_id": 1, "reserved_quantity": 1},
+        session=session,
+    ).sort("created_at", 1).to_list(None)
+
+    remaining = dict(needed)
+    ops = []
+    released = {}
+    for stock in stock_items:
+        product_id = stock["product_id"]
+        want = remaining.get(product_id, 0)
+        if want <= EPSILON:
+            continue
+        qty = min(want, float(stock.get("reserved_quantity", 0) or 0))
+        if qty > EPSILON:
+            ops.append(UpdateOne(
+                {"id": stock["id"], "reserved_quantity": {"$gte": qty}},
+                {"$inc": {"reserved_quantity": -qty}},
+            ))
+            remaining[product_id] = want - qty
+            released[product_id] = released.get(product_id, 0) + qty
+
+    if ops:
+        await _db.stock_items.bulk_write(ops, ordered=False, session=session)
+    return {"released": released}
@@ -0,0 +1,136 @@
+"""
+Warehouse Location Resolver (depo / raf / kat / bölme adresleri)
+- Depo, raf grubu, kat ve bölmeler katalog önbelleğinden okunur; bellekte bölme -> yol haritası kurulur
+- Bir bölmenin tam adresi ve üst kayıt id'leri tek sözlük aramasıyla çözülür (Mongo'ya gidilmez)
+- Raf CRUD uçları ilgili koleksiyonu invalidate eder; snapshot değişince harita yeniden kurulur
+- Bilinmeyen bir id (başka worker'da yeni oluşturulmuş raf / bölme) TTL beklenmeden snapshot'ları yeniden
+  yükletir ve tekrar çözülür; yeniden yükleme en fazla REFRESH_MIN_AGE saniyede bir yapılır
+- Toplu API: resolve_slots / full_addresses -> hareket yoğun uçlar adres başına sorgu yapmaz
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from catalog_cache import get_snapshot, refresh
+
+LOCATION_CATALOGS = ("warehouses", "rack_groups", "rack_levels", "rack_slots")
+# A miss reloads snapshots older than this (bounds reloads caused by ids that really don't exist)
+REFRESH_MIN_AGE = 1.0
+
+
+class Location(NamedTuple):
+    warehouse_id: Optional[str]
+    rack_group_id: Optional[str]
+    rack_level_id: Optional[str]
+    rack_slot_id: Optional[str]
+    full_address: str
+
+
+def _level_name(level: dict) -> str:
+    return level.get("name") or f"{level.get('level_number', '')}. Kat"
+
+
+def _slot_name(slot: dict) -> str:
+    return slot.get("name") or f"Bölme {slot.get('slot_number', '')}"
+
+
+class LocationIndex:
+    """Immutable lookup tables over one set of location snapshots."""
+
+    def __init__(self, warehouses: List[dict], rack_groups: List[dict], rack_levels: List[dict], rack_slots: List[dict]):
+        self.sources = (warehouses, rack_groups, rack_levels, rack_slots)
+        self.warehouses = {w["id"]: w for w in warehouses if w.get("id")}
+        self.rack_groups = {g["id"]: g for g in rack_groups if g.get("id")}
+        self.rack_levels = {lv["id"]: lv for lv in rack_levels if lv.get("id")}
+        self.rack_slots = {s["id"]: s for s in rack_slots if s.get("id")}
+        self._slots: Dict[str, Location] = {}
+        for slot_id, slot in self.rack_slots.items():
+            level = self.rack_levels.get(slot.get("rack_level_id")) or {}
+            group = self.rack_groups.get(level.get("rack_group_id")) or {}
+            self._slots[slot_id] = Location(
+                group.get("warehouse_id"), level.get("rack_group_id"), slot.get("rack_level_id"), slot_id,
+                self.full_address(group.get("warehouse_id"), level.get("rack_group_id"),
+                                  slot.get("rack_level_id"), slot_id),
+            )
+
+    def full_address(self, warehouse_id: Optional[str], rack_group_id: Optional[str],
+                     rack_level_id: Optional[str], rack_slot_id: Optional[str]) -> str:
+        """'Maltepe Depo / A Rafı / 5. Kat / Bölme 1'; unknown parts are left out."""
+        parts = []
+        warehouse = self.warehouses.get(warehouse_id)
+        if warehouse:
+            parts.append(warehouse.get("name", ""))
+        group = self.rack_groups.get(rack_group_id)
+        if group:
+            parts.append(group.get("name", ""))
+        level = self.rack_levels.get(rack_level_id)
+        if level:
+            parts.append(_level_name(level))
+        slot = self.rack_slots.get(rack_slot_id)
+        if slot:
+            parts.append(_slot_name(slot))
+        return " / ".join(parts)
+
+    def resolve_slot(self, rack_slot_id: str) -> Optional[Location]:
+        return self._slots.get(rack_slot_id)
+
+    def knows(self, warehouse_id: Optional[str] = None, rack_group_id: Optional[str] = None,
+              rack_level_id: Optional[str] = None, rack_slot_id: Optional[str] = None) -> bool:
+        """False if any given id is missing from the index (None ids are not checked)."""
+        return all(
+            key is None or key in table
+            for key, table in ((warehouse_id, self.warehouses), (rack_group_id, self.rack_groups),
+                               (rack_level_id, self.rack_levels), (rack_slot_id, self.rack_slots))
+        )
+
+
+_index: Optional[LocationIndex] = None
+
+
+async def get_index() -> LocationIndex:
+    """Index over the current snapshots; rebuilt only when one of them changes."""
+    global _index
+    snapshots = [await get_snapshot(name) for name in LOCATION_CATALOGS]
+    items = tuple(s.items for s in snapshots)
+    if _index is None or any(a is not b for a, b in zip(_index.sources, items)):
+        _index = LocationIndex(*items)
+    return _index
+
+
+async def _index_knowing(paths: List[Tuple[Optional[str], ...]]) -> LocationIndex:
+    """The index, reloaded once if it doesn't know an id in paths yet (created on another worker)."""
+    index = await get_index()
+    if all(index.knows(*path) for path in paths):
+        return index
+    if refresh(*LOCATION_CATALOGS, min_age=REFRESH_MIN_AGE):
+        index = await get_index()
+    return index
+
+
+async def full_address(warehouse_id: Optional[str], rack_group_id: Optional[str],
+                       rack_level_id: Optional[str], rack_slot_id: Optional[str]) -> str:
+    path = (warehouse_id, rack_group_id, rack_level_id, rack_slot_id)
+    return (await _index_knowing([path])).full_address(*path)
+
+
+def _slot_path(location: Optional[Location]) -> Tuple[Optional[str], ...]:
+    return (location.warehouse_id, location.rack_group_id, location.rack_level_id, location.rack_slot_id)
+
+
+async def resolve_slots(slot_ids: Iterable[str]) -> Dict[str, Optional[Location]]:
+    """slot_id -> Location (None for unknown slots), one index lookup for all."""
+    slot_ids = list(slot_ids)
+    index = await get_index()
+    resolved = {slot_id: index.resolve_slot(slot_id) for slot_id in slot_ids}
+    # Unknown slot, or a slot whose level / group / warehouse isn't known yet
+    if any(loc is None or None in _slot_path(loc) for loc in resolved.values()):
+        if refresh(*LOCATION_CATALOGS, min_age=REFRESH_MIN_AGE):
+            index = await get_index()
+            resolved = {slot_id: index.resolve_slot(slot_id) for slot_id in slot_ids}
+    return resolved
+
+
+async def full_addresses(paths: Iterable[Tuple[Optional[str], ...]]) -> Dict[Tuple[Optional[str], ...], str]:
+    """(warehouse_id, rack_group_id, rack_level_id, rack_slot_id) -> address for many paths at once."""
+    paths = [tuple(path) for path in paths]
+    index = await _index_knowing(paths)
+    return {path: index.full_address(*path) for path in paths}
@@ -115,6 +115,28 @@ class RackSlot(BaseModel):
     updated_at: datetime = Field(default_factory=_now)
 
 
+# ==================== RACK LAYOUT (BULK) ====================
+class RackLayoutGroup(BaseModel):
+    code: str
+    name: Optional[str] = None
+    description: Optional[str] = None
+    levels: Optional[int] = Field(None, ge=1, le=50)   # overrides RackLayoutCreate.levels
+    slots: Optional[int] = Field(None, ge=1, le=200)   # overrides RackLayoutCreate.slots
+
+
+class RackLayoutCreate(BaseModel):
+    warehouse_id: str
+    # Either explicit groups or group_count generated codes ({letter}: A..Z, AA..; {n}: 1, 2, ...)
+    groups: List[RackLayoutGroup] = []
+    group_count: int = Field(0, ge=0, le=500)
+    group_code_pattern: str = "{letter}"
+    group_name_pattern: str = "{code} Rafı"
+    levels: int = Field(1, ge=1, le=50)
+    slots: int = Field(1, ge=1, le=200)
+    level_name_pattern: str = "{n}. Kat"
+    slot_name_pattern: str = "Bölme {n}"
+
+
 # ==================== STOCK ITEM ====================
 class StockItemCreate(BaseModel):
     warehouse_id: str
@@ -179,6 +201,27 @@ class StockMovementCreate(BaseModel):
     note: Optional[str] = None
 
 
+class StockBatchLine(BaseModel):
+    movement_type: str  # IN, OUT, TRANSFER
+    rack_slot_id: str   # depo / raf / kat bölmeden çözülür
+    product_id: str
+    variant_id: str
+    variant_name: Optional[str] = None
+    quantity: float
+    target_rack_slot_id: Optional[str] = None  # TRANSFER
+    reference: Optional[str] = None
+    note: Optional[str] = None
+
+
+class StockBatchCreate(BaseModel):
+    lines: List[StockBatchLine] = Field(..., min_length=1)
+    # True: any failing line rejects the whole batch; False: valid lines are applied, failures reported
+    all_or_nothing: bool = False
+    # Defaults for lines without their own (e.g. the supplier delivery note number)
+    reference: Optional[str] = None
+    note: Optional[str] = None
+
+
 class StockMovement(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     movement_type: str
@@ -2,18 +2,36 @@
 Advanced Warehouse Management System API
 Supports: Multiple Warehouses, Rack Groups, Levels, Compartments, Variant-based Stock
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Body
 from typing import Optional, List, Dict, Any
+from collections import OrderedDict
 from datetime import datetime, timezone
 import uuid
 
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from catalog_cache import invalidate as invalidate_catalog
+from collection_versions import cache_headers, conditional_get, touch
+from rack_layout import LayoutError, plan_layout
+from serialization import FastJSONResponse
+from stock_batch import apply_batch as apply_stock_batch
+from stock_reservations import run_in_transaction
+from stock_mutations import (
+    MAX_ATTEMPTS, stock_key,
+    increment as increment_stock, decrement as decrement_stock, set_quantity as set_stock_quantity,
+    run_with_retry as run_stock_transaction
+)
+from warehouse_locations import (
+    full_address as location_full_address, full_addresses, get_index as get_location_index, resolve_slots
+)
 from warehouse_models import (
     WarehouseCreate, WarehouseUpdate, Warehouse,
     RackGroupCreate, RackGroupUpdate, RackGroup,
     RackLevelCreate, RackLevelUpdate, RackLevel,
     RackSlotCreate, RackSlotUpdate, RackSlot,
+    RackLayoutCreate,
     StockItemCreate, StockItem,
-    StockMovementCreate, StockMovement, StockMovementType,
+    StockMovementCreate, StockMovement, StockMovementType, StockBatchCreate,
     InventoryCountCreate, InventoryCount,
     StockReservation
 )
@@ -40,27 +58,7 @@ def _require_db():
 
 async def build_full_address(warehouse_id: str, rack_group_id: str, rack_level_id: str, rack_slot_id: str) -> str:
     """Build full address string like: Maltepe Depo / A Rafı / 5. Kat / Bölme 1"""
-    parts = []
-    
-    warehouse = await _db.warehouses.find_one({"id": warehouse_id}, {"_id": 0})
-    if warehouse:
-        parts.append(warehouse.get("name", ""))
-    
-    rack_group = await _db.rack_groups.find_one({"id": rack_group_id}, {"_id": 0})
-    if rack_group:
-        parts.append(rack_group.get("name", ""))
-    
-    rack_level = await _db.rack_levels.find_one({"id": rack_level_id}, {"_id": 0})
-    if rack_level:
-        level_name = rack_level.get("name") or f"{rack_level.get('level_number', '')}. Kat"
-        parts.append(level_name)
-    
-    rack_slot = await _db.rack_slots.find_one({"id": rack_slot_id}, {"_id": 0})
-    if rack_slot:
-        slot_name = rack_slot.get("name") or f"Bölme {rack_slot.get('slot_number', '')}"
-        parts.append(slot_name)
-    
-    return " / ".join(parts)
+    return await location_full_address(warehouse_id, rack_group_id, rack_level_id, rack_slot_id)
 
 
 # ==================== WAREHOUSES ====================
@@ -101,6 +99,7 @@ async def create_warehouse(body: WarehouseCreate):
         "updated_at": _now().isoformat(),
     }
     await _db.warehouses.insert_one(doc)
+    await invalidate_catalog("warehouses")
     doc.pop("_id", None)
     return doc
 
@@ -116,6 +115,7 @@ async def update_warehouse(warehouse_id: str, body: WarehouseUpdate):
     updates["updated_at"] = _now().isoformat()
     
     await _db.warehouses.update_one({"id": warehouse_id}, {"$set": updates})
+    await invalidate_catalog("warehouses")
     return await _db.warehouses.find_one({"id": warehouse_id}, {"_id": 0})
 
 
@@ -132,6 +132,7 @@ async def delete_warehouse(warehouse_id: str, hard: bool = False):
     
     if result.modified_count == 0 and result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Warehouse not found")
+    await invalidate_catalog("warehouses")
     return {"ok": True}
 
 
@@ -183,7 +184,11 @@ async def create_rack_group(body: RackGroupCreate):
         "created_at": _now().isoformat(),
         "updated_at": _now().isoformat(),
     }
-    await _db.rack_groups.insert_one(doc)
+    try:
+        await _db.rack_groups.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Rack group code already exists in this warehouse")
+    await invalidate_catalog("rack_groups")
     doc.pop("_id", None)
     return doc
 
@@ -199,6 +204,7 @@ async def update_rack_group(rack_group_id: str, body: RackGroupUpdate):
     updates["updated_at"] = _now().isoformat()
     
     await _db.rack_groups.update_one({"id": rack_group_id}, {"$set": updates})
+    await invalidate_catalog("rack_groups")
     return await _db.rack_groups.find_one({"id": rack_group_id}, {"_id": 0})
 
 
@@ -211,6 +217,7 @@ async def delete_rack_group(rack_group_id: str):
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Rack group not found")
+    await invalidate_catalog("rack_groups")
     return {"ok": True}
 
 
@@ -244,6 +251,7 @@ async def create_rack_level(body: RackLevelCreate):
         "updated_at": _now().isoformat(),
     }
     await _db.rack_levels.insert_one(doc)
+    await invalidate_catalog("rack_levels")
     doc.pop("_id", None)
     return doc
 
@@ -257,6 +265,7 @@ async def delete_rack_level(rack_level_id: str):
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Rack level not found")
+    await invalidate_catalog("rack_levels")
     return {"ok": True}
 
 
@@ -290,6 +299,7 @@ async def create_rack_slot(body: RackSlotCreate):
         "updated_at": _now().isoformat(),
     }
     await _db.rack_slots.insert_one(doc)
+    await invalidate_catalog("rack_slots")
     doc.pop("_id", None)
     return doc
 
@@ -303,13 +313,201 @@ async def delete_rack_slot(rack_slot_id: str):
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Rack slot not found")
+    await invalidate_catalog("rack_slots")
     return {"ok": True}
 
 
+# ==================== RACK LAYOUT (BULK) ====================
+
+async def _remove_layout(plan: dict):
+    """Undo a partially written layout (no transaction support)."""
+    for collection in ("rack_slots", "rack_levels", "rack_groups"):
+        ids = [doc["id"] for doc in plan[collection]]
+        if ids:
+            await _db[collection].delete_many({"id": {"$in": ids}})
+
+
+
+def _duplicate_rack_code(error: BulkWriteError) -> Optional[str]:
+    """The rack code behind a live-code unique index violation ("" if the server doesn't say which)."""
+    for write_error in error.details.get("writeErrors", []):
+        if write_error.get("code") != 11000:
+            continue
+        key = write_error.get("keyValue") or {}
+        if "code" in key:
+            return key["code"]
+        if "warehouse_id_1_code_1_live" in write_error.get("errmsg", ""):
+            return ""
+    return None
+
+
+async def ensure_rack_group_flags():
+    """Startup hook: the unique live-code index only covers is_deleted: False, so old groups need the flag."""
+    await _db.rack_groups.update_many({"is_deleted": {"$nin": [True, False]}}, {"$set": {"is_deleted": False}})
+
+@router.post("/rack-layout")
+async def create_rack_layout(body: RackLayoutCreate):
+    """Create rack groups with all their levels and slots from one spec (three insert_many calls)."""
+    _require_db()
+    warehouse = await _db.warehouses.find_one({"id": body.warehouse_id, "is_deleted": {"$ne": True}})
+    if not warehouse:
+        raise HTTPException(status_code=404, detail="Warehouse not found")
+
+    existing_codes = await _db.rack_groups.distinct(
+        "code", {"warehouse_id": body.warehouse_id, "is_deleted": {"$ne": True}}
+    )
+    try:
+        plan = plan_layout(body, existing_codes)
+    except LayoutError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def apply(session):
+        try:
+            for collection in ("rack_groups", "rack_levels", "rack_slots"):
+                await _db[collection].insert_many(plan[collection], ordered=True, session=session)
+        except Exception:
+            if session is None:
+                await _remove_layout(plan)
+            raise
+
+    try:
+        await run_in_transaction(apply)
+    except BulkWriteError as e:
+        # A concurrent create took a code after our check (unique live-code index)
+        code = _duplicate_rack_code(e)
+        if code is None:
+            raise
+        raise HTTPException(status_code=409, detail=f"Bu depoda zaten var olan raf kodu: {code or '?'}")
+    finally:
+        # Also after a rollback: a concurrent reader may have cached the partial layout
+        await invalidate_catalog("rack_groups", "rack_levels", "rack_slots")
+
+    return {
+        "ok": True,
+        "warehouse_id": body.warehouse_id,
+        "groups": len(plan["rack_groups"]),
+        "levels": len(plan["rack_levels"]),
+        "slots": len(plan["rack_slots"]),
+        "rack_groups": [{"id": g["id"], "code": g["code"], "name": g["name"]} for g in plan["rack_groups"]],
+    }
+
+
+# ==================== LOCATIONS ====================
+
+@router.post("/locations/resolve")
+async def resolve_locations(payload: dict = Body(...)):
+    """{"slot_ids": [...]} -> {slot_id: {warehouse_id, rack_group_id, rack_level_id, rack_slot_id, full_address} | null}"""
+    slot_ids = payload.get("slot_ids") or []
+    if not isinstance(slot_ids, list):
+        raise HTTPException(status_code=400, detail="slot_ids must be a list")
+    resolved = await resolve_slots(slot_ids)
+    return {slot_id: (loc._asdict() if loc else None) for slot_id, loc in resolved.items()}
+
+
+# ==================== LOCATION TREE ====================
+
+LAYOUT_COLLECTIONS = ("warehouses", "rack_groups", "rack_levels", "rack_slots")
+
+# Built trees by ETag: an unchanged layout is served without touching the collections
+_tree_cache: "OrderedDict[str, list]" = OrderedDict()
+TREE_CACHE_SIZE = 8
+
+
+async def _slot_occupancy(slot_ids: List[str]) -> Dict[str, dict]:
+    pipeline = [
+        {"$match": {"rack_slot_id": {"$in": slot_ids}}},
+        {"$group": {
+            "_id": "$rack_slot_id",
+            "items": {"$sum": {"$cond": [{"$gt": ["$quantity", 0]}, 1, 0]}},
+            "quantity": {"$sum": "$quantity"},
+            "reserved": {"$sum": "$reserved_quantity"},
+        }},
+    ]
+    rows = await _db.stock_items.aggregate(pipeline).to_list(None)
+    return {r["_id"]: {"items": r["items"], "quantity": r["quantity"], "reserved": r["reserved"] or 0} for r in rows}
+
+
+def _add_stock(total: dict, stock: dict):
+    for key in ("items", "quantity", "reserved"):
+        total[key] += stock[key]
+
+
+async def build_location_tree(warehouse_id: Optional[str] = None, include_stock: bool = False) -> list:
+    """Warehouses -> rack_groups -> levels -> slots, one query per level."""
+    live = {"is_deleted": {"$ne": True}}
+    warehouse_query = {**live, "id": warehouse_id} if warehouse_id else live
+    warehouses = await _db.warehouses.find(warehouse_query, {"_id": 0}).sort("name", 1).to_list(None)
+
+    groups = await _db.rack_groups.find(
+        {**live, "warehouse_id": {"$in": [w["id"] for w in warehouses]}}, {"_id": 0}
+    ).sort("code", 1).to_list(None)
+    levels = await _db.rack_levels.find(
+        {**live, "rack_group_id": {"$in": [g["id"] for g in groups]}}, {"_id": 0}
+    ).sort("level_number", 1).to_list(None)
+    slots = await _db.rack_slots.find(
+        {**live, "rack_level_id": {"$in": [lv["id"] for lv in levels]}}, {"_id": 0}
+    ).sort("slot_number", 1).to_list(None)
+
+    occupancy = await _slot_occupancy([s["id"] for s in slots]) if include_stock else {}
+    empty = {"items": 0, "quantity": 0, "reserved": 0}
+
+    slots_by_level: Dict[str, list] = {}
+    for slot in slots:
+        if include_stock:
+            slot["stock"] = occupancy.get(slot["id"], dict(empty))
+        slots_by_level.setdefault(slot["rack_level_id"], []).append(slot)
+
+    levels_by_group: Dict[str, list] = {}
+    for level in levels:
+        level["slots"] = slots_by_level.get(level["id"], [])
+        levels_by_group.setdefault(level["rack_group_id"], []).append(level)
+
+    groups_by_warehouse: Dict[str, list] = {}
+    for group in groups:
+        group["levels"] = levels_by_group.get(group["id"], [])
+        groups_by_warehouse.setdefault(group["warehouse_id"], []).append(group)
+
+    for warehouse in warehouses:
+        warehouse["rack_groups"] = groups_by_warehouse.get(warehouse["id"], [])
+
+    if include_stock:
+        # Roll slot totals up to every parent node
+        for warehouse in warehouses:
+            warehouse["stock"] = dict(empty)
+            for group in warehouse["rack_groups"]:
+                group["stock"] = dict(empty)
+                for level in group["levels"]:
+                    level["stock"] = dict(empty)
+                    for slot in level["slots"]:
+                        _add_stock(level["stock"], slot["stock"])
+                    _add_stock(group["stock"], level["stock"])
+                _add_stock(warehouse["stock"], group["stock"])
+    return warehouses
+
+
+@router.get("/tree")
+async def get_location_tree(request: Request, warehouse_id: Optional[str] = None, include_stock: bool = False):
+    """Whole warehouse / rack hierarchy in one response; 304 while the layout (and stock) is unchanged."""
+    _require_db()
+    names = LAYOUT_COLLECTIONS + (("stock_items",) if include_stock else ())
+    etag, not_modified = await conditional_get(request, *names)
+    if not_modified:
+        return not_modified
+
+    tree = _tree_cache.get(etag)
+    if tree is None:
+        tree = await build_location_tree(warehouse_id, include_stock)
+        _tree_cache[etag] = tree
+        while len(_tree_cache) > TREE_CACHE_SIZE:
+            _tree_cache.popitem(last=False)
+    return FastJSONResponse(tree, headers=cache_headers(etag))
+
+
 # ==================== STOCK ITEMS ====================
 
 @router.get("/stock")
 async def list_stock(
+    request: Request,
     warehouse_id: Optional[str] = None,
     rack_group_id: Optional[str] = None,
     product_id: Optional[str] = None,
@@ -317,6 +515,10 @@ async def list_stock(
     low_stock_only: bool = False
 ):
     _require_db()
+    etag, not_modified = await conditional_get(request, "stock_items")
+    if not_modified:
+        return not_modified
+    
     query = {}
     if warehouse_id:
         query["warehouse_id"] = warehouse_id
@@ -333,7 +535,7 @@ async def list_stock(
     if low_stock_only:
         items = [i for i in items if i.get("quantity", 0) <= i.get("min_stock", 0)]
     
-    return items
+    return FastJSONResponse(items, headers=cache_headers(etag))
 
 
 @router.get("/stock/summary")
@@ -397,54 +599,70 @@ async def get_low_stock():
 
 # ==================== STOCK MOVEMENTS ====================
 
+def _require_positive(quantity: float):
+    if not quantity or quantity <= 0:
+        raise HTTPException(status_code=400, detail="Miktar sıfırdan büyük olmalı")
+
+
+async def _insufficient_stock(rack_slot_id: str, product_id: str, variant_id: Optional[str], quantity: float,
+                              not_found: str = "Stock not found at this location"):
+    """The guarded decrement matched nothing: tell missing stock apart from a shortage."""
+    stock_item = await _db.stock_items.find_one(stock_key(rack_slot_id, product_id, variant_id), {"_id": 0})
+    if not stock_item:
+        return HTTPException(status_code=404, detail=not_found)
+    current_qty = stock_item.get("quantity", 0)
+    reserved_qty = stock_item.get("reserved_quantity", 0) or 0
+    return HTTPException(
+        status_code=400,
+        detail=f"Yetersiz stok. Mevcut: {current_qty}, Rezerve: {reserved_qty}, Kullanılabilir: {current_qty - reserved_qty}, İstenen: {quantity}"
+    )
+
+
+async def _set_quantity_failed(query: dict, quantity: float) -> HTTPException:
+    """set_quantity matched nothing: missing record (404) or quantity below the reservation (409)."""
+    stock_item = await _db.stock_items.find_one(query, {"_id": 0, "reserved_quantity": 1})
+    if not stock_item:
+        return HTTPException(status_code=404, detail="Stok kaydı bulunamadı")
+    reserved_qty = stock_item.get("reserved_quantity", 0) or 0
+    return HTTPException(
+        status_code=409,
+        detail=f"Miktar rezerve edilen miktarın altına düşürülemez. Rezerve: {reserved_qty}, İstenen: {quantity}"
+    )
+
+
+def _location(body: StockMovementCreate, target: bool = False) -> dict:
+    prefix = "target_" if target else ""
+    return {
+        "warehouse_id": getattr(body, f"{prefix}warehouse_id"),
+        "rack_group_id": getattr(body, f"{prefix}rack_group_id"),
+        "rack_level_id": getattr(body, f"{prefix}rack_level_id"),
+        "rack_slot_id": getattr(body, f"{prefix}rack_slot_id"),
+    }
+
+
 @router.post("/stock/in")
 async def stock_in(body: StockMovementCreate):
     """Add stock to a location"""
     _require_db()
+    _require_positive(body.quantity)
     
     full_address = await build_full_address(
         body.warehouse_id, body.rack_group_id, body.rack_level_id, body.rack_slot_id
     )
     
-    # Find or create stock item - use product_id if no variant
-    stock_query = {
-        "warehouse_id": body.warehouse_id,
-        "rack_group_id": body.rack_group_id,
-        "rack_level_id": body.rack_level_id,
-        "rack_slot_id": body.rack_slot_id,
-        "product_id": body.product_id,
-    }
-    if body.variant_id:
-        stock_query["variant_id"] = body.variant_id
-    else:
-        stock_query["$or"] = [{"variant_id": None}, {"variant_id": ""}]
-    
-    stock_item = await _db.stock_items.find_one(stock_query)
-    
-    if stock_item:
-        new_qty = stock_item.get("quantity", 0) + body.quantity
-        await _db.stock_items.update_one(
-            {"id": stock_item["id"]},
-            {"$set": {"quantity": new_qty, "updated_at": _now().isoformat()}}
-        )
-    else:
-        stock_doc = {
-            "id": str(uuid.uuid4()),
-            "warehouse_id": body.warehouse_id,
-            "rack_group_id": body.rack_group_id,
-            "rack_level_id": body.rack_level_id,
-            "rack_slot_id": body.rack_slot_id,
-            "product_id": body.product_id,
-            "variant_id": body.variant_id,
-            "variant_name": body.variant_name,
-            "quantity": body.quantity,
-            "reserved_quantity": 0,
-            "min_stock": 0,
-            "full_address": full_address,
-            "created_at": _now().isoformat(),
-            "updated_at": _now().isoformat(),
-        }
-        await _db.stock_items.insert_one(stock_doc)
+    # Upsert on (slot, product, variant): created on the first IN, $inc afterwards
+    stock_item = None
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            stock_item = await increment_stock(
+                _location(body), body.product_id, body.variant_id, body.variant_name, body.quantity, full_address
+            )
+            break
+        except DuplicateKeyError:
+            # A concurrent first IN created the record; the retry increments it
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+    await touch("stock_items")
     
     # Log movement
     movement_doc = {
@@ -465,42 +683,22 @@ async def stock_in(body: StockMovementCreate):
     }
     await _db.stock_movements.insert_one(movement_doc)
     
-    return {"ok": True, "address": full_address, "quantity": body.quantity}
+    return {"ok": True, "address": full_address, "quantity": body.quantity,
+            "new_quantity": stock_item.get("quantity", 0)}
 
 
 @router.post("/stock/out")
 async def stock_out(body: StockMovementCreate):
     """Remove stock from a location"""
     _require_db()
+    _require_positive(body.quantity)
     
-    stock_item = await _db.stock_items.find_one({
-        "warehouse_id": body.warehouse_id,
-        "rack_group_id": body.rack_group_id,
-        "rack_level_id": body.rack_level_id,
-        "rack_slot_id": body.rack_slot_id,
-        "variant_id": body.variant_id
-    })
-    
+    # Only matches when quantity - reserved >= requested, so concurrent OUTs can't oversell
+    stock_item = await decrement_stock(body.rack_slot_id, body.product_id, body.variant_id, body.quantity)
     if not stock_item:
-        raise HTTPException(status_code=404, detail="Stock not found at this location")
-    
-    current_qty = stock_item.get("quantity", 0)
-    reserved_qty = stock_item.get("reserved_quantity", 0)
-    available_qty = current_qty - reserved_qty
-    
-    # Check if enough stock available
-    if body.quantity > available_qty:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Yetersiz stok. Mevcut: {current_qty}, Rezerve: {reserved_qty}, Kullanılabilir: {available_qty}, İstenen: {body.quantity}"
-        )
-    
-    new_qty = current_qty - body.quantity
-    
-    await _db.stock_items.update_one(
-        {"id": stock_item["id"]},
-        {"$set": {"quantity": new_qty, "updated_at": _now().isoformat()}}
-    )
+        raise await _insufficient_stock(body.rack_slot_id, body.product_id, body.variant_id, body.quantity)
+    new_qty = stock_item.get("quantity", 0)
+    await touch("stock_items")
     
     full_address = await build_full_address(
         body.warehouse_id, body.rack_group_id, body.rack_level_id, body.rack_slot_id
@@ -534,69 +732,16 @@ async def stock_transfer(body: StockMovementCreate):
     
     if not body.target_warehouse_id or not body.target_rack_slot_id:
         raise HTTPException(status_code=400, detail="Target location required for transfer")
+    _require_positive(body.quantity)
+    if body.target_rack_slot_id == body.rack_slot_id:
+        raise HTTPException(status_code=400, detail="Kaynak ve hedef bölme aynı")
     
-    # Check source stock
-    source_item = await _db.stock_items.find_one({
-        "warehouse_id": body.warehouse_id,
-        "rack_group_id": body.rack_group_id,
-        "rack_level_id": body.rack_level_id,
-        "rack_slot_id": body.rack_slot_id,
-        "variant_id": body.variant_id
-    })
-    
-    if not source_item:
-        raise HTTPException(status_code=404, detail="Source stock not found")
-    
-    if source_item.get("quantity", 0) < body.quantity:
-        raise HTTPException(status_code=400, detail="Insufficient stock for transfer")
-    
-    # Decrease source
-    await _db.stock_items.update_one(
-        {"id": source_item["id"]},
-        {"$inc": {"quantity": -body.quantity}, "$set": {"updated_at": _now().isoformat()}}
-    )
-    
-    # Increase target
-    target_address = await build_full_address(
-        body.target_warehouse_id, body.target_rack_group_id, 
-        body.target_rack_level_id, body.target_rack_slot_id
-    )
-    
-    target_item = await _db.stock_items.find_one({
-        "warehouse_id": body.target_warehouse_id,
-        "rack_group_id": body.target_rack_group_id,
-        "rack_level_id": body.target_rack_level_id,
-        "rack_slot_id": body.target_rack_slot_id,
-        "variant_id": body.variant_id
-    })
-    
-    if target_item:
-        await _db.stock_items.update_one(
-            {"id": target_item["id"]},
-            {"$inc": {"quantity": body.quantity}, "$set": {"updated_at": _now().isoformat()}}
-        )
-    else:
-        stock_doc = {
-            "id": str(uuid.uuid4()),
-            "warehouse_id": body.target_warehouse_id,
-            "rack_group_id": body.target_rack_group_id,
-            "rack_level_id": body.target_rack_level_id,
-            "rack_slot_id": body.target_rack_slot_id,
-            "product_id": body.product_id,
-            "variant_id": body.variant_id,
-            "variant_name": body.variant_name,
-            "quantity": body.quantity,
-            "reserved_quantity": 0,
-            "min_stock": 0,
-            "full_address": target_address,
-            "created_at": _now().isoformat(),
-            "updated_at": _now().isoformat(),
-        }
-        await _db.stock_items.insert_one(stock_doc)
-    
-    source_address = await build_full_address(
-        body.warehouse_id, body.rack_group_id, body.rack_level_id, body.rack_slot_id
-    )
+    source_path = (body.warehouse_id, body.rack_group_id, body.rack_level_id, body.rack_slot_id)
+    target_path = (body.target_warehouse_id, body.target_rack_group_id,
+                   body.target_rack_level_id, body.target_rack_slot_id)
+    addresses = await full_addresses([source_path, target_path])
+    source_address = addresses[source_path]
+    target_address = addresses[target_path]
     
     movement_doc = {
         "id": str(uuid.uuid4()),
@@ -619,11 +764,47 @@ async def stock_transfer(body: StockMovementCreate):
         "note": body.note,
         "created_at": _now().isoformat(),
     }
-    await _db.stock_movements.insert_one(movement_doc)
+    
+    async def apply(session):
+        # Decrease source (guarded), increase target (upsert), log: one transaction
+        source_item = await decrement_stock(
+            body.rack_slot_id, body.product_id, body.variant_id, body.quantity, session=session
+        )
+        if not source_item:
+            raise await _insufficient_stock(
+                body.rack_slot_id, body.product_id, body.variant_id, body.quantity, "Source stock not found"
+            )
+        try:
+            await increment_stock(
+                _location(body, target=True), body.product_id, body.variant_id, body.variant_name,
+                body.quantity, target_address, session=session,
+            )
+            await _db.stock_movements.insert_one(dict(movement_doc), session=session)
+        except Exception:
+            if session is None:
+                # No transaction: put the source quantity back
+                await _db.stock_items.update_one(
+                    stock_key(body.rack_slot_id, body.product_id, body.variant_id),
+                    {"$inc": {"quantity": body.quantity}},
+                )
+            raise
+    
+    await run_stock_transaction(apply)
+    await touch("stock_items")
     
     return {"ok": True, "from": source_address, "to": target_address, "quantity": body.quantity}
 
 
+@router.post("/stock/batch")
+async def stock_batch(body: StockBatchCreate):
+    """Apply many IN / OUT / TRANSFER lines at once (goods receipt, dispatch); per-line results"""
+    _require_db()
+    result = await apply_stock_batch(body)
+    if result["applied"]:
+        await touch("stock_items")
+    return result
+
+
 @router.get("/movements")
 async def list_movements(
     warehouse_id: Optional[str] = None,
@@ -648,18 +829,15 @@ async def update_stock_item(stock_id: str, quantity: float, note: str = ""):
     """Update stock item quantity"""
     _require_db()
     
-    stock_item = await _db.stock_items.find_one({"id": stock_id})
+    # One atomic $set; the returned pre-image gives the exact difference for the log
+    stock_item = await set_stock_quantity({"id": stock_id}, quantity)
     if not stock_item:
-        raise HTTPException(status_code=404, detail="Stok kaydı bulunamadı")
+        raise await _set_quantity_failed({"id": stock_id}, quantity)
+    await touch("stock_items")
     
     old_quantity = stock_item.get("quantity", 0)
     difference = quantity - old_quantity
     
-    await _db.stock_items.update_one(
-        {"id": stock_id},
-        {"$set": {"quantity": quantity, "updated_at": _now().isoformat()}}
-    )
-    
     # Log the adjustment
     movement_doc = {
         "id": str(uuid.uuid4()),
@@ -713,6 +891,7 @@ async def delete_stock_item(stock_id: str):
     await _db.stock_movements.insert_one(movement_doc)
     
     await _db.stock_items.delete_one({"id": stock_id})
+    await touch("stock_items")
     
     return {"ok": True, "message": "Stok kaydı silindi"}
 
@@ -762,26 +941,28 @@ async def approve_inventory_count(count_id: str):
     if count.get("is_approved"):
         raise HTTPException(status_code=400, detail="Already approved")
     
-    # Update stock with counted quantity
-    stock_item = await _db.stock_items.find_one({
-        "warehouse_id": count["warehouse_id"],
-        "rack_group_id": count.get("rack_group_id"),
-        "rack_level_id": count.get("rack_level_id"),
-        "rack_slot_id": count.get("rack_slot_id"),
-        "variant_id": count["variant_id"]
-    })
-    
-    if stock_item:
-        await _db.stock_items.update_one(
-            {"id": stock_item["id"]},
-            {"$set": {"quantity": count["counted_quantity"], "updated_at": _now().isoformat()}}
-        )
-    
-    # Mark as approved
-    await _db.inventory_counts.update_one(
-        {"id": count_id},
+    # Claim the approval first so a double click can't apply the count twice
+    claimed = await _db.inventory_counts.update_one(
+        {"id": count_id, "is_approved": {"$ne": True}},
         {"$set": {"is_approved": True, "approved_at": _now().isoformat()}}
     )
+    if claimed.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Already approved")
+    
+    # Update stock with counted quantity
+    if count.get("rack_slot_id"):
+        query = stock_key(count["rack_slot_id"], count["product_id"], count.get("variant_id"))
+        stock_item = await set_stock_quantity(query, count["counted_quantity"])
+        if stock_item:
+            await touch("stock_items")
+        else:
+            error = await _set_quantity_failed(query, count["counted_quantity"])
+            if error.status_code == 409:
+                # Not applied: release the approval so it can be retried once reservations change
+                await _db.inventory_counts.update_one(
+                    {"id": count_id}, {"$set": {"is_approved": False, "approved_at": None}}
+                )
+                raise error
     
     # Log movement
     movement_doc = {
@@ -836,8 +1017,9 @@ async def report_by_warehouse():
     items = await cursor.to_list(length=100)
     
     # Add warehouse names
+    locations = await get_location_index()
     for item in items:
-        wh = await _db.warehouses.find_one({"id": item["warehouse_id"]}, {"_id": 0})
+        wh = locations.warehouses.get(item["warehouse_id"])
         item["warehouse_name"] = wh.get("name", "") if wh else ""
     
     return items
@@ -395,6 +395,52 @@ class RevisionTester:
             print_error(f"Error creating revision from revision: {str(e)}")
             return False
     
+    def test_delete_latest_revision(self):
+        """Deleting the latest revision must keep all earlier revisions of the group"""
+        print_header("Additional Test: Deleting Latest Revision Keeps History")
+        
+        try:
+            response = self.session.get(f"{API_BASE}/quotations/{self.quotation_id}/revisions")
+            if response.status_code != 200:
+                print_error(f"Failed to get revision history: {response.status_code}")
+                return False
+            before = response.json()
+            latest = max(before, key=lambda r: r['revision_no'])
+            print_info(f"Deleting {latest['quote_no']} (Rev No: {latest['revision_no']})")
+            
+            response = self.session.delete(f"{API_BASE}/quotations/{latest['id']}")
+            if response.status_code != 200:
+                print_error(f"Failed to delete latest revision: {response.status_code}")
+                return False
+            
+            response = self.session.get(f"{API_BASE}/quotations/{self.quotation_id}/revisions")
+            if response.status_code != 200:
+                print_error(f"Failed to get revision history after delete: {response.status_code}")
+                return False
+            after = response.json()
+            
+            expected_nos = sorted(r['revision_no'] for r in before if r['id'] != latest['id'])
+            actual_nos = sorted(r['revision_no'] for r in after)
+            if actual_nos != expected_nos:
+                print_error(f"Expected revisions {expected_nos} after delete, found {actual_nos}")
+                return False
+            print_success(f"Earlier revisions survived the delete: {actual_nos}")
+            
+            # The newest remaining revision must be a live, readable quotation again
+            newest = max(after, key=lambda r: r['revision_no'])
+            response = self.session.get(f"{API_BASE}/quotations/{newest['id']}")
+            if response.status_code != 200:
+                print_error(f"Newest remaining revision is not readable: {response.status_code}")
+                return False
+            if not newest.get('is_current', True):
+                print_error("Newest remaining revision was not promoted to the live quotation")
+                return False
+            print_success(f"{newest['quote_no']} is the live revision again")
+            return True
+        except Exception as e:
+            print_error(f"Error deleting latest revision: {str(e)}")
+            return False
+    
     def cleanup_test_data(self):
         """Clean up test data"""
         print_header("Cleaning Up Test Data")
@@ -443,6 +489,9 @@ class RevisionTester:
         # Test 8: Test Revision from Revision
         test_results.append(("Revision from Revision", self.test_revision_from_revision()))
         
+        # Test 9: Delete Latest Revision Keeps History
+        test_results.append(("Delete Latest Revision", self.test_delete_latest_revision()))
+        
         # Cleanup
         self.cleanup_test_data()
         
@@ -403,6 +403,8 @@ const EditQuotation = () => {
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [revisions, setRevisions] = useState([]);
+  // REVISION_STORAGE=delta: superseded revisions are kept in the revision store and are read-only
+  const isStoredRevision = revisions.some(rev => rev.id === id && rev.is_current === false);
   const [statusDialogOpen, setStatusDialogOpen] = useState(false);
   
   const [formData, setFormData] = useState(null);
@@ -680,6 +682,11 @@ const EditQuotation = () => {
       }
     }
     
+    if (isStoredRevision) {
+      toast.error("Eski revizyon düzenlenemez, güncel revizyonu kullanın");
+      return;
+    }
+    
     setSaving(true);
     try {
       await axios.put(`${API}/quotations/${id}`, formData);
@@ -702,7 +709,7 @@ const EditQuotation = () => {
       navigate(`/quotations/${type}/edit/${response.data.id}`);
     } catch (error) {
       console.error("Error creating revision:", error);
-      toast.error("Failed to create revision");
+      toast.error(error.response?.data?.detail || "Failed to create revision");
     }
   };
 
@@ -744,7 +751,10 @@ const EditQuotation = () => {
               </Button>
               <div>
                 <h1 className="text-2xl font-heading font-bold">Edit Quotation</h1>
-                <p className="text-xs text-muted-foreground">{formData.quote_no}</p>
+                <p className="text-xs text-muted-foreground">
+                  {formData.quote_no}
+                  {isStoredRevision && " · Eski revizyon (salt okunur)"}
+                </p>
               </div>
             </div>
             
@@ -770,7 +780,7 @@ const EditQuotation = () => {
               <Button type="button" variant="outline" onClick={() => navigate(`/quotations/${type}`)}>
                 Cancel
               </Button>
-              <Button type="submit" disabled={saving} onClick={handleSubmit}>
+              <Button type="submit" disabled={saving || isStoredRevision} onClick={handleSubmit}>
                 <Save className="h-4 w-4 mr-2" />
                 {saving ? "Saving..." : "Save"}
               </Button>
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Cold-start import benchmark (eager vs lazy heavy dependencies)
+
+  eager: pandas, ReportLab and Playwright imported before server (what module-level imports used to do)
+  lazy : import server only; the heavy libraries load on first use
+
+Every run is a fresh interpreter, so nothing is cached in sys.modules. Peak RSS is the
+child's ru_maxrss (KB on Linux).
+
+  python tests/benchmark_import_time.py [--repeat 5]
+"""
+
+from pathlib import Path
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+
+sys.path.insert(0, str(BACKEND))
+
+from lazy_imports import HEAVY_MODULES  # noqa: E402
+
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import server
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(preload) -> dict:
+    code = CHILD.format(preload=tuple(preload), heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(preload, repeat: int) -> dict:
+    runs = [run_once(preload) for _ in range(repeat)]
+    return {
+        "ms": statistics.median(r["seconds"] for r in runs) * 1000,
+        "rss_mb": statistics.median(r["rss_kb"] for r in runs) / 1024,
+        "heavy_loaded": runs[-1]["heavy_loaded"],
+    }
+
+
+def main(repeat: int):
+    available = []
+    for name in HEAVY_MODULES:
+        try:
+            __import__(name)
+            available.append(name)
+        except ImportError:
+            print(f"  (kurulu değil, atlandı: {name})")
+
+    eager = measure(available, repeat)
+    lazy = measure((), repeat)
+
+    print(f"import server, {repeat} tekrar (medyan, her biri yeni süreç)")
+    print(f"  eager : {eager['ms']:8.1f} ms  {eager['rss_mb']:6.1f} MB  yüklü: {', '.join(eager['heavy_loaded']) or '-'}")
+    print(f"  lazy  : {lazy['ms']:8.1f} ms  {lazy['rss_mb']:6.1f} MB  yüklü: {', '.join(lazy['heavy_loaded']) or '-'}")
+    print(f"  hızlanma : {eager['ms'] / lazy['ms']:6.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Product list serialization benchmark (old vs fast JSON path)
+
+  old: ISO strings -> _dt_from_iso loop -> response_model List[Product] validation -> JSONResponse
+  new: stored datetimes -> FastJSONResponse (orjson), no re-validation
+
+Only the per-request CPU work is measured; the Mongo fetch is the same for both paths.
+
+  python tests/benchmark_product_list.py [--count 10000] [--repeat 20]
+"""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+from models import Product  # noqa: E402
+from serialization import FastJSONResponse  # noqa: E402
+
+
+def _dt_from_iso(value):
+    # Same helper as server.py
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except Exception:
+            return value
+    return value
+
+
+def make_products(count: int, iso_dates: bool) -> List[dict]:
+    base = datetime(2024, 1, 1)
+    products = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        if iso_dates:
+            created = created.replace(tzinfo=timezone.utc).isoformat()
+        products.append({
+            "id": str(uuid.uuid4()),
+            "product_type": "sales",
+            "brand": f"Marka {i % 40}",
+            "models": [
+                {"id": str(uuid.uuid4()), "model_name": f"M-{i}-{j}", "sku": f"SKU{i:05d}{j}", "price": 10.0 + j}
+                for j in range(2)
+            ],
+            "category": f"Kategori {i % 12}",
+            "item_short_name": f"Ürün {i}",
+            "item_description": "Açıklama " * 8,
+            "default_unit": "Adet",
+            "default_currency": "EUR",
+            "default_unit_price": 100.0 + i,
+            "cost_price": 80.0 + i,
+            "group_id": None,
+            "is_active": True,
+            "created_at": created,
+            "updated_at": created,
+        })
+    return products
+
+
+async def old_path(field, docs: List[dict]) -> bytes:
+    for p in docs:
+        p["created_at"] = _dt_from_iso(p.get("created_at"))
+        p["updated_at"] = _dt_from_iso(p.get("updated_at"))
+    content = await serialize_response(field=field, response_content=docs)
+    return JSONResponse(content).body
+
+
+async def new_path(docs: List[dict]) -> bytes:
+    return FastJSONResponse(docs).body
+
+
+async def main(count: int, repeat: int):
+    field = create_response_field(name="Response_get_products", type_=List[Product])
+    old_times, new_times = [], []
+    old_size = new_size = 0
+
+    for _ in range(repeat):
+        docs = make_products(count, iso_dates=True)
+        start = time.perf_counter()
+        old_size = len(await old_path(field, docs))
+        old_times.append(time.perf_counter() - start)
+
+        docs = make_products(count, iso_dates=False)
+        start = time.perf_counter()
+        new_size = len(await new_path(docs))
+        new_times.append(time.perf_counter() - start)
+
+    old_ms = statistics.median(old_times) * 1000
+    new_ms = statistics.median(new_times) * 1000
+    print(f"{count} ürün, {repeat} tekrar (medyan)")
+    print(f"  eski yol : {old_ms:8.1f} ms  ({old_size / 1024:.0f} KB)")
+    print(f"  yeni yol : {new_ms:8.1f} ms  ({new_size / 1024:.0f} KB)")
+    print(f"  hızlanma : {old_ms / new_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.count, args.repeat))
@@ -0,0 +1,116 @@
+"""
+Location index: ids created on another worker after this worker built its index.
+
+catalog_cache is replaced by an in-memory stand-in that (like a real worker) keeps serving
+its snapshot until it is invalidated or refreshed, so no Mongo is needed.
+
+  python -m pytest tests/test_warehouse_locations.py
+"""
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+import asyncio
+import sys
+import types
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+class _Snapshot(NamedTuple):
+    items: List[dict]
+
+
+class FakeCatalogCache(types.ModuleType):
+    """Collections ("the database") plus this worker's snapshots of them."""
+
+    def __init__(self):
+        super().__init__("catalog_cache")
+        self.collections: Dict[str, List[dict]] = {
+            "warehouses": [], "rack_groups": [], "rack_levels": [], "rack_slots": [],
+        }
+        self.snapshots: Dict[str, _Snapshot] = {}
+        self.loads = 0
+
+    async def get_snapshot(self, name):
+        if name not in self.snapshots:
+            self.snapshots[name] = _Snapshot(list(self.collections[name]))
+            self.loads += 1
+        return self.snapshots[name]
+
+    def refresh(self, *names, min_age=0.0):
+        dropped = False
+        for name in names:
+            dropped = self.snapshots.pop(name, None) is not None or dropped
+        return dropped
+
+
+catalog = FakeCatalogCache()
+sys.modules["catalog_cache"] = catalog
+
+import warehouse_locations  # noqa: E402
+
+
+def _seed():
+    catalog.collections["warehouses"][:] = [{"id": "w1", "name": "Maltepe Depo"}]
+    catalog.collections["rack_groups"][:] = [{"id": "g1", "warehouse_id": "w1", "name": "A Rafı"}]
+    catalog.collections["rack_levels"][:] = [{"id": "l1", "rack_group_id": "g1", "level_number": 5}]
+    catalog.collections["rack_slots"][:] = [{"id": "s1", "rack_level_id": "l1", "slot_number": 1}]
+    catalog.snapshots.clear()
+    warehouse_locations._index = None
+
+
+def _add_slot_on_other_worker():
+    """A new level + slot written elsewhere: this worker's snapshots don't have them."""
+    catalog.collections["rack_levels"].append({"id": "l2", "rack_group_id": "g1", "level_number": 6})
+    catalog.collections["rack_slots"].append({"id": "s2", "rack_level_id": "l2", "slot_number": 3})
+
+
+def test_resolve_slots_reloads_for_slot_created_after_index_was_built():
+    _seed()
+    assert asyncio.run(warehouse_locations.resolve_slots(["s1"]))["s1"] is not None
+    _add_slot_on_other_worker()
+
+    resolved = asyncio.run(warehouse_locations.resolve_slots(["s1", "s2"]))
+
+    location = resolved["s2"]
+    assert location is not None
+    assert (location.warehouse_id, location.rack_group_id, location.rack_level_id) == ("w1", "g1", "l2")
+    assert location.full_address == "Maltepe Depo / A Rafı / 6. Kat / Bölme 3"
+
+
+def test_full_address_is_not_truncated_for_new_slot():
+    _seed()
+    asyncio.run(warehouse_locations.get_index())
+    _add_slot_on_other_worker()
+
+    address = asyncio.run(warehouse_locations.full_address("w1", "g1", "l2", "s2"))
+
+    assert address == "Maltepe Depo / A Rafı / 6. Kat / Bölme 3"
+
+
+def test_full_addresses_batch_reloads_once():
+    _seed()
+    asyncio.run(warehouse_locations.get_index())
+    _add_slot_on_other_worker()
+    loads_before = catalog.loads
+
+    addresses = asyncio.run(warehouse_locations.full_addresses([("w1", "g1", "l1", "s1"), ("w1", "g1", "l2", "s2")]))
+
+    assert addresses[("w1", "g1", "l2", "s2")] == "Maltepe Depo / A Rafı / 6. Kat / Bölme 3"
+    assert catalog.loads - loads_before == len(warehouse_locations.LOCATION_CATALOGS)
+
+
+def test_known_ids_do_not_reload():
+    _seed()
+    asyncio.run(warehouse_locations.get_index())
+    loads_before = catalog.loads
+
+    asyncio.run(warehouse_locations.resolve_slots(["s1"]))
+    asyncio.run(warehouse_locations.full_address("w1", "g1", "l1", "s1"))
+
+    assert catalog.loads == loads_before
+
+
+def test_unknown_slot_still_resolves_to_none():
+    _seed()
+    assert asyncio.run(warehouse_locations.resolve_slots(["missing"]))["missing"] is None